@@ -3,11 +3,12 @@
 import os
 import logging
 import config
-from flask import Flask, send_from_directory
+from flask import Flask, Response, send_from_directory
 from flask_cors import CORS
 from config import Config
 from routes import api as api_blueprint
-from services import nebula_service, search_service
+from services import startup, metrics
+import utils
 from flask.json.provider import DefaultJSONProvider
 
 
@@ -15,7 +16,8 @@ from flask.json.provider import DefaultJSONProvider
 class CustomJSONProvider(DefaultJSONProvider):
     def dumps(self, obj, **kwargs):
         kwargs.setdefault("ensure_ascii", False)  # 关闭 ASCII 转义
-        return super().dumps(obj, **kwargs)
+        with metrics.stage('json_serialize'):
+            return super().dumps(obj, **kwargs)
 
 def create_app():
     """工厂函数，用于创建和配置Flask应用"""
@@ -24,6 +26,8 @@ def create_app():
     
     # 1. 加载配置
     app.config.from_object(Config)
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = utils.load_or_create_secret_key(app.config['SECRET_KEY_FILE'])
     # 全局替换 JSONProvider
     app.json = CustomJSONProvider(app)
     
@@ -39,10 +43,8 @@ def create_app():
     # 4. 初始化CORS
     CORS(app, resources={r"/api/*": {"origins": "*"}}) # 仅对/api路径下的路由启用CORS
 
-    # 5. 在应用上下文中初始化服务
-    with app.app_context():
-        nebula_service.init_nebula_pool(app.config)
-        search_service.init_search_clients(app.config)
+    # 5. 在后台线程中初始化各后端，不阻塞启动；就绪状态见 /api/ready
+    startup.start_background_init(app.config)
 
     # 6. 注册Blueprint
     # 为所有路由添加 /api 前缀
@@ -53,11 +55,20 @@ def create_app():
     def uploaded_files(filename):
         return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+    # Prometheus 抓取各阶段耗时与各接口请求指标（见 services/metrics.py）
+    if app.config['METRICS_ENABLED']:
+        @app.route('/metrics')
+        def prometheus_metrics():
+            return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
     app.logger.info("应用启动成功，运行在 http://0.0.0.0:5000")
     
     return app
 
-app = create_app()
+# pHash进程池使用 spawn，子进程会以 __mp_main__ 重新导入启动脚本（python app.py 时即本模块），
+# 此时不创建应用，否则每个子进程都会启动后台初始化、连接各后端并打开LevelDB
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
     # 使用 gunicorn 或 uwsgi 部署时，不会执行这部分
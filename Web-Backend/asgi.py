@@ -0,0 +1,17 @@
+# /unified_service/asgi.py
+"""
+ASGI 入口
+
+    pip install "a2wsgi>=1.10" uvicorn
+    uvicorn asgi:asgi_app --host 0.0.0.0 --port 5000
+
+视图本身是同步的（与 app.run / gunicorn 的WSGI部署相同），这里用 a2wsgi 的 WSGIMiddleware
+把应用挂到ASGI服务器上，每个请求在 ASGI_THREADS 个线程的线程池中执行；
+视图内互不依赖的后端请求通过 services.async_service 并发执行，视频检索使用单独限流的线程池，
+慢的视频检索不会占满处理图谱查询的线程。
+"""
+
+from a2wsgi import WSGIMiddleware
+from app import app
+
+asgi_app = WSGIMiddleware(app, workers=app.config['ASGI_THREADS'])
@@ -0,0 +1,106 @@
+# /unified_service/benchmarks/bench_hamming_index.py
+"""
+本地汉明索引基准测试：与暴力扫描对比召回率和延迟
+
+用法（在 Web-Backend 目录下）:
+    python -m benchmarks.bench_hamming_index --sizes 1000000,10000000 --queries 200
+
+查询分两类：
+  - near-dup: 从库中取编码随机翻转若干位，模拟同一图片的再次上传（pHash 近重复）
+  - random:   随机编码，库中没有近邻，用来观察索引退化为全量扫描时的开销
+"""
+
+import argparse
+import time
+import numpy as np
+from services.hamming_index import HammingIndex
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+
+def brute_force(db_bytes, query, limit, max_distance=None):
+    """暴力扫描基线：逐字节查表统计汉明距离"""
+    distances = _POPCOUNT_TABLE[db_bytes ^ query].sum(axis=1)
+    rows = np.arange(len(db_bytes))
+    if max_distance is not None:
+        keep = distances < max_distance
+        rows, distances = rows[keep], distances[keep]
+    order = np.lexsort((rows, distances))[:limit]
+    return rows[order], distances[order]
+
+
+def recall(found_dist, truth_dist):
+    """按距离计算召回（距离并列时不同的行号都算命中）"""
+    if len(truth_dist) == 0:
+        return 1.0
+    kth = truth_dist[-1]
+    hits = min(int((np.asarray(found_dist) <= kth).sum()), len(truth_dist))
+    return hits / len(truth_dist)
+
+
+def make_queries(rng, db_bytes, n, min_flips, max_flips):
+    """构造近重复查询和随机查询"""
+    near = []
+    for row in rng.integers(0, len(db_bytes), size=n):
+        bits = np.unpackbits(db_bytes[row])
+        flips = rng.choice(bits.size, size=rng.integers(min_flips, max_flips + 1), replace=False)
+        bits[flips] ^= 1
+        near.append(np.packbits(bits))
+    random = list(rng.integers(0, 256, size=(n, db_bytes.shape[1]), dtype=np.uint8))
+    return {"near-dup": near, "random": random}
+
+
+def percentile_ms(samples, p):
+    return float(np.percentile(samples, p) * 1000)
+
+
+def run(size, args, rng):
+    print(f"\n=== N = {size:,} ===")
+    db_bytes = rng.integers(0, 256, size=(size, args.dim // 8), dtype=np.uint8)
+
+    start = time.perf_counter()
+    index = HammingIndex(dim=args.dim, mih_chunks=args.chunks)
+    index.add(db_bytes.view('<u8'))
+    index._get_tables()
+    print(f"构建索引: {time.perf_counter() - start:.2f}s")
+
+    queries = make_queries(rng, db_bytes, args.queries, args.min_flips, args.max_flips)
+    print(f"{'查询类型':<10}{'max_distance':>14}{'召回':>8}{'暴力p50':>10}{'暴力p99':>10}{'索引p50':>10}{'索引p99':>10}")
+    for kind, qs in queries.items():
+        for max_distance in (None, args.near_distance, args.service_distance):
+            bf_times, idx_times, recalls = [], [], []
+            for q in qs:
+                t0 = time.perf_counter()
+                _, truth = brute_force(db_bytes, q, args.limit, max_distance)
+                t1 = time.perf_counter()
+                hits = index.search(data=[q.tobytes()], limit=args.limit, max_distance=max_distance)[0]
+                t2 = time.perf_counter()
+                bf_times.append(t1 - t0)
+                idx_times.append(t2 - t1)
+                recalls.append(recall([h["distance"] for h in hits], truth))
+            print(f"{kind:<12}{str(max_distance):>14}{np.mean(recalls):>9.3f}"
+                  f"{percentile_ms(bf_times, 50):>10.2f}{percentile_ms(bf_times, 99):>10.2f}"
+                  f"{percentile_ms(idx_times, 50):>10.2f}{percentile_ms(idx_times, 99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地汉明索引 vs 暴力扫描")
+    parser.add_argument('--sizes', default='1000000,10000000', help="库大小，逗号分隔")
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--chunks', type=int, default=16)
+    parser.add_argument('--min-flips', type=int, default=0)
+    parser.add_argument('--max-flips', type=int, default=24)
+    parser.add_argument('--near-distance', type=int, default=32, help="近重复阈值")
+    parser.add_argument('--service-distance', type=int, default=90, help="图片搜索接口使用的阈值")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for size in (int(s) for s in args.sizes.split(',')):
+        run(size, args, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 
 import os
 
+
 class Config:
     """
     统一的配置类
@@ -16,6 +17,27 @@ class Config:
     PICTURE_ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     TXT_ALLOWED_EXTENSIONS = {'txt'}
 
+    # 图片/视频搜索结果缓存配置（按上传文件内容哈希索引）
+    SEARCH_RESULT_CACHE_TTL = 600 # 秒
+    SEARCH_RESULT_CACHE_MAX_ENTRIES = 1024
+    SEARCH_RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    # 媒体文件访问配置
+    SECRET_KEY = os.environ.get('SECRET_KEY') # 用于媒体URL签名，多机部署时请通过 SECRET_KEY 环境变量设置同一密钥
+    SECRET_KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.secret_key') # 未设置 SECRET_KEY 时 create_app 在此生成并复用本机随机密钥
+    IMAGE_DATASET_ROOT = '/data/storage/8888/xyt/work/milvus_dataset/Image' # 检索结果中图片所在目录，媒体URL只能访问该目录、视频目录、上传目录和缩略图目录下的文件
+    VIDEO_DATASET_ROOT = '/data/storage/8888/xyt/work/milvus_dataset/video'
+    MEDIA_MAX_AGE = 3600 # 媒体文件的浏览器缓存时间（秒）
+    MEDIA_X_ACCEL_PREFIX = None # 如 '/_media'，设置后由nginx通过X-Accel-Redirect发送文件，需配置对应的internal location
+    USE_X_SENDFILE = False # Apache/lighttpd 部署时可开启X-Sendfile
+
+    # 缩略图缓存配置
+    THUMBNAIL_FOLDER = os.path.join(os.getcwd(), 'thumbnails')
+    THUMBNAIL_WIDTHS = (160, 320, 640) # 仅生成这几种宽度（最长边）
+    THUMBNAIL_DEFAULT_WIDTH = 320 # 搜索结果中引用的缩略图宽度
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024 # 缩略图缓存总大小上限，超出后按LRU淘汰
+
     # 日志配置
     LOG_LEVEL = "INFO"
 
@@ -28,7 +50,28 @@ class Config:
     NEBULA_USER = 'root'
     NEBULA_PASSWORD = 'p' # 示例密码，请替换为您的真实密码
     NEBULA_SPACE = 'Social_Network_1'
+    NEBULA_META_HOSTS = [('172.18.112.199', 9559)] # metad地址，离线扫描全部顶点时使用（python -m services.cascade_stats build）
     NEBULA_POOL_SIZE = 10
+    NEBULA_SESSION_IDLE_TIMEOUT = 600 # 会话空闲超过该秒数后释放（应小于服务端 session_idle_timeout_secs）
+    NEBULA_SESSION_PING_INTERVAL = 60 # 会话空闲超过该秒数时，使用前先ping检查
+    NEBULA_SESSION_ACQUIRE_TIMEOUT = 10 # 会话全部占用时的最长等待时间（秒）
+    NEBULA_ALLOWED_SPACES = None # 允许前端通过 space_name 访问的图空间，None 表示不限制
+    GRAPH_STREAM_MAX_HOPS = 10 # 逐跳展开扩散图的最大跳数
+    GRAPH_STREAM_MAX_FANOUT = 2000 # 每跳最多展开的边数，按该跳所有节点合计而非每个节点（请求参数 fanout 不能超过该值）
+    GRAPH_STREAM_NODE_BUDGET = 20000 # 单次展开的节点总数上限（请求参数 budget 不能超过该值）
+    GRAPH_CACHE_TTL = 300 # 图查询结果（扩散图、推文原文）缓存时间（秒）
+    GRAPH_CACHE_MEMORY_TTL = 30 # 进程内副本的有效期，失效操作最多延迟该秒数到达其他worker
+    GRAPH_CACHE_MAX_BYTES = 128 * 1024 * 1024 # 进程内缓存上限
+    GRAPH_CACHE_SHARED_PATH = '/dev/shm/unified_service_graph_cache.db' # 各worker共用的本机缓存，None 表示只用进程内缓存
+    GRAPH_CACHE_SHARED_MAX_BYTES = 1024 * 1024 * 1024
+    GRAPH_CACHE_SERIALIZER = 'json' # 共享缓存的序列化方式: json / pickle
+    EVENT_GRAPH_CACHE_TTL = 600 # 事件子图缓存时间（秒），数据更新后可调用 /cache/event-graph/invalidate
+    CACHE_ADMIN_TOKEN = os.environ.get('CACHE_ADMIN_TOKEN') # 缓存管理接口的令牌（请求头 X-Admin-Token），未设置时管理接口一律拒绝
+    CASCADE_STATS_PATH = os.path.join(os.getcwd(), 'cascade_stats.db') # 离线构建: python -m services.cascade_stats build
+    CASCADE_STATS_BATCH = 200 # 每批同时展开的原创推文数
+    CASCADE_STATS_MAX_DEPTH = 10 # 与在线扩散图相同的最大跳数
+    CASCADE_STATS_MILESTONES = (10, 100, 1000) # 统计达到第N次转发的耗时
+    CASCADE_STATS_TOP_SPREADERS = 10
 
     # Milvus 配置
     MILVUS_URI = "http://172.18.112.199:31800"
@@ -36,11 +79,84 @@ class Config:
     MILVUS_VIDEO_COLLECTION = 'social_net'
     MILVUS_IMAGE_COLLECTION = 'image_0911'
 
+    # 图像搜索配置
+    IMAGE_SEARCH_BACKEND = 'milvus' # 'milvus' | 'local'（仅用本地汉明索引）| 'local+milvus'（本地索引作为Milvus前的热点缓存）
+    IMAGE_SEARCH_MAX_DISTANCE = 90 # pHash汉明距离阈值，小于该值才视为命中
+    LOCAL_IMAGE_INDEX_PATH = os.path.join(os.getcwd(), 'image_index') # 本地汉明索引快照目录，生成: python -m services.hamming_index build
+    PHASH_WORKERS = 4 # 批量计算pHash的进程数
+    PHASH_JPEG_DRAFT_SIZE = None # 如 512：JPEG按缩小比例解码以加速大图，签名可能有少量位不同，默认关闭
+    PICTURE_BATCH_MAX_FILES = 100 # /search/pictures 单次最多图片数
+
     # Elasticsearch 配置
     ES_HOSTS = ['http://172.18.112.199:9201']
     ES_AUTH = ('elastic', 'miti963258741') # 示例认证，请替换为您的真实认证信息
     ES_INDEX = 'sns_search_article'
 
+    # 文本搜索配置
+    TEXT_SEARCH_TOP_K = 100 # ES召回数量，使用预计算n-gram引擎后可增大到数千
+    TEXT_SEARCH_MAX_PAGE_SIZE = 100 # /search/text 分页时每页最多条数
+    NGRAM_IDF_PATH = os.path.join(os.getcwd(), 'ngram_idf.npz') # 离线构建: python -m services.ngram_rerank build
+    NGRAM_FEATURES = 2 ** 22 # 哈希n-gram的特征维度（过小会增加哈希冲突）
+    NGRAM_DOC_CACHE_SIZE = 100000 # 按文档id缓存的n-gram向量数量
+    NGRAM_RELOAD_INTERVAL = 60 # 检查语料统计文件是否更新的间隔（秒），None 表示只在启动后加载一次
+    TEXT_RESULT_CACHE_TTL = 300 # 文本搜索结果缓存时间（秒）
+    TEXT_RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024 # 进程内缓存上限
+    TEXT_RESULT_CACHE_SHARED_PATH = None # 如 '/dev/shm/unified_service_cache.db'，多个worker共用的本机缓存
+    TEXT_RESULT_CACHE_SHARED_MAX_BYTES = 256 * 1024 * 1024
+
+    # 批量入库配置（python -m services.ingest run dumps/*.jsonl）
+    INGEST_BATCH_SIZE = 1000 # 每批行数
+    INGEST_WORKERS = 4 # 并行处理批次的线程数
+    INGEST_MAX_IN_FLIGHT = 8 # 同时在途的批次上限，限制内存占用
+    INGEST_ES_CHUNK_SIZE = 500 # 每个bulk请求的文档数
+    INGEST_NEBULA_ROWS_PER_STATEMENT = 200 # 每条 INSERT 语句的顶点/边数
+    INGEST_RETRIES = 3 # 各阶段失败后的重试次数
+    INGEST_CHECKPOINT_PATH = os.path.join(os.getcwd(), 'ingest_checkpoint.json') # 断点续传位置
+    INGEST_REPORT_INTERVAL = 30 # 吞吐日志间隔（秒）
+
     # Towhee Video Search 配置
     TOWHEE_LEVELDB_PATH = '/data/storage/8888/sunye/video_search2.db' # 重要：请替换为您的真实路径
-    TOWHEE_DEVICE = 0 # 使用GPU 0, 如果没有GPU请设置为None
\ No newline at end of file
+    TOWHEE_DEVICE = 0 # 使用GPU 0, 如果没有GPU请设置为None
+    TOWHEE_WARMUP = False # 后台初始化时预构建视频拷贝检测流水线（CPU模式下为加载帧向量模型）
+    VIDEO_SEARCH_THRESHOLD = 1
+    VIDEO_SEARCH_MODE = 'pipeline' # 'pipeline'（Towhee流水线，整段解码）| 'cpu'（逐批抽帧检索，可提前结束，适合无GPU节点）
+    VIDEO_CPU_SAMPLE = 'keyframes' # CPU模式抽帧方式：'keyframes' 只解码关键帧，或抽帧间隔秒数如 1.0
+    VIDEO_CPU_EMBED_BATCH = 16 # 每批计算向量并检索的帧数
+    VIDEO_CPU_MAX_FRAMES = 300 # 单次检索最多处理的帧数
+    VIDEO_CPU_TOP_K = 10 # 每帧在Milvus中检索的近邻数
+    VIDEO_CPU_FRAME_SIMILARITY = 0.6 # 帧向量内积不低于该值才计为命中
+    VIDEO_CPU_EARLY_EXIT_SCORE = 5.0 # 候选的匹配片段得分达到该值后停止解码，0 表示处理完整段视频
+    VIDEO_JOB_WORKERS = 2 # 后台执行视频检索任务的线程数
+    VIDEO_JOB_MAX_PENDING = 20 # 排队中和执行中的任务上限，超出时提交返回429
+    VIDEO_JOB_TTL = 3600 # 已结束任务的结果保留时间（秒）
+    VIDEO_JOB_SSE_HEARTBEAT = 15 # SSE 无进度时的心跳间隔（秒）
+    VIDEO_EMBED_BACKEND = 'towhee' # CPU检索模式的帧向量推理后端：'towhee'（PyTorch float32）| 'onnx'（ONNX Runtime int8）；pipeline 模式不受影响
+    VIDEO_EMBED_ONNX_PATH = os.path.join(os.getcwd(), 'models', 'isc_int8.onnx') # 生成方式见 services/onnx_embedding.py
+    VIDEO_EMBED_THREADS = None # CPU推理线程数，None 表示由运行时决定
+    VIDEO_EMBED_MIN_COSINE = 0.98 # int8精度检查：与参考向量的平均余弦相似度下限
+
+    # 视频库离线建库配置（python -m services.video_indexer index /data/videos）
+    VIDEO_INDEX_MANIFEST_PATH = os.path.join(os.getcwd(), 'video_index_manifest.db') # 已入库视频清单（按内容哈希）
+    VIDEO_INDEX_DECODE_WORKERS = 8 # 并行哈希、抽帧的进程数
+    VIDEO_INDEX_MAX_IN_FLIGHT = 16 # 同时解码的视频数上限（已解码的帧暂存在临时文件中）
+    VIDEO_INDEX_SPOOL_DIR = None # 解码帧的临时目录，None 表示系统临时目录；长视频每帧约 FRAME_SIZE²×3 字节
+    VIDEO_INDEX_TIME_STEP = 1 # 抽帧间隔（秒），需与检索流水线一致
+    VIDEO_INDEX_FRAME_SIZE = 512 # ISC模型的输入尺寸
+    VIDEO_INDEX_EMBED_BATCH = 256 # 每次送入模型的帧数
+    VIDEO_INDEX_URL_FIELD = 'url' # Milvus视频集合中存放视频路径的字段
+    VIDEO_INDEX_VECTOR_FIELD = 'embedding' # Milvus视频集合中的向量字段
+    VIDEO_INDEX_EMBED_BACKEND = 'towhee' # 建库的帧向量推理后端，需与检索该集合时使用的模型一致；用 'onnx' 建库时请使用单独的 MILVUS_VIDEO_COLLECTION
+    VIDEO_INDEX_REPORT_INTERVAL = 60 # 进度日志间隔（秒）
+
+    # 后端调用线程池配置（services/async_service.py）
+    ASYNC_IO_WORKERS = 32 # 视图内并发的 ES / Milvus / Nebula 请求线程数
+    VIDEO_SEARCH_WORKERS = 2 # 同时执行的视频检索数
+    VIDEO_PIPELINE_POOL_SIZE = None # 每个进程的视频拷贝检测流水线实例数，None 表示与 VIDEO_SEARCH_WORKERS 相同
+    ASGI_THREADS = 64 # asgi.py 中运行Flask请求的线程数
+
+    # 启动配置（各后端在后台线程中初始化，失败后按指数退避重试，见 services/startup.py）
+    STARTUP_RETRY_INTERVAL = 2 # 首次重试间隔（秒）
+    STARTUP_RETRY_MAX_INTERVAL = 60 # 重试间隔上限（秒）
+
+    # 指标配置（Prometheus 文本格式，见 services/metrics.py）
+    METRICS_ENABLED = True # 是否提供 /metrics
\ No newline at end of file
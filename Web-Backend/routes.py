@@ -1,94 +1,396 @@
 # /unified_service/routes.py
 
 import os
+import hmac
 import time
-from flask import Blueprint, request, jsonify, current_app
+import hashlib
+import tempfile
+import mimetypes
+import functools
+from urllib.parse import quote
+from flask import Blueprint, request, jsonify, current_app, send_file, url_for, g
 from werkzeug.utils import secure_filename
-from services import nebula_service, search_service
+from itsdangerous import URLSafeSerializer, BadSignature
+from services import nebula_service, search_service, thumbnail_service, result_cache, async_service, cascade_stats, video_fingerprint, video_jobs, startup, metrics
 import utils
 
 # 创建一个Blueprint
 api = Blueprint('api', __name__)
 
+# --- 接口指标（/metrics） ---
+
+@api.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+@api.after_request
+def _observe_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.observe_request(
+            request.endpoint or 'unknown', response.status_code, time.perf_counter() - start,
+            response_bytes=response.content_length, result_items=g.pop('result_items', None),
+        )
+    return response
+
+def _record_results(count):
+    """记录本次请求返回的结果条数（unified_http_result_items）"""
+    g.result_items = count
+
+# --- 就绪检查 ---
+
+def _not_ready_response(subsystems):
+    """依赖的子系统尚未就绪时返回503，附带其初始化状态"""
+    missing = startup.not_ready(subsystems)
+    if not missing:
+        return None
+    status = startup.readiness()
+    response = jsonify({
+        "error": f"服务初始化中: {', '.join(missing)}",
+        "subsystems": {name: status.get(name, {"status": "pending"}) for name in missing},
+    })
+    response.headers['Retry-After'] = str(current_app.config['STARTUP_RETRY_INTERVAL'])
+    return response, 503
+
+def _requires(*subsystems):
+    """接口依赖的子系统；参数也可以是 config -> 子系统名称列表 的函数"""
+    def resolve():
+        names = []
+        for subsystem in subsystems:
+            names.extend(subsystem(current_app.config) if callable(subsystem) else [subsystem])
+        return names
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return _not_ready_response(resolve()) or view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _image_search_subsystems(config):
+    """图片检索依赖ES查事件；使用本地汉明索引时依赖其快照，仅使用本地索引时不依赖Milvus"""
+    backend = config['IMAGE_SEARCH_BACKEND']
+    if backend == 'local':
+        return ['elasticsearch', 'image_index']
+    if backend == 'local+milvus':
+        return ['elasticsearch', 'image_index', 'milvus']
+    return ['elasticsearch', 'milvus']
+
+# 测试:curl "http://127.0.0.1:5000/api/ready"
+@api.route('/ready', methods=['GET'])
+def ready():
+    """各子系统的初始化状态，全部就绪时返回200，否则返回503（可用 ?subsystems=nebula,elasticsearch 只检查部分）"""
+    status = startup.readiness()
+    requested = request.args.get('subsystems')
+    names = [name.strip() for name in requested.split(',') if name.strip()] if requested else list(startup.SUBSYSTEMS)
+    unknown = [name for name in names if name not in startup.SUBSYSTEMS]
+    if unknown:
+        return jsonify({"error": f"未知的子系统: {', '.join(unknown)}"}), 400
+    ready = not startup.not_ready(names)
+    body = {"ready": ready, "subsystems": {name: status.get(name, {"status": "pending"}) for name in names}}
+    return jsonify(body), 200 if ready else 503
+
 # --- NebulaGraph API Routes ---
 
+def _space_name(requested):
+    """前端传入的图空间名称，缺省使用配置的空间；名称不合法或不在允许列表中时返回None"""
+    space_name = requested or current_app.config['NEBULA_SPACE']
+    allowed = current_app.config['NEBULA_ALLOWED_SPACES']
+    if not nebula_service.validate_space_name(space_name) or (allowed and space_name not in allowed):
+        return None
+    return space_name
+
 @api.route('/executeCustomQuery', methods=['POST'])
+@_requires('nebula')
 def execute_custom_query():
     query = request.json.get('query')
     if not query:
         return jsonify({"error": "缺少必要参数: query"}), 400
 
-    space_name = current_app.config['NEBULA_SPACE']
+    space_name = _space_name(request.json.get('space_name'))
+    if not space_name:
+        return jsonify({"error": "非法的图空间名称"}), 400
     result = nebula_service.execute_query(query, space_name=space_name)
     
     if isinstance(result, dict) and "error" in result:
         return jsonify(result), 500
     
+    _record_results(len(result) if isinstance(result, list) else 0)
     return jsonify(result)
 
+def _compact_requested():
+    """?format=compact 时图谱返回去重节点表+按列存储的边（见 nebula_service.compact_graph）"""
+    return request.args.get('format') == 'compact'
+
+def _graph_count(result):
+    """图谱结果中的边数，兼容逐行格式与紧凑格式"""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and "edges" in result:
+        return len(result["edges"]["src"])
+    return 0
+
+def _graph_cache():
+    """图查询结果缓存（扩散图、事件子图、推文原文），同一台机器上的各worker共用"""
+    config = current_app.config
+    return result_cache.get_cache(
+        'graph_results',
+        ttl=config['GRAPH_CACHE_TTL'],
+        max_bytes=config['GRAPH_CACHE_MAX_BYTES'],
+        shared_path=config['GRAPH_CACHE_SHARED_PATH'],
+        shared_max_bytes=config['GRAPH_CACHE_SHARED_MAX_BYTES'],
+        memory_ttl=config['GRAPH_CACHE_MEMORY_TTL'],
+        serializer=config['GRAPH_CACHE_SERIALIZER'],
+    )
+
+def _cached_graph(key, load, ttl=None):
+    """先查图结果缓存，未命中时执行 load() 并缓存成功的结果"""
+    cache = _graph_cache()
+    result = cache.get(key)
+    if result is None:
+        result = load()
+        if not (isinstance(result, dict) and "error" in result):
+            cache.set(key, result, ttl)
+    return result
+
 @api.route('/getRelatedByEvent', methods=['GET'])
+@_requires('nebula')
 def get_related_by_event():
     event = request.args.get('event')
     if not event:
         return jsonify({"error": "请提供事件名称"}), 400
 
     current_app.logger.info(f"查询事件: {event}")
-    space_name = current_app.config['NEBULA_SPACE']
-    result = nebula_service.get_graph_data_by_event(event, space_name)
+    space_name = _space_name(request.args.get('space_name'))
+    if not space_name:
+        return jsonify({"error": "非法的图空间名称"}), 400
+    compact = _compact_requested()
+    # 按事件物化子图，热门事件重复查看时不再做多跳遍历
+    result = _cached_graph(
+        ('event', space_name, event, compact),
+        lambda: nebula_service.get_graph_data_by_event(event, space_name, compact),
+        ttl=current_app.config['EVENT_GRAPH_CACHE_TTL'],
+    )
 
     if isinstance(result, dict) and "error" in result:
         return jsonify(result), 500
 
+    _record_results(_graph_count(result))
     return jsonify({
         "event": event,
+        "format": "compact" if compact else "rows",
         "results": result,
-        "count": len(result) if isinstance(result, list) else 0
+        "count": _graph_count(result)
     })
     
+def _bounded_arg(name, config_key):
+    """取整数请求参数，缺省或超出时使用配置的上限"""
+    limit = current_app.config[config_key]
+    value = request.args.get(name, type=int)
+    return limit if value is None or value <= 0 else min(value, limit)
+
+def _stream_graph_hops(id, space_name, mode):
+    """逐跳推送扩散图：mode 为 ndjson 时每行一个JSON，为 sse 时按 Server-Sent Events 格式发送
+
+    完整展开（以 done 结束）的各跳结果写入图结果缓存，相同参数的请求直接回放缓存，不再查询Nebula。
+    客户端断开（如取消fetch、关闭EventSource）时生成器被关闭，不再继续展开后续各跳，也不写缓存。
+    """
+    max_hops = _bounded_arg('hops', 'GRAPH_STREAM_MAX_HOPS')
+    max_fanout = _bounded_arg('fanout', 'GRAPH_STREAM_MAX_FANOUT')
+    node_budget = _bounded_arg('budget', 'GRAPH_STREAM_NODE_BUDGET')
+    # 生成器在请求上下文之外运行，缓存对象在这里取好
+    cache = _graph_cache()
+    key = ('id_hops', space_name, id, max_hops, max_fanout, node_budget)
+    cached = cache.get(key)
+    if cached is not None:
+        hops = iter(cached)
+    else:
+        hops = nebula_service.iter_graph_hops_by_id(
+            id, space_name, max_hops=max_hops, max_fanout=max_fanout, node_budget=node_budget,
+        )
+    dumps = current_app.json.dumps
+    logger = current_app.logger
+
+    def generate():
+        events = [] if cached is None else None
+        try:
+            for event in hops:
+                if events is not None:
+                    events.append(event)
+                payload = dumps(event)
+                if mode == 'sse':
+                    name = 'done' if event.get('done') else 'error' if 'error' in event else 'hop'
+                    yield f"event: {name}\ndata: {payload}\n\n"
+                else:
+                    yield payload + "\n"
+            if events and events[-1].get('done'):
+                cache.set(key, events)
+        except GeneratorExit:
+            logger.info(f"客户端已断开，停止展开扩散图: {id}")
+            raise
+        finally:
+            if cached is None:
+                hops.close()
+
+    mimetype = 'text/event-stream' if mode == 'sse' else 'application/x-ndjson'
+    response = current_app.response_class(generate(), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭nginx缓冲，逐跳到达客户端
+    return response
+
+def _admin_token_error():
+    """校验管理接口的 X-Admin-Token 请求头，通过时返回 None"""
+    expected = current_app.config.get('CACHE_ADMIN_TOKEN')
+    if not expected:
+        return jsonify({"error": "未配置 CACHE_ADMIN_TOKEN，管理接口已禁用"}), 403
+    token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        return jsonify({"error": "管理令牌无效"}), 403
+    return None
+
+@api.route('/cache/event-graph/invalidate', methods=['POST'])
+def invalidate_event_graph():
+    """使事件子图缓存失效（需要 X-Admin-Token）
+
+    指定 event 时只清除该事件（两种格式）；清空全部图查询缓存需显式传入 all=true。
+    其他worker的进程内副本最多在 GRAPH_CACHE_MEMORY_TTL 秒后失效
+    """
+    error = _admin_token_error()
+    if error:
+        return error
+    params = request.get_json(silent=True) or request.form
+    event = params.get('event')
+    cache = _graph_cache()
+    if not event:
+        if str(params.get('all', '')).lower() not in ('1', 'true'):
+            return jsonify({"error": "请提供事件名称 event，或传入 all=true 清空全部图查询缓存"}), 400
+        cache.clear()
+        current_app.logger.warning(f"已清空全部图查询缓存（来自 {request.remote_addr}）")
+        return jsonify({"message": "已清空全部图查询缓存"})
+
+    space_name = _space_name(params.get('space_name'))
+    if not space_name:
+        return jsonify({"error": "非法的图空间名称"}), 400
+    for compact in (False, True):
+        cache.delete(('event', space_name, event, compact))
+    return jsonify({"message": f"已清除事件子图缓存: {event}"})
+
 @api.route('/getRelatedById', methods=['GET'])
+@_requires('nebula')
 def get_related_by_id():
     id = request.args.get('id')
     if not id:
         return jsonify({"error": "请提供微博推文ID"}), 400
 
     current_app.logger.info(f"查询微博推文ID: {id}")
-    space_name = current_app.config['NEBULA_SPACE']
-    result = nebula_service.get_graph_data_by_id(id, space_name)
+    space_name = _space_name(request.args.get('space_name'))
+    if not space_name:
+        return jsonify({"error": "非法的图空间名称"}), 400
+
+    # ?stream=ndjson|sse 时逐跳流式返回，图谱页面可以先渲染前几跳
+    stream = request.args.get('stream')
+    if stream in ('ndjson', 'sse'):
+        return _stream_graph_hops(id, space_name, stream)
+    compact = _compact_requested()
+    result = _cached_graph(
+        ('id', space_name, id, compact),
+        lambda: nebula_service.get_graph_data_by_id(id, space_name, compact),
+    )
 
     if isinstance(result, dict) and "error" in result:
         return jsonify(result), 500
 
+    _record_results(_graph_count(result))
     return jsonify({
         "id": id,
+        "format": "compact" if compact else "rows",
         "results": result,
-        "count": len(result) if isinstance(result, list) else 0
+        "count": _graph_count(result)
     })
     
+@api.route('/getCascadeStatsById', methods=['GET'])
+def get_cascade_stats_by_id():
+    """返回离线预计算的传播级联统计（规模、深度、各层广度、转发耗时、主要传播节点）"""
+    id = request.args.get('id')
+    if not id:
+        return jsonify({"error": "请提供微博推文ID"}), 400
+
+    item = cascade_stats.get_cascade_store(current_app.config).get(id)
+    if item is None:
+        return jsonify({"error": "该推文暂无预计算的传播统计"}), 404
+
+    stats, updated_at = item
+    return jsonify({"id": id, "stats": stats, "updated_at": updated_at})
+
 @api.route('/getOriginalTweetById', methods=['GET'])
+@_requires('nebula')
 def get_Original_Tweet_by_id():
     id = request.args.get('id')
     if not id:
         return jsonify({"error": "请提供微博推文ID"}), 400
 
     current_app.logger.info(f"查询微博推文ID: {id}")
-    space_name = current_app.config['NEBULA_SPACE']
-    result = nebula_service.get_Original_Tweet_by_id(id, space_name)
+    space_name = _space_name(request.args.get('space_name'))
+    if not space_name:
+        return jsonify({"error": "非法的图空间名称"}), 400
+    result = _cached_graph(
+        ('tweet', space_name, id),
+        lambda: nebula_service.get_Original_Tweet_by_id(id, space_name),
+    )
 
     if isinstance(result, dict) and "error" in result:
         return jsonify(result), 500
 
+    _record_results(len(result) if isinstance(result, list) else 0)
     return jsonify({
         "id": id,
         "results": result,
         "count": len(result) if isinstance(result, list) else 0
     })
 
+@api.route('/getTweetGraphById', methods=['GET'])
+@_requires('nebula')
+def get_tweet_graph_by_id():
+    """一次请求同时返回推文原文与传播图谱，两个查询并发执行"""
+    id = request.args.get('id')
+    if not id:
+        return jsonify({"error": "请提供微博推文ID"}), 400
+
+    current_app.logger.info(f"查询微博推文ID及传播图谱: {id}")
+    space_name = _space_name(request.args.get('space_name'))
+    if not space_name:
+        return jsonify({"error": "非法的图空间名称"}), 400
+    compact = _compact_requested()
+    config = current_app.config
+    tweet, graph = async_service.wait_all(
+        async_service.submit(
+            'io', config, _cached_graph, ('tweet', space_name, id),
+            lambda: nebula_service.get_Original_Tweet_by_id(id, space_name),
+        ),
+        async_service.submit(
+            'io', config, _cached_graph, ('id', space_name, id, compact),
+            lambda: nebula_service.get_graph_data_by_id(id, space_name, compact),
+        ),
+    )
+
+    for result in (tweet, graph):
+        if isinstance(result, dict) and "error" in result:
+            return jsonify(result), 500
+
+    _record_results(_graph_count(graph))
+    return jsonify({
+        "id": id,
+        "tweet": {"results": tweet, "count": len(tweet) if isinstance(tweet, list) else 0},
+        "graph": {"format": "compact" if compact else "rows", "results": graph, "count": _graph_count(graph)},
+    })
+
 # --- Search API Routes ---
 # 测试:curl -X POST "http://127.0.0.1:5001/api/search/text"   -H "Content-Type: application/x-www-form-urlencoded"   -d "queryContent=BGM一响，浓浓的归意再也掩饰不住了，2025年的春运已经开始了，希望每一个人都能快快乐 乐，平平安安的到家和家人团聚。&score=0.5"
 # 5192635628653361
 #武大男生被诬告性骚扰#现在看，武汉大学给的处分，草率了。所以说，高校处置舆情，一定要在事实的基础上，坚守原则，不要被“舆论”裹挟，而后退，更不要和稀泥。在这方面，武大应该向大连工业大学学习。
 
 @api.route('/search/text', methods=['POST'])
+@_requires('elasticsearch')
 def search_text_route():
     query_content = request.form.get('queryContent','减重版司美格鲁正式在中国上市')
     score = 0.3
@@ -101,17 +403,127 @@ def search_text_route():
     # except ValueError:
     #     return jsonify({"error": "'score' 参数必须是浮点数"}), 400
 
-    start_time = time.time()
-    results = search_service.search_text(query_content, score, current_app.config)
-    print(results)
-    duration = time.time() - start_time
-    current_app.logger.info(f"文本 '{query_content}' 搜索耗时: {duration:.2f}s")
-    
-    if isinstance(results, dict) and "error" in results:
-        return jsonify(results), 500
+    # 归一化后的查询文本相同（空白、全半角、话题标签差异）即复用缓存结果，不再访问ES
+    config = current_app.config
+    cache_key = ('text', search_service.normalize_query_text(query_content), score,
+                 config['ES_INDEX'], config['TEXT_SEARCH_TOP_K'])
+    cache = _text_result_cache()
+    results = cache.get(cache_key)
+    if results is None:
+        start_time = time.time()
+        results = search_service.search_text(query_content, score, current_app.config)
+        duration = time.time() - start_time
+        current_app.logger.info(f"文本 '{query_content}' 搜索耗时: {duration:.2f}s")
+
+        if isinstance(results, dict) and "error" in results:
+            return jsonify(results), 500
+
+        cache.set(cache_key, results)
+
+    # 未指定pageSize时保持原行为，返回完整结果
+    page_size = request.form.get('pageSize', type=int)
+    if page_size is None:
+        _record_results(len(results))
+        return jsonify({"search_results": results})
+    if page_size < 1:
+        return jsonify({"error": "'pageSize' 必须是正整数"}), 400
+    return _paginate_text_results(results, cache_key[1], page_size)
+
+
+def _cursor_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='text-cursor')
+
+def _paginate_text_results(results, normalized_query, page_size):
+    """服务端分页：按平台筛选后返回一页结果和前后页游标
+
+    完整的排序结果保存在文本结果缓存中（过期后按相同查询重新计算），
+    游标签名绑定查询与筛选条件，只记录偏移量。
+    """
+    page_size = min(page_size, current_app.config['TEXT_SEARCH_MAX_PAGE_SIZE'])
+    datasource = request.form.get('datasource') or None
+    cursor = request.form.get('cursor')
+    offset = 0
+    if cursor:
+        try:
+            state = _cursor_serializer().loads(cursor)
+        except BadSignature:
+            return jsonify({"error": "无效的 'cursor' 参数"}), 400
+        if state.get("q") != normalized_query or state.get("ds") != datasource:
+            return jsonify({"error": "'cursor' 与当前查询条件不一致"}), 400
+        offset = state["o"]
+
+    if datasource:
+        results = [c for c in results if c.get("datasource") == datasource]
+    total = len(results)
+
+    def make_cursor(o):
+        return _cursor_serializer().dumps({"q": normalized_query, "ds": datasource, "o": o})
+
+    _record_results(len(results[offset:offset + page_size]))
+    return jsonify({
+        "search_results": results[offset:offset + page_size],
+        "total": total,
+        "page_size": page_size,
+        "next_cursor": make_cursor(offset + page_size) if offset + page_size < total else None,
+        "prev_cursor": make_cursor(max(offset - page_size, 0)) if offset > 0 else None,
+    })
 
-    return jsonify({"search_results": results})
 
+def _text_result_cache():
+    """文本搜索结果缓存，可配置本机共享存储供多个worker共用"""
+    config = current_app.config
+    return result_cache.get_cache(
+        'text_results',
+        ttl=config['TEXT_RESULT_CACHE_TTL'],
+        max_bytes=config['TEXT_RESULT_CACHE_MAX_BYTES'],
+        shared_path=config['TEXT_RESULT_CACHE_SHARED_PATH'],
+        shared_max_bytes=config['TEXT_RESULT_CACHE_SHARED_MAX_BYTES'],
+    )
+
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """各结果缓存的命中率与占用"""
+    return jsonify(result_cache.all_cache_stats())
+
+def _search_result_cache():
+    """图片/视频搜索结果缓存，按上传文件的内容哈希和搜索参数索引"""
+    config = current_app.config
+    return result_cache.get_cache(
+        'search_results',
+        ttl=config['SEARCH_RESULT_CACHE_TTL'],
+        max_entries=config['SEARCH_RESULT_CACHE_MAX_ENTRIES'],
+        max_bytes=config['SEARCH_RESULT_CACHE_MAX_BYTES'],
+    )
+
+def _content_hash(filepath):
+    """上传文件以内容哈希命名，文件名主体即为哈希"""
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+def _save_upload(file):
+    """按内容哈希保存上传文件：边接收边计算sha256，相同内容只保存一份，不同文件不会因同名互相覆盖"""
+    extension = secure_filename(file.filename).rsplit('.', 1)[-1].lower()
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+                hasher.update(chunk)
+                out.write(chunk)
+        filepath = os.path.join(upload_folder, f"{hasher.hexdigest()}.{extension}")
+        if os.path.exists(filepath):
+            os.remove(tmp_path)
+            current_app.logger.info(f"文件已存在，复用: {filepath}")
+        else:
+            os.replace(tmp_path, filepath)
+            current_app.logger.info(f"文件已保存至: {filepath}")
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filepath
 
 def _handle_file_upload(file_key, allowed_checker):
     """处理文件上传的通用逻辑"""
@@ -124,18 +536,25 @@ def _handle_file_upload(file_key, allowed_checker):
         return None, jsonify({"error": "未选择文件"}), 400
     # print(allowed_checker)
     if file and allowed_checker(file.filename):
-        filename = secure_filename(file.filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-        current_app.logger.info(f"文件已保存至: {filepath}")
-        return filepath, None, None
+        return _save_upload(file), None, None
     else:
         return None, jsonify({"error": "文件类型不允许"}), 400
 
+def _thumbnail_urls(image_paths):
+    """将找到的图片路径转换为缩略图URL，缩略图在首次访问时生成"""
+    image_url_list = []
+    for image_path in image_paths:
+        # 注意：这里的路径应该是可访问的绝对路径或相对路径
+        # 此处暂时假设返回的是可以直接访问的完整路径
+        if os.path.isfile(image_path):
+            image_url_list.append(utils.media_url(image_path, current_app.config['THUMBNAIL_DEFAULT_WIDTH']))
+        else:
+            current_app.logger.warning(f"文件未找到: {image_path}")
+    return image_url_list
+
 # 测试:curl -X POST "http://127.0.0.1:5000/api/search/picture" -F "file=@/data/storage/8888/xyt/work/milvus_dataset/Image/250116/watermark_image/Fake_raw_00_00_00_1.jpg"
 @api.route('/search/picture', methods=['POST'])
+@_requires(_image_search_subsystems)
 def search_picture_route():
     filepath, error_response, status_code = _handle_file_upload('file', utils.is_picture_file_allowed)
     if error_response:
@@ -146,70 +565,251 @@ def search_picture_route():
     # except ValueError:
     #     return jsonify({"error": "'topk' 参数必须是整数"}), 400
 
+    cache_key = ('picture', _content_hash(filepath), current_app.config['MILVUS_IMAGE_COLLECTION'])
+    cached = _search_result_cache().get(cache_key)
+    if cached is not None:
+        _record_results(len(cached["search_results"]))
+        return jsonify(cached)
+
     results_path,results_mid = search_service.search_picture(filepath, current_app.config)
     
     if isinstance(results_path, dict) and "error" in results_path:
         return jsonify(results_path), 500
     
-    # 将找到的图片路径转换为base64返回
-    image_base64_list = []
+    # 将找到的图片路径转换为缩略图URL返回
+    image_url_list = []
     # results_path 的结构是 [[path1, path2], ...]
     if results_path and isinstance(results_path[0], list):
-        for image_path in results_path[0]: 
-            # 注意：这里的路径应该是可访问的绝对路径或相对路径
-            # 假设 search_service 返回的路径是需要拼接的
-            # full_image_path = os.path.join("/path/to/image/dataset", image_path) 
-            # 此处暂时假设返回的是可以直接访问的完整路径
-            image_base64 = utils.to_base64(image_path)
-            if image_base64:
-                image_type = "image/" + image_path.split('.')[-1]
-                data_url = f"data:{image_type};base64,{image_base64}"
-                image_base64_list.append(data_url)
+        image_url_list = _thumbnail_urls(results_path[0])
         
     results_event = []
     if results_mid and isinstance(results_mid[0], list):
-        for mid in results_mid[0]: 
-            #去es找事件
-            event = search_service.search_event_by_mid(mid, current_app.config)
-            results_event.append(event)
-    # print(results_event)
-
-    # return jsonify({"message": "图片上传成功", "image_base64_list": image_base64_list, "search_results": results_event})
-    # 展平列表
-    results_event = [item for sublist in results_event for item in sublist]
-    return jsonify({"search_results": results_event})
-
-# 测试:curl -X POST "http://127.0.0.1:5001/api/search/video" -F "file=@/data/storage/8888/xyt/work/milvus_dataset/video/raw_video/douyin_raw_1.mp4" -F "topk=5"
-@api.route('/search/video', methods=['POST'])
-def search_video_route():
-    filepath, error_response, status_code = _handle_file_upload('file', utils.is_video_file_allowed)
-    if error_response:
-        return error_response, status_code
-        
-    score = 1
-    print(score)
+        # 去es批量找事件，一次请求解析全部mid
+        results_event = search_service.search_events_by_mids(results_mid[0], current_app.config)
+        if isinstance(results_event, dict) and "error" in results_event:
+            return jsonify(results_event), 500
+
+    response = {"search_results": results_event, "image_url_list": image_url_list}
+    _search_result_cache().set(cache_key, response)
+    _record_results(len(results_event))
+    return jsonify(response)
+
+# 测试:curl -X POST "http://127.0.0.1:5000/api/search/pictures" -F "files=@a.jpg" -F "files=@b.jpg"
+@api.route('/search/pictures', methods=['POST'])
+@_requires(_image_search_subsystems)
+def search_pictures_route():
+    """批量图片搜索：一次请求上传多张图片，pHash并行计算，Milvus与ES各只请求一次"""
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        return jsonify({"error": "请求中缺少 'files'"}), 400
+    if len(files) > current_app.config['PICTURE_BATCH_MAX_FILES']:
+        return jsonify({"error": f"一次最多上传 {current_app.config['PICTURE_BATCH_MAX_FILES']} 张图片"}), 400
+    for file in files:
+        if not utils.is_picture_file_allowed(file.filename):
+            return jsonify({"error": f"文件类型不允许: {file.filename}"}), 400
+
+    filepaths = [_save_upload(file) for file in files]
+    cache = _search_result_cache()
+    collection = current_app.config['MILVUS_IMAGE_COLLECTION']
+    cache_keys = [('picture', _content_hash(path), collection) for path in filepaths]
+    responses = [cache.get(key) for key in cache_keys]
+
+    # 只对未命中缓存的图片（按内容去重）计算pHash并检索
+    pending = list(dict.fromkeys(path for path, cached in zip(filepaths, responses) if cached is None))
+    if pending:
+        results_path, results_mid = search_service.search_pictures(pending, current_app.config)
+        if isinstance(results_path, dict) and "error" in results_path:
+            return jsonify(results_path), 500
+
+        results_event = search_service.search_events_by_mid_groups(results_mid, current_app.config)
+        if isinstance(results_event, dict) and "error" in results_event:
+            return jsonify(results_event), 500
+
+        searched = {}
+        for path, paths, events in zip(pending, results_path, results_event):
+            searched[path] = {"search_results": events, "image_url_list": _thumbnail_urls(paths)}
+            cache.set(('picture', _content_hash(path), collection), searched[path])
+        responses = [cached if cached is not None else searched[path]
+                     for path, cached in zip(filepaths, responses)]
+
+    _record_results(sum(len(response["search_results"]) for response in responses))
+    return jsonify({"results": [
+        {"filename": file.filename, **response} for file, response in zip(files, responses)
+    ]})
+
+def _video_search_options():
+    """解析视频检索参数，返回 (options, 错误响应)
+
+    mode=cpu 时逐批抽帧检索，可通过 sample（'keyframes' 或秒间隔）和 early_exit 调整召回率与延迟
+    """
+    config = current_app.config
+    mode = request.form.get('mode') or config['VIDEO_SEARCH_MODE']
+    if mode not in ('pipeline', 'cpu'):
+        return None, (jsonify({"error": "mode 参数必须是 pipeline 或 cpu"}), 400)
+    sample = early_exit_score = None
+    if mode == 'cpu':
+        try:
+            sample = video_fingerprint.parse_sample(request.form.get('sample') or config['VIDEO_CPU_SAMPLE'])
+            early_exit_score = request.form.get('early_exit', type=float)
+        except ValueError:
+            return None, (jsonify({"error": "sample 参数必须是 keyframes 或正数秒间隔"}), 400)
     # try:
     #     top_k = int(top_k_str)
     # except ValueError:
     #     return jsonify({"error": "'topk' 参数必须是整数"}), 400
-        
-    results = search_service.search_video(filepath, score, current_app.config)
+    options = {"score": config['VIDEO_SEARCH_THRESHOLD'], "mode": mode, "sample": sample,
+               "early_exit_score": early_exit_score}
+    return options, None
+
+def _video_search(filepath, options, progress=None):
+    """执行视频检索并生成响应，返回 (response, error)
+
+    阻塞执行，由 /search/video 放到视频线程池、或由任务队列在后台调用；progress 为CPU模式的进度回调
+    """
+    config = current_app.config
+    cache_key = ('video', _content_hash(filepath), options["score"], config['MILVUS_VIDEO_COLLECTION'],
+                 options["mode"], options["sample"], options["early_exit_score"])
+    cached = _search_result_cache().get(cache_key)
+    if cached is not None:
+        return cached, None
+
+    stages = None
+    if options["mode"] == 'cpu':
+        results, stages = search_service.search_video_cpu(
+            filepath, options["score"], config, sample=options["sample"],
+            early_exit_score=options["early_exit_score"], progress=progress)
+    else:
+        results = search_service.search_video(filepath, options["score"], config)
 
     if isinstance(results, dict) and "error" in results:
-        return jsonify(results), 500
+        return None, results["error"]
 
-    video_base64_list = []
+    # 返回可流式播放的媒体URL，浏览器按需通过Range请求加载，不再内嵌base64
+    video_url_list = []
     if results and isinstance(results, list):
         for video_path in results:
              # 假设 search_service 返回的路径是可以直接访问的完整路径
-            print(video_path)
-            video_base64 = utils.to_base64(video_path)
-            if video_base64:
-                video_type = "video/mp4"
-                data_url = f"data:{video_type};base64,{video_base64}"
-                video_base64_list.append(data_url)
-
-    return jsonify({"message": "视频上传成功", "video_base64_list": video_base64_list})
+            if os.path.isfile(video_path):
+                video_url_list.append(utils.media_url(video_path))
+            else:
+                current_app.logger.warning(f"文件未找到: {video_path}")
+
+    response = {"message": "视频上传成功", "video_url_list": video_url_list}
+    if stages is not None:
+        response["stages"] = stages
+    _search_result_cache().set(cache_key, response)
+    return response, None
+
+# 测试:curl -X POST "http://127.0.0.1:5001/api/search/video" -F "file=@/data/storage/8888/xyt/work/milvus_dataset/video/raw_video/douyin_raw_1.mp4" -F "topk=5"
+@api.route('/search/video', methods=['POST'])
+@_requires('milvus', 'video')
+def search_video_route():
+    filepath, error_response, status_code = _handle_file_upload('file', utils.is_video_file_allowed)
+    if error_response:
+        return error_response, status_code
+
+    options, error_response = _video_search_options()
+    if error_response:
+        return error_response
+
+    # 视频检索在单独限流的线程池中执行，同时进行的视频检索数不超过 VIDEO_SEARCH_WORKERS
+    response, error = async_service.run('video', current_app.config, _video_search, filepath, options)
+    if error:
+        return jsonify({"error": error}), 500
+    _record_results(len(response["video_url_list"]))
+    return jsonify(response)
+
+# --- 视频检索任务（长视频不占用HTTP请求） ---
+# 测试:curl -X POST "http://127.0.0.1:5001/api/search/video/jobs" -F "file=@douyin_raw_1.mp4" -F "mode=cpu"
+@api.route('/search/video/jobs', methods=['POST'])
+@_requires('milvus', 'video')
+def submit_video_job():
+    """提交视频检索任务，立即返回任务id，之后轮询 status_url 或订阅 events_url（SSE）"""
+    filepath, error_response, status_code = _handle_file_upload('file', utils.is_video_file_allowed)
+    if error_response:
+        return error_response, status_code
+
+    options, error_response = _video_search_options()
+    if error_response:
+        return error_response
+
+    params = {"mode": options["mode"], "sample": options["sample"], "early_exit": options["early_exit_score"]}
+    try:
+        job = video_jobs.get_job_queue(current_app.config).submit(
+            lambda progress: _video_search(filepath, options, progress), params=params)
+    except video_jobs.QueueFullError as e:
+        return jsonify({"error": str(e)}), 429
+
+    job["status_url"] = url_for('api.get_video_job', job_id=job["job_id"])
+    job["events_url"] = url_for('api.video_job_events', job_id=job["job_id"])
+    return jsonify(job), 202
+
+@api.route('/search/video/jobs/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    """查询任务状态，完成时 result 与 /search/video 的响应相同"""
+    job = video_jobs.get_job_queue(current_app.config).get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(job)
+
+@api.route('/search/video/jobs/<job_id>/events', methods=['GET'])
+def video_job_events(job_id):
+    """以 Server-Sent Events 推送任务进度：progress 事件表示状态或进度变化，done / failed 事件后关闭"""
+    queue = video_jobs.get_job_queue(current_app.config)
+    if queue.get(job_id) is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    dumps = current_app.json.dumps
+    heartbeat = current_app.config['VIDEO_JOB_SSE_HEARTBEAT']
+
+    def generate():
+        version = -1
+        while True:
+            new_version, job = queue.wait(job_id, version, heartbeat)
+            if job is None:
+                yield f"event: failed\ndata: {dumps({'error': '任务不存在或已过期'})}\n\n"
+                return
+            if new_version == version:
+                # 保持连接，避免代理超时断开
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            if job["status"] in video_jobs.FINISHED:
+                yield f"event: {job['status']}\ndata: {dumps(job)}\n\n"
+                return
+            yield f"event: progress\ndata: {dumps(job)}\n\n"
+
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api.route('/media/<token>', methods=['GET'])
+def serve_media(token):
+    """按签名URL提供媒体文件或其缩略图，支持Range、ETag/Last-Modified及零拷贝发送"""
+    file_path = utils.resolve_media_token(token)
+    if not file_path or not os.path.isfile(file_path):
+        return jsonify({"error": "媒体文件不存在"}), 404
+
+    # 带宽度参数时返回缓存的缩略图
+    width = request.args.get('w', type=int)
+    if width:
+        try:
+            file_path = thumbnail_service.get_thumbnail(file_path, width, current_app.config)
+        except Exception as e:
+            current_app.logger.error(f"生成缩略图出错: {e}, 文件: {file_path}")
+            return jsonify({"error": "无法生成缩略图"}), 415
+
+    accel_prefix = current_app.config['MEDIA_X_ACCEL_PREFIX']
+    if accel_prefix:
+        # 交由nginx直接发送文件，Range与缓存校验也由nginx处理
+        response = current_app.response_class()
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + quote(file_path)
+        response.headers['Content-Type'] = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        return response
+
+    # conditional=True 处理Range/If-None-Match/If-Modified-Since，
+    # 文件对象交给WSGI服务器的file_wrapper（如gunicorn的sendfile）发送
+    return send_file(file_path, conditional=True, etag=True, max_age=current_app.config['MEDIA_MAX_AGE'])
 
 # --- General File Upload API ---
 @api.route('/upload', methods=['POST'])
@@ -0,0 +1,52 @@
+# /unified_service/services/async_service.py
+"""
+后端调用的线程池分发
+
+各后端客户端（ES、Milvus、Nebula连接池）都是阻塞调用。视图保持同步，WSGI（app.run / gunicorn）
+与 asgi.py 都可以直接运行；互不依赖的调用（如推文原文与传播图谱）用 submit 提交到线程池，
+再用 wait_all 一起等待，按负载类型使用不同的线程池：
+  - io:    ES / Milvus / Nebula 请求，线程数较多
+  - video: Towhee视频管线，单独限流，慢视频检索不会占满其他请求的线程
+"""
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# 按名称创建的线程池，首次使用时按配置的线程数创建
+_executors = {}
+_executors_lock = threading.Lock()
+
+_POOL_CONFIG_KEYS = {
+    'io': 'ASYNC_IO_WORKERS',
+    'video': 'VIDEO_SEARCH_WORKERS',
+}
+
+
+def _get_executor(pool, app_config):
+    with _executors_lock:
+        executor = _executors.get(pool)
+        if executor is None:
+            workers = app_config.get(_POOL_CONFIG_KEYS[pool])
+            executor = _executors[pool] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'async-{pool}')
+        return executor
+
+
+def submit(pool, app_config, func, *args, **kwargs):
+    """在指定线程池中执行阻塞函数，返回 Future，并传递当前上下文（Flask的 current_app / request 仍可用）"""
+    ctx = contextvars.copy_context()
+    return _get_executor(pool, app_config).submit(ctx.run, func, *args, **kwargs)
+
+
+def run(pool, app_config, func, *args, **kwargs):
+    """在指定线程池中执行并等待结果（用于限制同时执行的数量，如视频检索）"""
+    return submit(pool, app_config, func, *args, **kwargs).result()
+
+
+def wait_all(*futures):
+    """等待全部 Future 完成，按提交顺序返回结果（有异常时抛出第一个）"""
+    wait(futures)
+    return [future.result() for future in futures]
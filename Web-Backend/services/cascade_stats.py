@@ -0,0 +1,251 @@
+# /unified_service/services/cascade_stats.py
+"""
+原创微博传播级联统计的离线预计算
+
+遍历 NEBULA_SPACE 中所有 Original_Tweet 顶点，按 forwarded 边逐层展开转发树，
+计算传播规模、最大深度、各层广度、达到第N次转发的耗时以及主要传播节点，
+结果写入本地SQLite文件，查询接口按推文id直接读取，无需图遍历。
+
+离线构建（在 Web-Backend 目录下）:
+    python -m services.cascade_stats build
+
+原创推文用存储客户端按分片逐页扫描（需要能访问 NEBULA_META_HOSTS 及各storaged），
+不会一次把全部原创推文读入内存；发布时间取自同一顶点的 Article 标签。
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from services import nebula_service
+
+logger = logging.getLogger(__name__)
+
+# 进程内共享的统计存储
+_store = None
+_store_lock = threading.Lock()
+
+# 每条 GO 语句最多携带的起点数
+_FRONTIER_CHUNK = 1000
+
+
+class CascadeStatsStore:
+    """按推文id存储级联统计（JSON），主键查询"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cascade_stats ("
+            " mid TEXT PRIMARY KEY, stats TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _conn(self):
+        # sqlite连接不能跨线程共享，每个线程一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, mid):
+        """返回 (stats, updated_at)，未预计算时返回None"""
+        row = self._conn().execute("SELECT stats, updated_at FROM cascade_stats WHERE mid = ?", (mid,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put_many(self, items):
+        """批量写入 [(mid, stats), ...]"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR REPLACE INTO cascade_stats (mid, stats, updated_at) VALUES (?, ?, ?)",
+            [(mid, json.dumps(stats, ensure_ascii=False), now) for mid, stats in items],
+        )
+        conn.execute("COMMIT")
+
+    def set_meta(self, key, value):
+        self._conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cascade_stats").fetchone()[0]
+
+
+def get_cascade_store(app_config):
+    """获取级联统计存储，首次调用时打开 CASCADE_STATS_PATH"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CascadeStatsStore(app_config.get('CASCADE_STATS_PATH'))
+    return _store
+
+
+# --- 统计计算 ---
+
+def _go_from(frontier, space_name):
+    """从一批顶点反向展开一跳 forwarded 边，返回 [{vid, parent, t, uid}]"""
+    rows = []
+    for start in range(0, len(frontier), _FRONTIER_CHUNK):
+        chunk = frontier[start:start + _FRONTIER_CHUNK]
+        query = (
+            f"GO FROM {', '.join(nebula_service.render_literal(v) for v in chunk)} OVER forwarded REVERSELY "
+            "YIELD src(edge) AS vid, dst(edge) AS parent, properties($$).republishtime AS t, properties($$).reuid AS uid"
+        )
+        result = nebula_service.execute_query(query, space_name=space_name, name='cascade_hop')
+        if isinstance(result, dict) and "error" in result:
+            raise RuntimeError(result["error"])
+        rows.extend(result)
+    return rows
+
+
+def summarize_cascade(publish_time, retweets, children, milestones=(10, 100, 1000), top_k=10):
+    """由转发树计算统计
+
+    retweets: [(depth, time, vid, uid)]；children: {vid: 直接转发数}
+    时间戳与 process_value 一致按毫秒处理，耗时以秒为单位
+    """
+    breadth = Counter(depth for depth, _, _, _ in retweets)
+    max_depth = max(breadth) if breadth else 0
+    times = sorted(t for _, t, _, _ in retweets if isinstance(t, (int, float)))
+    time_to_n = {}
+    for n in milestones:
+        if isinstance(publish_time, (int, float)) and len(times) >= n:
+            time_to_n[str(n)] = max(times[n - 1] - publish_time, 0) / 1000
+        else:
+            time_to_n[str(n)] = None
+    spreaders = sorted(
+        ((children[vid], vid, uid) for _, _, vid, uid in retweets if children.get(vid)),
+        key=lambda item: (-item[0], item[1]),
+    )[:top_k]
+    return {
+        "size": len(retweets),
+        "max_depth": max_depth,
+        "breadth": [breadth[d] for d in range(1, max_depth + 1)],
+        "root_children": breadth[1],
+        "time_to_n": time_to_n,
+        "top_spreaders": [{"mid": vid, "uid": uid, "retweets": count} for count, vid, uid in spreaders],
+    }
+
+
+def compute_batch(roots, space_name, max_depth=10, milestones=(10, 100, 1000), top_k=10):
+    """同时展开一批原创推文的转发树，roots 为 {vid: 发布时间}，返回 [(vid, stats)]"""
+    root_of = {vid: vid for vid in roots}
+    retweets = defaultdict(list)
+    children = Counter()
+    frontier = list(roots)
+    for depth in range(1, max_depth + 1):
+        if not frontier:
+            break
+        next_frontier = []
+        for row in _go_from(frontier, space_name):
+            vid, parent = row["vid"], row["parent"]
+            if vid in root_of or parent not in root_of:
+                continue
+            root = root_of[vid] = root_of[parent]
+            children[parent] += 1
+            retweets[root].append((depth, row.get("t"), vid, row.get("uid")))
+            next_frontier.append(vid)
+        frontier = next_frontier
+
+    return [
+        (vid, summarize_cascade(publish_time, retweets[vid], children, milestones, top_k))
+        for vid, publish_time in roots.items()
+    ]
+
+
+def _iter_original_tweets(app_config, page_size):
+    """按分片扫描全部 Original_Tweet 顶点，逐页返回顶点id列表"""
+    from nebula3.mclient import MetaCache
+    from nebula3.sclient.GraphStorageClient import GraphStorageClient
+
+    meta_cache = MetaCache(app_config.get('NEBULA_META_HOSTS'), 50000)
+    storage_client = GraphStorageClient(meta_cache)
+    try:
+        result = storage_client.scan_vertex(
+            space_name=app_config.get('NEBULA_SPACE'), tag_name='Original_Tweet',
+            prop_names=['forwardcount'], limit=page_size,
+        )
+        while result.has_next():
+            page = result.next()
+            if page is None:
+                continue
+            vids = []
+            for vertex in page:
+                vid = vertex.get_id()
+                vids.append(vid.as_string() if vid.is_string() else vid.as_int())
+            if vids:
+                yield vids
+    finally:
+        storage_client.close()
+        meta_cache.close()
+
+
+def _fetch_publish_times(vids, space_name):
+    """从 Article 标签读取一批原创推文的发布时间（Original_Tweet 上没有发布时间），返回 {vid: 发布时间}"""
+    result = nebula_service.execute_query(
+        f"FETCH PROP ON Article {', '.join(nebula_service.render_literal(v) for v in vids)} "
+        "YIELD id(vertex) AS vid, properties(vertex).publishtimestamp AS t",
+        space_name=space_name,
+        name='cascade_roots',
+    )
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(result["error"])
+    times = {row["vid"]: row.get("t") for row in result}
+    return {vid: times.get(vid) for vid in vids}
+
+
+def build_statistics(app_config):
+    """遍历全部原创推文，计算级联统计并写入 CASCADE_STATS_PATH"""
+    space_name = app_config.get('NEBULA_SPACE')
+    store = CascadeStatsStore(app_config.get('CASCADE_STATS_PATH'))
+    batch_size = app_config.get('CASCADE_STATS_BATCH')
+    start_time = time.time()
+
+    done = 0
+    for page in _iter_original_tweets(app_config, batch_size):
+        for start in range(0, len(page), batch_size):
+            roots = _fetch_publish_times(page[start:start + batch_size], space_name)
+            stats = compute_batch(
+                roots, space_name,
+                max_depth=app_config.get('CASCADE_STATS_MAX_DEPTH'),
+                milestones=app_config.get('CASCADE_STATS_MILESTONES'),
+                top_k=app_config.get('CASCADE_STATS_TOP_SPREADERS'),
+            )
+            store.put_many(stats)
+            done += len(roots)
+        logger.info(f"已统计 {done} 条原创推文")
+
+    store.set_meta('built_at', time.time())
+    store.set_meta('space_name', space_name)
+    logger.info(f"级联统计已保存至 {store.path}，耗时 {time.time() - start_time:.1f}s")
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="预计算原创微博的传播级联统计")
+    parser.add_argument('command', choices=['build'], help="build: 遍历全部原创推文并重建统计")
+    parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    app_config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    nebula_service.init_nebula_pool(app_config)
+    build_statistics(app_config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+# /unified_service/services/hamming_index.py
+"""
+本地pHash汉明索引（IMAGE_SEARCH_BACKEND 为 'local' / 'local+milvus' 时使用）
+
+快照从 MILVUS_IMAGE_COLLECTION 全量导出生成，入库新图片后需重新导出：
+    python -m services.hamming_index build [--output DIR]
+"""
+
+import argparse
+import itertools
+import shutil
+import json
+import logging
+import os
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 进程内共享的本地图像索引（从快照加载）
+_local_index = None
+_local_index_lock = threading.Lock()
+
+# 全量扫描时每块的行数
+_SCAN_BLOCK = 1 << 20
+
+# 8位查找表，用于不支持 np.bitwise_count 的NumPy版本
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_rows(words):
+    """按行统计 uint64 矩阵中置位的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.uint16)
+    as_bytes = words.view(np.uint8).reshape(words.shape[0], -1)
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=1, dtype=np.uint16)
+
+
+def pack_codes(vectors, dim):
+    """把二值向量（bytes，与Milvus BINARY_VECTOR格式相同）打包为 uint64 矩阵"""
+    n_bytes = dim // 8
+    buf = b''.join(bytes(v) for v in vectors)
+    if len(buf) != n_bytes * len(vectors):
+        raise ValueError(f"二值向量长度应为 {n_bytes} 字节")
+    return np.frombuffer(buf, dtype='<u8').reshape(len(vectors), dim // 64).copy()
+
+
+class HammingIndex:
+    """本地二值向量索引，search接口与 MilvusClient.search 兼容
+
+    采用多索引哈希(MIH)：把每个编码切分为 mih_chunks 段，每段建一张有序表。
+    若两个编码的汉明距离 d <= m*(r+1)-1，则至少有一段的距离不超过 r，
+    因此按段逐级扩大探测半径即可得到精确的近邻，近重复图片通常只需探测很小的半径。
+    候选过多时退化为对全部编码的向量化 popcount 扫描，结果同样精确。
+    """
+
+    def __init__(self, dim=256, mih_chunks=16, scan_fraction=0.02):
+        if dim % 64 or dim % mih_chunks or (dim // mih_chunks) not in (8, 16, 32):
+            raise ValueError("dim 必须是64的倍数，且每段为8、16或32位")
+        self.dim = dim
+        self.mih_chunks = mih_chunks
+        self.chunk_bits = dim // mih_chunks
+        self._chunk_dtype = np.dtype(f'<u{self.chunk_bits // 8}')
+        # 候选数超过总数的该比例时直接全量扫描
+        self.scan_fraction = scan_fraction
+        self._codes = np.empty((0, dim // 64), dtype=np.uint64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._fields = {}
+        self._tables = None
+        self._lock = threading.Lock()
+        self._probe_masks = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    # --- 写入 ---
+
+    def insert(self, collection_name=None, data=None, vector_field='vector', **kwargs):
+        """写入实体，data 与 MilvusClient.insert 相同：[{vector_field: bytes, 其他字段...}]"""
+        data = data or []
+        if not data:
+            return {"insert_count": 0, "ids": []}
+        codes = pack_codes([row[vector_field] for row in data], self.dim)
+        fields = {}
+        for row in data:
+            for name in row:
+                if name != vector_field:
+                    fields.setdefault(name, [])
+        for name in fields:
+            fields[name] = [row.get(name) for row in data]
+        ids = self.add(codes, fields)
+        return {"insert_count": len(ids), "ids": ids.tolist()}
+
+    def add(self, codes, fields=None, ids=None):
+        """批量写入已打包的编码，fields 为 {字段名: 与codes等长的列表}"""
+        codes = np.ascontiguousarray(codes, dtype=np.uint64)
+        with self._lock:
+            start = int(self._ids[-1]) + 1 if len(self._ids) else 0
+            if ids is None:
+                ids = np.arange(start, start + len(codes), dtype=np.int64)
+            ids = np.asarray(ids, dtype=np.int64)
+            old_len = len(self._ids)
+            new_fields = {}
+            for name in set(self._fields) | set(fields or {}):
+                column = self._fields.get(name, [None] * old_len)
+                new_fields[name] = list(column) + list((fields or {}).get(name, [None] * len(codes)))
+            # 整体替换引用，正在进行的搜索继续使用旧的数组
+            self._codes = np.concatenate([self._codes, codes])
+            self._ids = np.concatenate([self._ids, ids])
+            self._fields = new_fields
+            self._tables = None
+        return ids
+
+    # --- 多索引哈希表 ---
+
+    def _chunk_values(self, codes):
+        """取出每段的整数值，返回形状 (n, mih_chunks) 的矩阵（小端视图，无需拷贝位）"""
+        return codes.view(self._chunk_dtype).reshape(len(codes), self.mih_chunks)
+
+    def _build_tables(self, codes):
+        chunk_values = self._chunk_values(codes)
+        tables = []
+        for j in range(self.mih_chunks):
+            column = chunk_values[:, j]
+            order = np.argsort(column, kind='stable').astype(np.int64)
+            tables.append((column[order], order))
+        return tables
+
+    def _get_tables(self):
+        with self._lock:
+            if self._tables is None:
+                self._tables = self._build_tables(self._codes)
+            return self._codes, self._ids, self._fields, self._tables
+
+    def _masks(self, radius):
+        """段内距离恰好为radius的所有异或掩码"""
+        masks = self._probe_masks.get(radius)
+        if masks is None:
+            masks = np.array(
+                [sum(1 << b for b in combo) for combo in itertools.combinations(range(self.chunk_bits), radius)],
+                dtype=self._chunk_dtype,
+            )
+            self._probe_masks[radius] = masks
+        return masks
+
+    # --- 搜索 ---
+
+    def _scan(self, codes, query, max_distance, limit):
+        """向量化 popcount 全量扫描，分块计算以限制临时内存"""
+        best_rows = []
+        best_dist = []
+        for start in range(0, len(codes), _SCAN_BLOCK):
+            block = np.asarray(codes[start:start + _SCAN_BLOCK])
+            distances = _popcount_rows(block ^ query)
+            rows, distances = self._top(np.arange(start, start + len(block)), distances, max_distance, limit)
+            best_rows.append(rows)
+            best_dist.append(distances)
+        if not best_rows:
+            return np.empty(0, np.int64), np.empty(0, np.uint16)
+        return self._top(np.concatenate(best_rows), np.concatenate(best_dist), None, limit)
+
+    @staticmethod
+    def _top(rows, distances, max_distance, limit):
+        """按距离（相同时按行号）取前limit个，可选只保留距离小于max_distance的结果"""
+        if max_distance is not None:
+            keep = distances < max_distance
+            rows, distances = rows[keep], distances[keep]
+        if len(rows) > limit:
+            part = np.argpartition(distances, limit - 1)[:limit]
+            rows, distances = rows[part], distances[part]
+        order = np.lexsort((rows, distances))
+        return rows[order], distances[order]
+
+    def _search_one(self, codes, tables, query, limit, max_distance):
+        """单个查询：逐级扩大段内探测半径，候选过多时改为全量扫描"""
+        n = len(codes)
+        budget = self.scan_fraction * n
+        query_chunks = self._chunk_values(query[None, :])[0]
+        seen = np.zeros(n, dtype=bool)
+        cand_rows = []
+        cand_dist = []
+        found = 0
+        for radius in range(self.chunk_bits + 1):
+            masks = self._masks(radius)
+            ranges = []
+            total = 0
+            for j, (values, order) in enumerate(tables):
+                probes = query_chunks[j] ^ masks
+                lo = np.searchsorted(values, probes, side='left')
+                hi = np.searchsorted(values, probes, side='right')
+                ranges.append((order, lo, hi - lo))
+                total += int((hi - lo).sum())
+            # 先统计本轮候选数，超出预算时不再收集，直接扫描
+            if found + total > budget:
+                return self._scan(codes, query, max_distance, limit)
+
+            new_rows = []
+            for order, lo, counts in ranges:
+                count = int(counts.sum())
+                if count:
+                    starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+                    new_rows.append(order[starts + np.arange(count)])
+            if new_rows:
+                rows = np.unique(np.concatenate(new_rows))
+                rows = rows[~seen[rows]]
+                seen[rows] = True
+                found += len(rows)
+                cand_rows.append(rows)
+                cand_dist.append(_popcount_rows(np.asarray(codes[rows]) ^ query))
+
+            # 此时所有距离 <= covered 的编码都已找到
+            covered = self.mih_chunks * (radius + 1) - 1
+            if max_distance is not None and covered >= max_distance - 1:
+                break
+            if cand_dist and int((np.concatenate(cand_dist) <= covered).sum()) >= limit:
+                break
+
+        if not cand_rows:
+            return np.empty(0, np.int64), np.empty(0, np.uint16)
+        return self._top(np.concatenate(cand_rows), np.concatenate(cand_dist), max_distance, limit)
+
+    def search(self, collection_name=None, data=None, limit=10, output_fields=None,
+               search_params=None, max_distance=None, **kwargs):
+        """返回格式与 MilvusClient.search 相同：每个查询一个 [{"id", "distance", "entity"}] 列表
+
+        max_distance 或 search_params["params"]["radius"] 用于只返回距离小于该值的结果
+        """
+        if max_distance is None and search_params:
+            max_distance = (search_params.get('params') or {}).get('radius')
+        codes, ids, fields, tables = self._get_tables()
+        queries = pack_codes(data or [], self.dim)
+        output_fields = [f for f in (output_fields or []) if f in fields]
+
+        results = []
+        for query in queries:
+            if len(codes) == 0 or limit <= 0:
+                results.append([])
+                continue
+            rows, distances = self._search_one(codes, tables, query, limit, max_distance)
+            hits = []
+            for row, distance in zip(rows.tolist(), distances.tolist()):
+                hits.append({
+                    "id": int(ids[row]),
+                    "distance": float(distance),
+                    "entity": {name: fields[name][row] for name in output_fields},
+                })
+            results.append(hits)
+        return results
+
+    # --- 快照 ---
+
+    def save(self, path):
+        """保存快照到目录：编码、主键、多索引表均为.npy，可被mmap快速加载"""
+        codes, ids, fields, tables = self._get_tables()
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'codes.npy'), codes)
+        np.save(os.path.join(path, 'ids.npy'), ids)
+        for j, (values, order) in enumerate(tables):
+            np.save(os.path.join(path, f'chunk_{j}_values.npy'), values)
+            np.save(os.path.join(path, f'chunk_{j}_order.npy'), order)
+        with open(os.path.join(path, 'fields.json'), 'w', encoding='utf-8') as f:
+            json.dump(fields, f, ensure_ascii=False)
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({"dim": self.dim, "mih_chunks": self.mih_chunks, "count": len(ids)}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """从快照目录加载索引"""
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        index = cls(dim=meta['dim'], mih_chunks=meta['mih_chunks'])
+        mmap_mode = 'r' if mmap else None
+        index._codes = np.load(os.path.join(path, 'codes.npy'), mmap_mode=mmap_mode)
+        index._ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode=mmap_mode)
+        index._tables = [
+            (np.load(os.path.join(path, f'chunk_{j}_values.npy'), mmap_mode=mmap_mode),
+             np.load(os.path.join(path, f'chunk_{j}_order.npy'), mmap_mode=mmap_mode))
+            for j in range(index.mih_chunks)
+        ]
+        with open(os.path.join(path, 'fields.json'), encoding='utf-8') as f:
+            index._fields = json.load(f)
+        return index
+
+
+def get_local_index(app_config):
+    """获取本地图像索引，首次调用时从 LOCAL_IMAGE_INDEX_PATH 加载快照，快照不存在时抛出 FileNotFoundError"""
+    global _local_index
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                path = app_config.get('LOCAL_IMAGE_INDEX_PATH')
+                if not path or not os.path.exists(os.path.join(path, 'meta.json')):
+                    raise FileNotFoundError(
+                        f"未找到本地图像索引快照: {path}，请先执行 python -m services.hamming_index build")
+                _local_index = HammingIndex.load(path)
+                logger.info(f"本地图像索引加载成功，共 {len(_local_index)} 条")
+    return _local_index
+
+
+def _binary_vector(value):
+    # 不同版本的pymilvus查询二值向量时返回 bytes 或 [bytes]
+    if isinstance(value, list):
+        value = value[0]
+    return bytes(value)
+
+
+def export_from_milvus(milvus_client, collection_name, path, vector_field='vector', batch_size=10000,
+                       output_fields=('data_path', 'mid')):
+    """把Milvus图片集合全量导出为本地索引快照
+
+    先写入临时目录，完成后替换 path，导出过程中正在运行的服务仍可读取旧快照。
+    """
+    index = HammingIndex()
+    iterator = milvus_client.query_iterator(
+        collection_name=collection_name, batch_size=batch_size, filter='',
+        output_fields=[vector_field, *output_fields],
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            index.insert(data=[
+                {vector_field: _binary_vector(row[vector_field]), **{f: row.get(f) for f in output_fields}}
+                for row in rows
+            ], vector_field=vector_field)
+            logger.info(f"已导出 {len(index)} 条")
+    finally:
+        iterator.close()
+
+    tmp_path = f"{path.rstrip(os.sep)}.tmp"
+    old_path = f"{path.rstrip(os.sep)}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    index.save(tmp_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return len(index)
+
+
+def main():
+    from config import Config
+    from pymilvus import MilvusClient
+
+    parser = argparse.ArgumentParser(description="从Milvus图片集合导出本地汉明索引快照")
+    parser.add_argument('command', choices=['build'], help="build: 全量导出并替换快照")
+    parser.add_argument('--output', default=Config.LOCAL_IMAGE_INDEX_PATH, help="快照目录")
+    parser.add_argument('--collection', default=Config.MILVUS_IMAGE_COLLECTION)
+    parser.add_argument('--vector-field', default='vector', help="集合中的二值向量字段")
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    client = MilvusClient(uri=Config.MILVUS_URI, token=Config.MILVUS_TOKEN)
+    count = export_from_milvus(client, args.collection, args.output, vector_field=args.vector_field,
+                               batch_size=args.batch_size)
+    logger.info(f"本地图像索引已保存至 {args.output}，共 {count} 条；重启服务后生效")
+
+
+if __name__ == '__main__':
+    main()
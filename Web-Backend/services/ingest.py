@@ -0,0 +1,492 @@
+# /unified_service/services/ingest.py
+"""
+稿件批量入库：把JSONL稿件导出文件一次流式写入 ES、Milvus 和 NebulaGraph
+
+每行一条稿件，字段与ES文档一致（见 search_service.ARTICLE_SOURCE_FIELDS），另可包含：
+  - eid / rumor_c / forwardcount:   Nebula Article / Original_Tweet 属性
+  - rootmid / parentmid:            转发稿件的根微博与上级微博id（生成 forwarded 边）
+  - pic_paths:                      本地图片路径列表（相对路径以 --image-root 为根），计算pHash后写入Milvus
+
+按 INGEST_BATCH_SIZE 行切分批次，由 INGEST_WORKERS 个线程并行处理，
+同时在途的批次不超过 INGEST_MAX_IN_FLIGHT，读取速度不会超过写入速度。
+每批依次执行：
+  - es:     bulk 写入 ES_INDEX（以稿件id为 _id，重复写入会覆盖）
+  - milvus: pHash（与图片检索相同的 calculate_phash_signature，进程池并行）后，先按mid删除这些稿件已有的图片，
+            再批量插入 MILVUS_IMAGE_COLLECTION（重复写入不会产生重复图片）
+  - nebula: 按标签分组的 INSERT VERTEX / INSERT EDGE（重复写入会覆盖）
+各阶段独立重试；重试仍失败的批次写入 <checkpoint>.failed.jsonl，每条记录的 _ingest_sinks 字段
+为失败的阶段，重新导入该文件时只写入这些阶段，已成功的阶段不会重复写入：
+    python -m services.ingest run ingest_checkpoint.json.failed.jsonl --checkpoint retry_checkpoint.json
+
+断点续传：每个文件已连续完成的行数记录在 INGEST_CHECKPOINT_PATH，重新运行时从该行继续。
+中断时尚在途的批次会被重新处理，各阶段的写入都是幂等的。
+
+用法（在 Web-Backend 目录下）:
+    python -m services.ingest run dumps/*.jsonl
+    python -m services.ingest run dumps/part-0001.jsonl.gz --sinks es,nebula --workers 8
+    python -m services.ingest run dumps/*.jsonl --restart --report ingest_report.json
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from services import nebula_service, phash_service
+
+logger = logging.getLogger(__name__)
+
+SINKS = ('es', 'milvus', 'nebula')
+
+# 写入ES的字段，与检索时读取的字段一致
+ES_FIELDS = ["id", "title", "content", "publishtime", "event", "uid", "uname",
+             "isrumor", "datasource", "istweet", "isretweet", "retext", "pic_ids", "pic_urls"]
+
+# Milvus图像集合中存放pHash的向量字段
+MILVUS_VECTOR_FIELD = 'vector'
+
+# .failed.jsonl 中记录需要重新写入的阶段的字段
+FAILED_SINKS_FIELD = '_ingest_sinks'
+
+# 各标签写入的属性（类型见 nebula_service.PROPERTY_TYPES）
+_ARTICLE_PROPS = ('title', 'content', 'publishtimestamp', 'event', 'uid', 'pics_id',
+                  'pics_url', 'isrumor', 'rumor_c', 'datasource', 'eid')
+_ORIGINAL_TWEET_PROPS = ('forwardcount',)
+_RETWEET_PROPS = ('reuid', 'retext', 'republishtime', 'rootmid', 'parentmid', 'name')
+
+
+class Checkpoint:
+    """记录每个文件已连续完成的行数
+
+    批次可能乱序完成，只有前面的批次都完成后才推进该文件的位置，
+    因此续传时最多重复处理中断时在途的批次，不会遗漏。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}  # file -> {start_line: end_line}
+        self.files = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get('files', {})
+
+    def position(self, file):
+        return self.files.get(file, 0)
+
+    def mark_done(self, file, start, end):
+        with self._lock:
+            pending = self._pending.setdefault(file, {})
+            pending[start] = end
+            position = self.files.get(file, 0)
+            if position not in pending:
+                return
+            while position in pending:
+                position = pending.pop(position)
+            self.files[file] = position
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files, 'updated_at': time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class IngestStats:
+    """入库吞吐统计：各阶段的写入量与累计耗时"""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+        self.records = 0
+        self.failed_batches = 0
+        self.failed_records = 0
+        self.counts = {}   # 如 es_docs / milvus_images / nebula_vertices
+        self.seconds = {}  # 各阶段累计耗时（多线程并行时可大于总耗时）
+
+    def add(self, sink, seconds=0.0, **counts):
+        with self._lock:
+            self.seconds[sink] = self.seconds.get(sink, 0.0) + seconds
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+
+    def add_records(self, n):
+        with self._lock:
+            self.records += n
+
+    def add_failed_batch(self, n):
+        with self._lock:
+            self.failed_batches += 1
+            self.failed_records += n
+
+    def report(self):
+        with self._lock:
+            elapsed = time.time() - self.start_time
+            return {
+                "elapsed": round(elapsed, 1),
+                "records": self.records,
+                "records_per_sec": round(self.records / elapsed, 1) if elapsed else 0.0,
+                "failed_batches": self.failed_batches,
+                "failed_records": self.failed_records,
+                "counts": dict(self.counts),
+                "stage_seconds": {sink: round(s, 1) for sink, s in self.seconds.items()},
+                "stage_records_per_sec": {
+                    sink: round(self.records / s, 1) if s else 0.0 for sink, s in self.seconds.items()
+                },
+            }
+
+
+# --- 读取 ---
+
+def _open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_batches(path, batch_size, start_line=0):
+    """按批读取JSONL文件，yield (start_line, end_line, records)，行号从0开始、不含 end_line"""
+    records = []
+    batch_start = start_line
+    line_no = -1
+    with _open_dump(path) as f:
+        for line_no, line in enumerate(f):
+            if line_no < start_line:
+                continue
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    logger.warning(f"跳过无法解析的行 {path}:{line_no + 1}: {e}")
+            if line_no + 1 - batch_start >= batch_size:
+                yield batch_start, line_no + 1, records
+                records = []
+                batch_start = line_no + 1
+    if line_no + 1 > batch_start:
+        yield batch_start, line_no + 1, records
+
+
+# --- 字段转换 ---
+
+def _to_millis(value):
+    """把发布时间转换为毫秒时间戳（与 process_value 的读取方式一致）"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        # 秒级时间戳按毫秒存储
+        return int(value * 1000) if value < 1e11 else int(value)
+    value = str(value).strip()
+    if value.isdigit():
+        return _to_millis(int(value))
+    try:
+        return int(datetime.fromisoformat(value.replace('/', '-')).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def _join(value):
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(v) for v in value)
+    return value
+
+
+def _prop_literal(name, value):
+    """按 PROPERTY_TYPES 把属性值渲染为nGQL字面量"""
+    prop_type = nebula_service.PROPERTY_TYPES.get(name)
+    if value is None:
+        return 'NULL'
+    if prop_type == 'bool':
+        if isinstance(value, str):
+            value = value.strip().lower() in ('1', 'true', 'yes')
+        return nebula_service.render_literal(bool(value))
+    if prop_type in ('int', 'timestamp'):
+        value = _to_millis(value) if prop_type == 'timestamp' else value
+        try:
+            return nebula_service.render_literal(int(value))
+        except (TypeError, ValueError):
+            return 'NULL'
+    return nebula_service.render_literal(str(value))
+
+
+def _is_retweet(record):
+    return bool(record.get('isretweet')) and bool(record.get('parentmid'))
+
+
+def graph_rows(records):
+    """把一批稿件转换为按标签/边类型分组的行：{(kind, name, props): [(vid 或 (src, dst), values)]}"""
+    groups = {}
+
+    def add(kind, name, props, key, values):
+        groups.setdefault((kind, name, props), {})[key] = values
+
+    for record in records:
+        vid = record.get('id')
+        if vid is None:
+            continue
+        vid = str(vid)
+        if _is_retweet(record):
+            values = {
+                'reuid': record.get('uid'), 'retext': record.get('retext') or record.get('content'),
+                'republishtime': record.get('publishtime'), 'rootmid': record.get('rootmid'),
+                'parentmid': record.get('parentmid'), 'name': record.get('uname'),
+            }
+            add('vertex', 'Retweet', _RETWEET_PROPS, vid, [values[p] for p in _RETWEET_PROPS])
+            add('edge', 'forwarded', (), (vid, str(record['parentmid'])), [])
+            continue
+
+        values = {
+            'title': record.get('title'), 'content': record.get('content'),
+            'publishtimestamp': record.get('publishtime'), 'event': record.get('event'),
+            'uid': record.get('uid'), 'pics_id': _join(record.get('pic_ids')),
+            'pics_url': _join(record.get('pic_urls')), 'isrumor': record.get('isrumor'),
+            'rumor_c': record.get('rumor_c'), 'datasource': record.get('datasource'),
+            'eid': record.get('eid'),
+        }
+        if record.get('istweet'):
+            props = _ARTICLE_PROPS + _ORIGINAL_TWEET_PROPS
+            values['forwardcount'] = record.get('forwardcount', 0)
+            add('vertex', 'Article,Original_Tweet', props, vid, [values[p] for p in props])
+        else:
+            add('vertex', 'Article', _ARTICLE_PROPS, vid, [values[p] for p in _ARTICLE_PROPS])
+        if record.get('event'):
+            event_vid = str(record.get('eid') or record['event'])
+            add('vertex', 'Event', ('eventstr',), event_vid, [record['event']])
+            add('edge', 'belong', (), (vid, event_vid), [])
+    return groups
+
+
+def _insert_statements(groups, rows_per_statement):
+    """生成批量 INSERT 语句，每条语句最多 rows_per_statement 行"""
+    for (kind, name, props), rows in groups.items():
+        items = list(rows.items())
+        for start in range(0, len(items), rows_per_statement):
+            chunk = items[start:start + rows_per_statement]
+            if kind == 'vertex':
+                tags = name.split(',')
+                schema = ', '.join(
+                    f"{tag}({', '.join(p for p in props if _tag_of(tag, p))})" for tag in tags
+                )
+                values = ', '.join(
+                    f"{nebula_service.render_literal(vid)}:({', '.join(_prop_literal(p, v) for p, v in zip(props, vals))})"
+                    for vid, vals in chunk
+                )
+                yield f"INSERT VERTEX {schema} VALUES {values}", len(chunk), 0
+            else:
+                values = ', '.join(
+                    f"{nebula_service.render_literal(src)}->{nebula_service.render_literal(dst)}:()"
+                    for (src, dst), _ in chunk
+                )
+                yield f"INSERT EDGE {name}() VALUES {values}", 0, len(chunk)
+
+
+def _tag_of(tag, prop):
+    """多标签写入时判断属性属于哪个标签"""
+    if tag == 'Original_Tweet':
+        return prop in _ORIGINAL_TWEET_PROPS
+    if tag == 'Article':
+        return prop in _ARTICLE_PROPS
+    return True
+
+
+# --- 写入 ---
+
+class Ingestor:
+    """把批次写入各存储，客户端在所有工作线程间共享"""
+
+    def __init__(self, app_config, sinks=SINKS, image_root=None, stats=None):
+        self.app_config = app_config
+        self.sinks = tuple(sinks)
+        self.image_root = image_root
+        self.stats = stats or IngestStats()
+        self.retries = app_config.get('INGEST_RETRIES')
+        self.es_client = None
+        self.milvus_client = None
+        if 'es' in self.sinks:
+            from elasticsearch import Elasticsearch
+            self.es_client = Elasticsearch(hosts=app_config.get('ES_HOSTS'), basic_auth=app_config.get('ES_AUTH'))
+        if 'milvus' in self.sinks:
+            from pymilvus import MilvusClient
+            self.milvus_client = MilvusClient(uri=app_config.get('MILVUS_URI'), token=app_config.get('MILVUS_TOKEN'))
+        if 'nebula' in self.sinks:
+            nebula_service.init_nebula_pool(app_config)
+
+    def process(self, records):
+        """依次写入各存储，返回失败的阶段列表
+
+        带 FAILED_SINKS_FIELD 的记录（来自 .failed.jsonl）只写入其中列出的阶段
+        """
+        failed = []
+        for sink in self.sinks:
+            batch = [record for record in records if sink in record.get(FAILED_SINKS_FIELD, SINKS)]
+            if batch and not self._with_retries(sink, getattr(self, f'_write_{sink}'), batch):
+                failed.append(sink)
+        return failed
+
+    def _with_retries(self, sink, func, records):
+        for attempt in range(self.retries + 1):
+            try:
+                start = time.perf_counter()
+                counts = func(records)
+                self.stats.add(sink, time.perf_counter() - start, **counts)
+                return True
+            except Exception as e:
+                logger.warning(f"{sink} 写入失败（第{attempt + 1}次）: {e}")
+                if attempt < self.retries:
+                    time.sleep(min(2 ** attempt, 30))
+        return False
+
+    def _write_es(self, records):
+        from elasticsearch.helpers import bulk
+
+        index = self.app_config.get('ES_INDEX')
+        actions = [
+            {"_index": index, "_id": str(record['id']), "_source": {k: record[k] for k in ES_FIELDS if k in record}}
+            for record in records if record.get('id') is not None
+        ]
+        success, errors = bulk(self.es_client, actions, chunk_size=self.app_config.get('INGEST_ES_CHUNK_SIZE'),
+                               raise_on_error=False, stats_only=False)
+        if errors:
+            raise RuntimeError(f"{len(errors)} 条文档写入失败，首个错误: {errors[0]}")
+        return {"es_docs": success}
+
+    def _image_path(self, path):
+        if self.image_root and not os.path.isabs(path):
+            path = os.path.join(self.image_root, path)
+        return os.path.abspath(path)
+
+    def _write_milvus(self, records):
+        images = [
+            (str(record['id']), self._image_path(path))
+            for record in records if record.get('id') is not None
+            for path in record.get('pic_paths') or []
+        ]
+        if not images:
+            return {}
+        signatures = phash_service.calculate_phash_signatures(
+            [path for _, path in images], workers=self.app_config.get('PHASH_WORKERS'), skip_errors=True,
+        )
+        rows = [
+            {MILVUS_VECTOR_FIELD: signature, "data_path": path, "mid": mid}
+            for (mid, path), signature in zip(images, signatures) if signature is not None
+        ]
+        # 先删除这些稿件已有的图片，重新导入或断点续传时不会产生重复
+        collection = self.app_config.get('MILVUS_IMAGE_COLLECTION')
+        mids = list(dict.fromkeys(mid for mid, _ in images))
+        self.milvus_client.delete(collection_name=collection, filter=f"mid in {json.dumps(mids, ensure_ascii=False)}")
+        if rows:
+            self.milvus_client.insert(collection_name=collection, data=rows)
+        return {"milvus_images": len(rows), "phash_errors": len(images) - len(rows)}
+
+    def _write_nebula(self, records):
+        space_name = self.app_config.get('NEBULA_SPACE')
+        vertices = edges = 0
+        for statement, n_vertices, n_edges in _insert_statements(
+                graph_rows(records), self.app_config.get('INGEST_NEBULA_ROWS_PER_STATEMENT')):
+            result = nebula_service.execute_query(statement, space_name=space_name, name='ingest_insert')
+            if isinstance(result, dict) and "error" in result:
+                raise RuntimeError(result["error"])
+            vertices += n_vertices
+            edges += n_edges
+        return {"nebula_vertices": vertices, "nebula_edges": edges}
+
+
+def run_ingestion(paths, app_config, sinks=SINKS, workers=None, batch_size=None, checkpoint_path=None,
+                  image_root=None, restart=False):
+    """导入一组JSONL文件，返回吞吐统计（见 IngestStats.report）"""
+    workers = workers or app_config.get('INGEST_WORKERS')
+    batch_size = batch_size or app_config.get('INGEST_BATCH_SIZE')
+    max_in_flight = max(app_config.get('INGEST_MAX_IN_FLIGHT'), workers)
+    report_interval = app_config.get('INGEST_REPORT_INTERVAL')
+    checkpoint_path = checkpoint_path or app_config.get('INGEST_CHECKPOINT_PATH')
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    failed_path = f"{checkpoint_path}.failed.jsonl"
+    failed_lock = threading.Lock()
+
+    stats = IngestStats()
+    ingestor = Ingestor(app_config, sinks=sinks, image_root=image_root, stats=stats)
+
+    def run_batch(file, start, end, records):
+        failed = ingestor.process(records) if records else []
+        if failed:
+            stats.add_failed_batch(len(records))
+            logger.error(f"批次 {file}:{start + 1}-{end} 写入 {','.join(failed)} 失败，已记录到 {failed_path}")
+            with failed_lock, open(failed_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    # 只记录该记录实际参与且失败的阶段
+                    sinks = [sink for sink in failed if sink in record.get(FAILED_SINKS_FIELD, SINKS)]
+                    if sinks:
+                        f.write(json.dumps({**record, FAILED_SINKS_FIELD: sinks}, ensure_ascii=False) + '\n')
+        else:
+            stats.add_records(len(records))
+        checkpoint.mark_done(file, start, end)
+
+    last_report = time.time()
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest') as executor:
+        for path in paths:
+            file = os.path.abspath(path)
+            start_line = checkpoint.position(file)
+            if start_line:
+                logger.info(f"{path} 从第 {start_line + 1} 行继续")
+            for start, end, records in iter_batches(path, batch_size, start_line):
+                # 在途批次达到上限时等待，读取不会超前于写入
+                while len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                in_flight.add(executor.submit(run_batch, file, start, end, records))
+                if time.time() - last_report >= report_interval:
+                    logger.info(f"入库进度: {json.dumps(stats.report(), ensure_ascii=False)}")
+                    last_report = time.time()
+        for future in in_flight:
+            future.result()
+
+    report = stats.report()
+    logger.info(f"入库完成: {json.dumps(report, ensure_ascii=False)}")
+    return report
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="把JSONL稿件导出文件批量写入ES、Milvus和NebulaGraph")
+    parser.add_argument('command', choices=['run'], help="run: 导入文件（按断点续传）")
+    parser.add_argument('paths', nargs='+', help="JSONL文件，支持 .gz")
+    parser.add_argument('--sinks', default=','.join(SINKS), help="写入的存储，逗号分隔: es,milvus,nebula")
+    parser.add_argument('--workers', type=int, help="并行处理批次的线程数（默认 INGEST_WORKERS）")
+    parser.add_argument('--batch-size', type=int, help="每批行数（默认 INGEST_BATCH_SIZE）")
+    parser.add_argument('--checkpoint', help="断点文件（默认 INGEST_CHECKPOINT_PATH）")
+    parser.add_argument('--image-root', help="pic_paths 中相对路径的根目录")
+    parser.add_argument('--restart', action='store_true', help="忽略已有断点，从头导入")
+    parser.add_argument('--report', help="把吞吐统计写入该JSON文件")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    app_config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+
+    sinks = [s.strip() for s in args.sinks.split(',') if s.strip()]
+    unknown = set(sinks) - set(SINKS)
+    if unknown:
+        parser.error(f"未知的存储: {', '.join(sorted(unknown))}")
+    report = run_ingestion(
+        args.paths, app_config, sinks=sinks, workers=args.workers, batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint, image_root=args.image_root, restart=args.restart,
+    )
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# /unified_service/services/metrics.py
+"""
+进程内的延迟直方图与计数器，以 Prometheus 文本格式在 /metrics 暴露
+
+  - unified_stage_duration_seconds{stage}           检索各阶段耗时（ES召回、n-gram重排序、源头分组、pHash、Milvus检索等）
+  - unified_stage_errors_total{stage}               各阶段抛出异常的次数
+  - unified_nebula_query_duration_seconds{query}    每类Nebula查询的耗时
+  - unified_nebula_query_errors_total{query}        Nebula查询失败次数（异常或服务端返回错误）
+  - unified_http_request_duration_seconds{endpoint} 各接口耗时
+  - unified_http_requests_total{endpoint,status}    各接口请求数
+  - unified_http_errors_total{endpoint,status}      各接口返回4xx/5xx的次数
+  - unified_http_response_bytes{endpoint}           响应体大小（流式响应不计）
+  - unified_http_result_items{endpoint}             返回的结果条数
+
+    with metrics.stage('es_recall'):
+        response = es_client.search(...)
+
+指标只在当前进程内累计，多worker部署时需分别抓取各worker（或使用单进程的 asgi.py）。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# 秒
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1 << 10, 1 << 12, 1 << 14, 1 << 16, 1 << 18, 1 << 20, 1 << 22, 1 << 24)
+ITEMS_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """按标签累计的计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+
+
+class Histogram:
+    """按标签累计的直方图，桶为累计计数（与Prometheus一致）"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # 标签 -> [各桶计数..., 总和, 次数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def get(self, **labels):
+        """返回 (总和, 次数)"""
+        with self._lock:
+            state = self._values.get(tuple(labels[name] for name in self.labelnames))
+            return (state[-2], state[-1]) if state else (0.0, 0)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        for key, state in sorted(values.items()):
+            for bound, count in zip(self.buckets, state):
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_number(state[-2])}"
+            yield f"{self.name}_count{labels} {state[-1]}"
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+STAGE_SECONDS = _register(Histogram('unified_stage_duration_seconds', '检索各阶段耗时（秒）', ['stage']))
+STAGE_ERRORS = _register(Counter('unified_stage_errors_total', '检索各阶段出错次数', ['stage']))
+NEBULA_QUERY_SECONDS = _register(Histogram('unified_nebula_query_duration_seconds', 'Nebula查询耗时（秒）', ['query']))
+NEBULA_QUERY_ERRORS = _register(Counter('unified_nebula_query_errors_total', 'Nebula查询失败次数', ['query']))
+REQUEST_SECONDS = _register(Histogram('unified_http_request_duration_seconds', '接口耗时（秒）', ['endpoint']))
+REQUESTS = _register(Counter('unified_http_requests_total', '接口请求数', ['endpoint', 'status']))
+REQUEST_ERRORS = _register(Counter('unified_http_errors_total', '接口返回4xx/5xx的次数', ['endpoint', 'status']))
+RESPONSE_BYTES = _register(Histogram('unified_http_response_bytes', '响应体大小（字节）', ['endpoint'], BYTES_BUCKETS))
+RESULT_ITEMS = _register(Histogram('unified_http_result_items', '接口返回的结果条数', ['endpoint'], ITEMS_BUCKETS))
+
+
+@contextmanager
+def _timed(histogram, errors, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.inc(**labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def stage(name):
+    """记录 with 块的耗时到 unified_stage_duration_seconds，抛出异常时计入 unified_stage_errors_total"""
+    return _timed(STAGE_SECONDS, STAGE_ERRORS, stage=name)
+
+
+def observe_stage(name, seconds):
+    """记录已在别处累计好的阶段耗时"""
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def nebula_query(name):
+    """记录一次Nebula查询的耗时，抛出异常时计入失败次数"""
+    return _timed(NEBULA_QUERY_SECONDS, NEBULA_QUERY_ERRORS, query=name)
+
+
+def observe_request(endpoint, status, seconds, response_bytes=None, result_items=None):
+    """记录一次接口请求"""
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=str(status))
+    if status >= 400:
+        REQUEST_ERRORS.inc(endpoint=endpoint, status=str(status))
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe(response_bytes, endpoint=endpoint)
+    if result_items is not None:
+        RESULT_ITEMS.observe(result_items, endpoint=endpoint)
+
+
+def render():
+    """所有指标的 Prometheus 文本格式"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
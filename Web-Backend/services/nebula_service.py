@@ -1,14 +1,43 @@
 # /unified_service/services/nebula_service.py
 
 import logging
+import re
+import threading
+import time
+from functools import lru_cache
 from datetime import datetime
 from nebula3.gclient.net import ConnectionPool
 from nebula3.Config import Config as NebulaConfig
+from nebula3.Exception import IOErrorException
+from nebula3.common.ttypes import ErrorCode, NList, NullType, Value
+from services import metrics
 
 # 使用全局变量存储连接池，确保单例
 connection_pool = None
+# 复用已认证会话的会话池
+session_pool = None
 logger = logging.getLogger(__name__)
 
+# 合法的图空间名称
+_SPACE_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# 会话已失效，需要重新认证的错误码
+_SESSION_EXPIRED_CODES = (ErrorCode.E_SESSION_INVALID, ErrorCode.E_SESSION_TIMEOUT)
+
+# 服务端不接受参数绑定时返回的错误码（如部分语句的起点VID不支持参数）
+_PARAM_UNSUPPORTED_CODES = (ErrorCode.E_SYNTAX_ERROR, ErrorCode.E_SEMANTIC_ERROR)
+
+# 查询中的参数占位符，如 $id、$event（不匹配 $$、$^、$- 等引用）
+_PARAM_RE = re.compile(r'\$([A-Za-z_][A-Za-z0-9_]*)')
+
+# 作为起点VID的占位符（GO ... FROM $id、FETCH PROP ON Tag $id），服务端不接受参数绑定，
+# 始终以字面量渲染；$var.col 形式的变量引用不在此列
+_VID_PARAM_RE = re.compile(
+    r'\b(?:FROM|FETCH\s+PROP\s+ON\s+[A-Za-z_][A-Za-z0-9_]*(?:\s*,\s*[A-Za-z_][A-Za-z0-9_]*)*)'
+    r'\s+\$([A-Za-z_][A-Za-z0-9_]*)\b(?!\s*\.)',
+    re.IGNORECASE,
+)
+
 # 定义属性类型映射
 PROPERTY_TYPES = {
     # Event属性
@@ -26,26 +55,192 @@ PROPERTY_TYPES = {
 }
 
 
+class _PooledSession:
+    """会话及其当前所在的图空间"""
+
+    def __init__(self, session):
+        self.session = session
+        self.space = None
+        self.last_used = time.monotonic()
+
+
+class NebulaSessionPool:
+    """进程内复用已认证的会话，每个会话记住当前图空间，只有空间变化时才执行 USE
+
+    - 取会话时优先选择已在目标空间的空闲会话
+    - 空闲超过 ping_interval 的会话使用前先 ping，失败则丢弃
+    - 空闲超过 idle_timeout 的会话直接释放
+    - 会话过期或连接出错时重新认证并重试一次
+    """
+
+    def __init__(self, pool, user, password, max_sessions, idle_timeout=600, ping_interval=60, acquire_timeout=10):
+        self.pool = pool
+        self.user = user
+        self.password = password
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.acquire_timeout = acquire_timeout
+        self._idle = []  # 最近使用的在末尾
+        self._total = 0
+        self._cond = threading.Condition()
+
+    def _new_session(self):
+        return _PooledSession(self.pool.get_session(self.user, self.password))
+
+    def _discard(self, pooled):
+        try:
+            pooled.session.release()
+        except Exception as e:
+            logger.debug(f"释放Nebula会话出错: {e}")
+
+    def _evict_idle(self, now):
+        """释放空闲过久的会话（需持有锁）"""
+        expired = [p for p in self._idle if now - p.last_used > self.idle_timeout]
+        if expired:
+            self._idle = [p for p in self._idle if now - p.last_used <= self.idle_timeout]
+            self._total -= len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    def acquire(self, space_name=None):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                expired = self._evict_idle(now)
+                pooled = None
+                if self._idle:
+                    # 优先复用已在目标空间的会话，避免一次 USE
+                    index = next((i for i in range(len(self._idle) - 1, -1, -1)
+                                  if self._idle[i].space == space_name), len(self._idle) - 1)
+                    pooled = self._idle.pop(index)
+                    break
+                if self._total < self.max_sessions:
+                    self._total += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise TimeoutError("等待Nebula会话超时")
+                self._cond.wait(remaining)
+        for p in expired:
+            self._discard(p)
+
+        if pooled is not None and now - pooled.last_used > self.ping_interval and not self._ping(pooled):
+            self._discard(pooled)
+            pooled = None
+        if pooled is None:
+            try:
+                pooled = self._new_session()
+            except Exception:
+                self._release_slot()
+                raise
+        return pooled
+
+    def _ping(self, pooled):
+        try:
+            return pooled.session.ping()
+        except Exception:
+            return False
+
+    def _release_slot(self):
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def release(self, pooled, broken=False):
+        if broken:
+            self._discard(pooled)
+            self._release_slot()
+            return
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def _run(self, pooled, space_name, statement, params):
+        if space_name and pooled.space != space_name:
+            result = pooled.session.execute(f'USE {space_name}')
+            if not result.is_succeeded():
+                return result
+            pooled.space = space_name
+        if params:
+            result = pooled.session.execute_parameter(statement, params)
+        else:
+            result = pooled.session.execute(statement)
+        # 语句中可能包含 USE，以服务端返回的当前空间为准
+        if result.is_succeeded() and result.space_name():
+            pooled.space = result.space_name()
+        return result
+
+    def execute(self, statement, space_name=None, params=None):
+        """在目标空间执行语句（params 为 {名称: Value}），会话过期或连接断开时重新认证后重试一次"""
+        for attempt in range(2):
+            pooled = self.acquire(space_name)
+            try:
+                result = self._run(pooled, space_name, statement, params)
+            except IOErrorException as e:
+                self.release(pooled, broken=True)
+                if attempt:
+                    raise
+                logger.warning(f"Nebula连接出错，重新建立会话: {e}")
+                continue
+            except Exception:
+                self.release(pooled, broken=True)
+                raise
+            if result.error_code() in _SESSION_EXPIRED_CODES:
+                self.release(pooled, broken=True)
+                if attempt:
+                    return result
+                logger.warning("Nebula会话已失效，重新认证")
+                continue
+            self.release(pooled)
+            return result
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for p in idle:
+            self._discard(p)
+
+    def stats(self):
+        with self._cond:
+            return {"total": self._total, "idle": len(self._idle), "max": self.max_sessions}
+
+
 def init_nebula_pool(app_config):
-    """根据配置初始化NebulaGraph连接池"""
-    global connection_pool
+    """根据配置初始化NebulaGraph连接池，连接失败时抛出异常（由调用方重试）"""
+    global connection_pool, session_pool
     if connection_pool:
         return
 
+    config = NebulaConfig()
+    config.max_connection_pool_size = app_config.get('NEBULA_POOL_SIZE')
+    pool = ConnectionPool()
+    if not pool.init([(app_config.get('NEBULA_HOST'), app_config.get('NEBULA_PORT'))], config):
+        raise ConnectionError("初始化NebulaGraph连接池失败")
+    sessions = NebulaSessionPool(
+        pool,
+        app_config.get('NEBULA_USER'),
+        app_config.get('NEBULA_PASSWORD'),
+        max_sessions=app_config.get('NEBULA_POOL_SIZE'),
+        idle_timeout=app_config.get('NEBULA_SESSION_IDLE_TIMEOUT'),
+        ping_interval=app_config.get('NEBULA_SESSION_PING_INTERVAL'),
+        acquire_timeout=app_config.get('NEBULA_SESSION_ACQUIRE_TIMEOUT'),
+    )
+    # 先确认账号可以登录，失败时释放连接池，稍后重试
     try:
-        config = NebulaConfig()
-        config.max_connection_pool_size = app_config.get('NEBULA_POOL_SIZE')
-        connection_pool = ConnectionPool()
-        if not connection_pool.init([(app_config.get('NEBULA_HOST'), app_config.get('NEBULA_PORT'))], config):
-             raise ConnectionError("初始化NebulaGraph连接池失败")
-        logger.info("NebulaGraph连接池初始化成功")
-        
-        # 服务启动时重建索引
-        rebuild_indices(app_config)
+        sessions.execute("YIELD 1")
+    except Exception:
+        sessions.close()
+        pool.close()
+        raise
+    connection_pool, session_pool = pool, sessions
+    logger.info("NebulaGraph连接池初始化成功")
 
-    except Exception as e:
-        logger.error(f"连接NebulaGraph失败: {e}")
-        exit(1)
+    # 服务启动时重建索引
+    rebuild_indices(app_config)
 
 
 def process_value(value, prop_type):
@@ -79,110 +274,345 @@ def process_value(value, prop_type):
         return str(processed_value)
 
 
-def execute_query(query, params=None, space_name=None):
-    """执行NebulaGraph查询并返回处理后的结果"""
-    if not connection_pool:
+def to_nebula_value(value, prop_type=None):
+    """把Python值转换为Nebula的Value，prop_type 取自 PROPERTY_TYPES，缺省时按Python类型推断"""
+    if value is None:
+        return Value(nVal=NullType.__NULL__)
+    if isinstance(value, (list, tuple)):
+        return Value(lVal=NList(values=[to_nebula_value(v, prop_type) for v in value]))
+    if prop_type is None:
+        if isinstance(value, bool):
+            prop_type = 'bool'
+        elif isinstance(value, int):
+            prop_type = 'int'
+        elif isinstance(value, float):
+            prop_type = 'float'
+        else:
+            prop_type = 'string'
+
+    if prop_type == 'bool':
+        return Value(bVal=bool(value))
+    elif prop_type in ('int', 'timestamp'):
+        if isinstance(value, datetime):
+            # 与 process_value 一致，时间戳以毫秒存储
+            value = int(value.timestamp() * 1000)
+        return Value(iVal=int(value))
+    elif prop_type == 'float':
+        return Value(fVal=float(value))
+    else:
+        return Value(sVal=str(value).encode('utf-8'))
+
+
+def bind_params(params):
+    """按参数名在 PROPERTY_TYPES 中的类型把参数转换为 {名称: Value}"""
+    return {name: to_nebula_value(value, PROPERTY_TYPES.get(name)) for name, value in params.items()}
+
+
+def render_literal(value):
+    """把参数渲染为nGQL字面量（字符串转义引号和反斜杠）"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(render_literal(v) for v in value) + ']'
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+class QueryTemplate:
+    """预先解析的查询模板
+
+    模板文本保持不变，每次只绑定不同的参数，graphd 可复用同一查询文本；
+    参数名与字面量渲染所需的片段在创建时切分好。作为起点VID的占位符
+    （vid_params）在创建时识别出来，始终以字面量渲染，其余参数照常绑定。
+    服务端报错指向某个绑定的占位符时，该模板之后改为全部字面量渲染。
+    """
+
+    def __init__(self, text):
+        self.text = text.strip()
+        parts = _PARAM_RE.split(self.text)
+        self._segments = parts[0::2]
+        self.param_names = parts[1::2]
+        self.vid_params = frozenset(_VID_PARAM_RE.findall(self.text))
+        self.use_literals = False
+
+    def render(self, params):
+        """把参数以字面量形式填入模板"""
+        out = [self._segments[0]]
+        for name, segment in zip(self.param_names, self._segments[1:]):
+            out.append(render_literal(params[name]) if name in params else f'${name}')
+            out.append(segment)
+        return ''.join(out)
+
+    def prepare(self, params):
+        """返回 (查询文本, 绑定参数)：VID占位符填入字面量，其余参数绑定"""
+        if self.use_literals:
+            return self.render(params), {}
+        literals = {name: value for name, value in params.items() if name in self.vid_params}
+        bound = {name: value for name, value in params.items() if name not in self.vid_params}
+        return (self.render(literals) if literals else self.text), bound
+
+
+@lru_cache(maxsize=256)
+def get_query_template(query):
+    """按查询文本缓存解析后的模板"""
+    return QueryTemplate(query)
+
+
+def _placeholder_error(result, bound):
+    """服务端错误是否由绑定的占位符本身引起（错误信息指向 $name 或提到参数）"""
+    if result.error_code() not in _PARAM_UNSUPPORTED_CODES:
+        return False
+    message = result.error_msg()
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', errors='replace')
+    return 'parameter' in message.lower() or any(f'${name}' in message for name in bound)
+
+
+def _execute_template(template, params, space_name):
+    text, bound = template.prepare(params)
+    if not bound:
+        return session_pool.execute(text, space_name)
+    result = session_pool.execute(text, space_name, bind_params(bound))
+    if _placeholder_error(result, bound):
+        logger.warning(f"服务端不支持该语句的参数绑定，改用字面量渲染: {result.error_msg()}")
+        template.use_literals = True
+        result = session_pool.execute(template.render(params), space_name)
+    return result
+
+
+def validate_space_name(space_name):
+    """校验图空间名称，避免拼接进 USE 语句时被注入"""
+    return bool(space_name) and bool(_SPACE_NAME_RE.match(space_name))
+
+
+def execute_query(query, params=None, space_name=None, transform=None, name='custom'):
+    """执行NebulaGraph查询并返回处理后的结果，query 可以是查询文本或 QueryTemplate
+
+    transform 不为空时用它直接处理 ResultSet，代替 as_primitive()；
+    name 为指标中的查询名称（unified_nebula_query_duration_seconds{query=name}）
+    """
+    if not session_pool:
         raise ConnectionError("NebulaGraph连接池未初始化")
+    template = query if isinstance(query, QueryTemplate) else None
+    if template is not None:
+        query = template.text
+    if space_name and not validate_space_name(space_name):
+        return {"error": f"非法的图空间名称: {space_name}", "query": query}
 
     try:
-        with connection_pool.session_context('root', 'p') as session:
-            session.execute(f'USE {space_name}')
+        with metrics.nebula_query(name):
             if params:
-                if hasattr(session, 'execute_parameterized'):
-                    result = session.execute_parameterized(query, params)
-                    # print(result.as_primitive())
-                else:
-                    formatted_query = query
-                    for key, value in params.items():
-                        formatted_value = f"'{value}'" if isinstance(value, str) else str(value)
-                        formatted_query = formatted_query.replace(f"${key}", formatted_value)
-                    result = session.execute(formatted_query)
-                    # print(result.as_primitive())
+                result = _execute_template(template or get_query_template(query), params, space_name)
             else:
-                result = session.execute(query)
-            
-            # 检查执行是否成功
-            if not result.is_succeeded():
-                error_msg = result.error_msg()
-                if isinstance(error_msg, bytes):
-                    error_msg = error_msg.decode('utf-8', errors='replace')
-                self.logger.error(f"查询执行失败: {error_msg}, 查询: {query}")
-                return {"error": error_msg, "query": query}
-            
-            # 处理结果集
-            return result.as_primitive()
-            # return self._process_result(result)
+                result = session_pool.execute(query, space_name)
+
+        # 检查执行是否成功
+        if not result.is_succeeded():
+            metrics.NEBULA_QUERY_ERRORS.inc(query=name)
+            error_msg = result.error_msg()
+            if isinstance(error_msg, bytes):
+                error_msg = error_msg.decode('utf-8', errors='replace')
+            logger.error(f"查询执行失败: {error_msg}, 查询: {query}")
+            return {"error": error_msg, "query": query}
+
+        # 处理结果集
+        if transform is not None:
+            return transform(result)
+        return result.as_primitive()
             
     except Exception as e:
-        self.logger.error(f"执行查询时发生异常: {str(e)}, 查询: {query}")
+        logger.error(f"执行查询时发生异常: {str(e)}, 查询: {query}")
         return {"error": str(e), "query": query}
 
-    
+
 def rebuild_indices(app_config):
     """重建NebulaGraph索引"""
     try:
-        with connection_pool.session_context(app_config.get('NEBULA_USER'), app_config.get('NEBULA_PASSWORD')) as session:
-            session.execute(f"USE {app_config.get('NEBULA_SPACE')}")
-            rebuild_query = "REBUILD TAG INDEX Article_event"
-            result = session.execute(rebuild_query)
-            if not result.is_succeeded():
-                error_msg = result.error_msg()
-                if isinstance(error_msg, bytes):
-                    error_msg = error_msg.decode('utf-8', 'replace')
-                logger.error(f"重建索引失败: {error_msg}")
-            else:
-                logger.info("索引 'Article_event' 重建成功")
+        result = session_pool.execute("REBUILD TAG INDEX Article_event", app_config.get('NEBULA_SPACE'))
+        if not result.is_succeeded():
+            error_msg = result.error_msg()
+            if isinstance(error_msg, bytes):
+                error_msg = error_msg.decode('utf-8', 'replace')
+            logger.error(f"重建索引失败: {error_msg}")
+        else:
+            logger.info("索引 'Article_event' 重建成功")
     except Exception as e:
         logger.error(f"重建索引时发生异常: {e}")
 
-def get_graph_data_by_event(event, space_name):
-    """根据事件查询相关图数据"""
-    query = """
+# 图查询模板，模块加载时解析一次，各请求只绑定参数
+# 事件子图：事件只LOOKUP一次，文章集合保存在变量中，既作为 belong 边的结果，
+# 也作为 forwarded 多跳展开的起点，不再用 UNION ALL 重复两遍 LOOKUP 和 belong 遍历
+_EVENT_GRAPH_QUERY = QueryTemplate("""
     
-    LOOKUP ON Event WHERE Event.eventstr == $event
-    YIELD id(vertex) AS vid
-    | GO FROM $-.vid OVER belong REVERSELY
-    YIELD src(edge) AS vid, dst(edge) AS end_vid, tags($$)[0] AS src_type, properties($$) AS src_props,
+    $events = LOOKUP ON Event WHERE Event.eventstr == $event
+        YIELD id(vertex) AS vid;
+    $articles = GO FROM $events.vid OVER belong REVERSELY
+        YIELD src(edge) AS vid, dst(edge) AS end_vid, tags($$)[0] AS src_type, properties($$) AS src_props,
             edge AS e, rank(edge) AS e_rank, type(edge) AS e_type,
-            src(edge) AS e_src, dst(edge) AS e_dst
-
-    UNION ALL
-
-    LOOKUP ON Event WHERE Event.eventstr == $event
-    YIELD id(vertex) AS vid
-    | GO FROM $-.vid OVER belong REVERSELY
-    YIELD src(edge) AS vid
-    | GO 1 TO 5 STEPS FROM $-.vid OVER forwarded REVERSELY
+            src(edge) AS e_src, dst(edge) AS e_dst;
+    $forwards = GO 1 TO 5 STEPS FROM $articles.vid OVER forwarded REVERSELY
         YIELD src(edge) AS vid, dst(edge) AS end_vid, tags($$)[0] AS src_type, properties($$) AS src_props,
             edge AS e, rank(edge) AS e_rank, type(edge) AS e_type,
             src(edge) AS e_src, dst(edge) AS e_dst;
+    YIELD $articles.vid AS vid, $articles.end_vid AS end_vid, $articles.src_type AS src_type,
+        $articles.src_props AS src_props, $articles.e AS e, $articles.e_rank AS e_rank,
+        $articles.e_type AS e_type, $articles.e_src AS e_src, $articles.e_dst AS e_dst
+    UNION ALL
+    YIELD $forwards.vid AS vid, $forwards.end_vid AS end_vid, $forwards.src_type AS src_type,
+        $forwards.src_props AS src_props, $forwards.e AS e, $forwards.e_rank AS e_rank,
+        $forwards.e_type AS e_type, $forwards.e_src AS e_src, $forwards.e_dst AS e_dst;
     
-    """
-    params = {"event": event}
-    return execute_query(query, params, space_name)
-
+    """)
 
-
-def get_graph_data_by_id(id, space_name):
-    """根据微博推文id生成微博的扩散图"""
-    query = """
+_ID_GRAPH_QUERY = QueryTemplate("""
     
     GO 1 TO 10 STEPS FROM $id OVER forwarded REVERSELY 
     YIELD DISTINCT  src(edge) AS vid,dst(edge) AS end_vid,tags($$)[0] AS src_type, properties($$) AS src_props,edge AS e,rank(edge) AS e_rank,type(edge) AS e_type,src(edge) AS e_src,dst(edge) AS e_dst
     
-    """
-    params = {"id": id}
-    return execute_query(query, params, space_name)
+    """)
 
-
-def get_Original_Tweet_by_id(id, space_name):
-    """根据微博推文id生成微博的扩散图"""
-    query = """
+_ORIGINAL_TWEET_QUERY = QueryTemplate("""
     
     FETCH PROP ON Original_Tweet $id
     YIELD id(vertex) AS vid, properties(vertex) AS src_v;
     
+    """)
+
+
+def compact_graph(result):
+    """一遍扫描图查询的 ResultSet，生成紧凑格式：
+
+    - nodes: 去重后的节点表 {"id": [...], "type": [...], "props": [...]}，
+      type 为 node_types 的下标，只作为边终点出现的节点 type 为 -1、props 为 None
+    - edges: 按列存储 {"src": [...], "dst": [...], "rank": [...], "type": [...]}，
+      src/dst 为节点表下标（无终点时为 -1），type 为 edge_types 的下标
+
+    每个节点的属性只转换和传输一次，而逐行格式中每条边都会重复其起点的全部属性。
     """
-    params = {"id": id}
-    return execute_query(query, params, space_name)
+    columns = {name: i for i, name in enumerate(result.keys())}
+    node_index = {}
+    nodes = {"id": [], "type": [], "props": []}
+    edges = {"src": [], "dst": [], "rank": [], "type": []}
+    node_types, node_type_index = [], {}
+    edge_types, edge_type_index = [], {}
+
+    def intern(name, names, index):
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(names)
+            names.append(name)
+        return i
+
+    def cell(row, name):
+        value = row[columns[name]]
+        return None if value.is_null() else value.cast_primitive()
+
+    for r in range(result.row_size()):
+        row = result.row_values(r)
+        src = cell(row, 'e_src')
+        if src is None:
+            continue
+        i = node_index.get(src)
+        if i is None or nodes["props"][i] is None:
+            # 首次作为起点出现时才转换其属性
+            props = cell(row, 'src_props') or {}
+            type_id = intern(cell(row, 'src_type'), node_types, node_type_index)
+            if i is None:
+                i = node_index[src] = len(nodes["id"])
+                nodes["id"].append(src)
+                nodes["type"].append(type_id)
+                nodes["props"].append(props)
+            else:
+                nodes["type"][i] = type_id
+                nodes["props"][i] = props
+
+        dst = cell(row, 'e_dst')
+        j = -1
+        if dst is not None:
+            j = node_index.get(dst)
+            if j is None:
+                j = node_index[dst] = len(nodes["id"])
+                nodes["id"].append(dst)
+                nodes["type"].append(-1)
+                nodes["props"].append(None)
+
+        edges["src"].append(i)
+        edges["dst"].append(j)
+        edges["rank"].append(cell(row, 'e_rank') or 0)
+        edges["type"].append(intern(cell(row, 'e_type'), edge_types, edge_type_index))
+
+    return {"nodes": nodes, "node_types": node_types, "edges": edges, "edge_types": edge_types}
+
+
+def get_graph_data_by_event(event, space_name, compact=False):
+    """根据事件查询相关图数据，compact 为 True 时返回紧凑格式（见 compact_graph）"""
+    return execute_query(_EVENT_GRAPH_QUERY, {"event": event}, space_name,
+                         transform=compact_graph if compact else None, name='event_graph')
+
+
+def get_graph_data_by_id(id, space_name, compact=False):
+    """根据微博推文id生成微博的扩散图，compact 为 True 时返回紧凑格式（见 compact_graph）"""
+    return execute_query(_ID_GRAPH_QUERY, {"id": id}, space_name,
+                         transform=compact_graph if compact else None, name='id_graph')
+
+
+# 逐跳展开时每跳的查询，起点列表以字面量渲染（GO FROM 不接受列表参数）
+_HOP_YIELD = (
+    "YIELD DISTINCT src(edge) AS vid, dst(edge) AS end_vid, tags($$)[0] AS src_type, properties($$) AS src_props, "
+    "edge AS e, rank(edge) AS e_rank, type(edge) AS e_type, src(edge) AS e_src, dst(edge) AS e_dst"
+)
+
+
+def iter_graph_hops_by_id(id, space_name, max_hops=10, max_fanout=None, node_budget=None):
+    """逐跳展开微博的扩散图，每展开一跳 yield 一次，调用方可随时停止迭代
+
+    每跳 yield {"hop", "results", "count"}（results 与 get_graph_data_by_id 逐行格式相同），
+    结束时 yield {"done": True, "hops", "nodes", "truncated"}；出错时 yield {"hop", "error"} 后结束。
+    max_fanout 限制每一跳展开的边数（该跳所有起点合计，以 | LIMIT 作用于整跳结果，不是每个节点各自的上限），
+    node_budget 限制节点总数，触发限制时 truncated 分别为 "fanout" / "node_budget"。
+    """
+    frontier = [id]
+    seen = {id}
+    truncated = None
+    hop = 0
+    while frontier and hop < max_hops:
+        hop += 1
+        # 记录本跳的 LIMIT 来自哪个限制，截断时据此标注并决定是否继续展开
+        limit, bound = max_fanout, "fanout"
+        if node_budget is not None:
+            remaining = node_budget - len(seen)
+            if limit is None or remaining <= limit:
+                limit, bound = remaining, "node_budget"
+        query = f"GO FROM {', '.join(render_literal(v) for v in frontier)} OVER forwarded REVERSELY {_HOP_YIELD}"
+        if limit is not None:
+            query += f" | LIMIT {limit}"
+        rows = execute_query(query, space_name=space_name, name='graph_hop')
+        if isinstance(rows, dict) and "error" in rows:
+            yield {"hop": hop, "error": rows["error"]}
+            return
+
+        # 只保留首次到达的节点，下一跳从这些节点继续展开
+        new_rows = []
+        for row in rows:
+            src = row.get("e_src")
+            if src is not None and src not in seen:
+                seen.add(src)
+                new_rows.append(row)
+        frontier = [row["e_src"] for row in new_rows]
+        yield {"hop": hop, "results": new_rows, "count": len(new_rows)}
+
+        if limit is not None and len(rows) >= limit:
+            truncated = bound
+            if bound == "node_budget":
+                break
+    yield {"done": True, "hops": hop, "nodes": len(seen), "truncated": truncated}
+
+
+def get_Original_Tweet_by_id(id, space_name):
+    """根据微博推文id生成微博的扩散图"""
+    return execute_query(_ORIGINAL_TWEET_QUERY, {"id": id}, space_name, name='original_tweet')
 
@@ -0,0 +1,252 @@
+# /unified_service/services/ngram_rerank.py
+"""
+字符n-gram重排序引擎
+
+用哈希字符n-gram向量代替每次请求都重新拟合的 TfidfVectorizer：
+  - IDF 统计基于整个语料离线构建，并可按发布时间增量刷新
+  - 每个文档的n-gram词频向量按文档id缓存
+  - 余弦相似度对整个候选集一次性向量化计算
+因此重排序耗时只随候选数量增长，而与词表大小无关。
+
+离线构建/刷新（在 Web-Backend 目录下）:
+    python -m services.ngram_rerank build
+    python -m services.ngram_rerank refresh
+运行中的服务每隔 NGRAM_RELOAD_INTERVAL 秒检查统计文件的修改时间，文件更新后自动重新加载。
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 进程内共享的重排序引擎，以及加载时统计文件的修改时间、上次检查的时间
+_engine = None
+_engine_mtime = None
+_engine_checked_at = 0.0
+_engine_lock = threading.Lock()
+
+
+class NgramRerankEngine:
+    """基于语料级IDF与哈希字符n-gram的余弦相似度计算"""
+
+    def __init__(self, n=3, n_features=2 ** 22, doc_cache_size=100000):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n = n
+        self.n_features = n_features
+        # 与原 TfidfVectorizer(analyzer='char', lowercase=False) 相同的切分方式
+        self.vectorizer = HashingVectorizer(
+            analyzer='char', ngram_range=(n, n), n_features=n_features,
+            alternate_sign=False, norm=None, lowercase=False, dtype=np.float32,
+        )
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.n_docs = 0
+        self.last_publishtime = None
+        self._idf = None
+        self.doc_cache_size = doc_cache_size
+        self._doc_cache = OrderedDict()  # doc_id -> (indices, counts)
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        """是否已加载语料统计"""
+        return self.n_docs > 0
+
+    # --- IDF 统计 ---
+
+    def partial_fit(self, texts):
+        """把一批文档计入文档频率统计"""
+        counts = self.vectorizer.transform(texts).tocsr()
+        self.df += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs += counts.shape[0]
+        self._idf = None
+
+    @property
+    def idf(self):
+        # 与 sklearn 平滑IDF相同：ln((1+N)/(1+df)) + 1
+        if self._idf is None:
+            self._idf = (np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0).astype(np.float32)
+        return self._idf
+
+    def save(self, path):
+        # 先写临时文件再替换，运行中的服务不会读到写了一半的文件
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f, df=self.df, n_docs=self.n_docs, n=self.n, n_features=self.n_features,
+                last_publishtime=self.last_publishtime or '',
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, doc_cache_size=100000):
+        data = np.load(path, allow_pickle=False)
+        engine = cls(n=int(data['n']), n_features=int(data['n_features']), doc_cache_size=doc_cache_size)
+        engine.df = data['df'].astype(np.int32)
+        engine.n_docs = int(data['n_docs'])
+        engine.last_publishtime = str(data['last_publishtime']) or None
+        return engine
+
+    # --- 文档向量缓存 ---
+
+    def _doc_counts(self, docs):
+        """取得文档的n-gram词频（indices, counts），未缓存的文档批量计算后写入缓存"""
+        rows = [None] * len(docs)
+        missing = []
+        with self._lock:
+            for i, (doc_id, _) in enumerate(docs):
+                cached = self._doc_cache.get(doc_id) if doc_id is not None else None
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._doc_cache.move_to_end(doc_id)
+                    rows[i] = cached
+        if missing:
+            counts = self.vectorizer.transform([docs[i][1] or '' for i in missing]).tocsr()
+            with self._lock:
+                for j, i in enumerate(missing):
+                    start, end = counts.indptr[j], counts.indptr[j + 1]
+                    row = (counts.indices[start:end].astype(np.int32), counts.data[start:end])
+                    rows[i] = row
+                    doc_id = docs[i][0]
+                    if doc_id is not None:
+                        self._doc_cache[doc_id] = row
+                while len(self._doc_cache) > self.doc_cache_size:
+                    self._doc_cache.popitem(last=False)
+        return rows
+
+    # --- 相似度 ---
+
+    def similarities(self, query_text, docs):
+        """计算查询与候选文档的余弦相似度，docs 为 [(doc_id, text), ...]"""
+        if not docs:
+            return []
+        from scipy import sparse
+
+        idf = self.idf
+        query = self.vectorizer.transform([query_text]).tocsr()
+        query.data *= idf[query.indices]
+        query_norm = np.sqrt((query.data ** 2).sum())
+        if query_norm == 0:
+            return [0.0] * len(docs)
+        query.data /= query_norm
+
+        rows = self._doc_counts(docs)
+        lengths = np.array([len(indices) for indices, _ in rows])
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        indices = np.concatenate([indices for indices, _ in rows]) if indptr[-1] else np.empty(0, np.int32)
+        data = np.concatenate([counts for _, counts in rows]) if indptr[-1] else np.empty(0, np.float32)
+        data = data * idf[indices]
+
+        # 每行L2归一化
+        row_ids = np.repeat(np.arange(len(rows)), lengths)
+        norms = np.sqrt(np.bincount(row_ids, weights=data.astype(np.float64) ** 2, minlength=len(rows)))
+        norms[norms == 0] = 1.0
+        data = data / norms[row_ids]
+
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(rows), self.n_features))
+        sims = matrix @ query.T
+        return np.asarray(sims.todense()).ravel().astype(float).tolist()
+
+
+def _stats_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns if path else None
+    except FileNotFoundError:
+        return None
+
+
+def get_rerank_engine(app_config):
+    """获取重排序引擎，首次调用时加载 NGRAM_IDF_PATH 中的语料统计
+
+    之后每隔 NGRAM_RELOAD_INTERVAL 秒检查一次文件修改时间，离线构建/刷新后自动重新加载；
+    重新加载失败时继续使用原有引擎。
+    """
+    global _engine, _engine_mtime, _engine_checked_at
+    interval = app_config.get('NGRAM_RELOAD_INTERVAL')
+    if _engine is not None and (not interval or time.monotonic() - _engine_checked_at < interval):
+        return _engine
+    with _engine_lock:
+        if _engine is not None and (not interval or time.monotonic() - _engine_checked_at < interval):
+            return _engine
+        _engine_checked_at = time.monotonic()
+        path = app_config.get('NGRAM_IDF_PATH')
+        mtime = _stats_mtime(path)
+        if _engine is not None and mtime == _engine_mtime:
+            return _engine
+        if mtime is not None:
+            try:
+                engine = NgramRerankEngine.load(path, doc_cache_size=app_config.get('NGRAM_DOC_CACHE_SIZE'))
+            except Exception as e:
+                if _engine is None:
+                    raise
+                logger.error(f"重新加载n-gram语料统计失败，继续使用原有统计: {e}")
+                return _engine
+            logger.info(f"n-gram语料统计{'重新' if _engine is not None else ''}加载成功，文档数: {engine.n_docs}")
+        else:
+            engine = NgramRerankEngine(n_features=app_config.get('NGRAM_FEATURES'),
+                                       doc_cache_size=app_config.get('NGRAM_DOC_CACHE_SIZE'))
+            logger.warning(f"未找到n-gram语料统计: {path}，重排序使用逐请求TF-IDF")
+        _engine, _engine_mtime = engine, mtime
+    return _engine
+
+
+# --- 离线构建 ---
+
+def _scan_corpus(es, index, since=None, batch_size=2000):
+    """从ES按批读取 (content, publishtime)，since 不为空时只读取之后发布的文档"""
+    from elasticsearch.helpers import scan
+
+    query = {"query": {"match_all": {}}}
+    if since:
+        query = {"query": {"range": {"publishtime": {"gt": since}}}}
+    batch = []
+    for hit in scan(es, index=index, query=query, _source=["content", "publishtime"], size=batch_size):
+        batch.append(hit["_source"])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_statistics(app_config, refresh=False):
+    """全量构建或增量刷新语料IDF统计，并写入 NGRAM_IDF_PATH"""
+    from elasticsearch import Elasticsearch
+
+    es = Elasticsearch(hosts=app_config.get('ES_HOSTS'), basic_auth=app_config.get('ES_AUTH'))
+    path = app_config.get('NGRAM_IDF_PATH')
+    if refresh and os.path.exists(path):
+        engine = NgramRerankEngine.load(path)
+    else:
+        engine = NgramRerankEngine(n_features=app_config.get('NGRAM_FEATURES'))
+
+    since = engine.last_publishtime if refresh else None
+    for batch in _scan_corpus(es, app_config.get('ES_INDEX'), since=since):
+        engine.partial_fit([doc.get("content") or '' for doc in batch])
+        times = [doc.get("publishtime") for doc in batch if doc.get("publishtime")]
+        if times:
+            engine.last_publishtime = max([engine.last_publishtime or ''] + [str(t) for t in times])
+        logger.info(f"已统计文档数: {engine.n_docs}")
+    engine.save(path)
+    logger.info(f"n-gram语料统计已保存至 {path}，文档数: {engine.n_docs}")
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="构建字符n-gram语料IDF统计")
+    parser.add_argument('command', choices=['build', 'refresh'], help="build: 全量构建; refresh: 增量刷新")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    app_config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    build_statistics(app_config, refresh=args.command == 'refresh')
+
+
+if __name__ == '__main__':
+    main()
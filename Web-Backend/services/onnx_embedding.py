@@ -0,0 +1,258 @@
+# /unified_service/services/onnx_embedding.py
+"""
+视频帧向量模型的ONNX Runtime int8推理后端
+
+把 video_copy_detection 流水线使用的ISC模型导出为ONNX并做int8静态量化，
+在无GPU节点上用 ONNX Runtime 推理，线程数由 VIDEO_EMBED_THREADS 控制。
+VIDEO_EMBED_BACKEND = 'onnx' 时CPU检索模式（mode=cpu）使用本后端；pipeline 模式的Towhee流水线不受影响。
+离线建库只在 VIDEO_INDEX_EMBED_BACKEND = 'onnx' 时使用本后端。
+
+量化模型的向量需与Milvus中已入库的float32向量保持一致，启用前先在固定视频集上做精度检查：
+    python -m services.onnx_embedding export  --output models/isc_fp32.onnx
+    python -m services.onnx_embedding quantize --input models/isc_fp32.onnx --calibration-dir clips/calib
+    python -m services.onnx_embedding reference --clips clips/check --output models/isc_reference.npz
+    python -m services.onnx_embedding check --reference models/isc_reference.npz
+check 比较逐帧余弦相似度和最近邻一致率，并对比两个后端的吞吐；平均余弦相似度低于
+VIDEO_EMBED_MIN_COSINE 时以非0状态退出。
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 导出时写入模型元数据的预处理参数（取自ISC骨干网络的 default_cfg）
+_DEFAULT_MEAN = (0.485, 0.456, 0.406)
+_DEFAULT_STD = (0.229, 0.224, 0.225)
+
+
+class OnnxFrameEmbedder:
+    """ONNX Runtime上的ISC帧向量模型，接口与 video_fingerprint.FrameEmbedder 相同"""
+
+    def __init__(self, model_path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.mean = np.array(json.loads(meta.get('mean', 'null')) or _DEFAULT_MEAN, dtype=np.float32)
+        self.std = np.array(json.loads(meta.get('std', 'null')) or _DEFAULT_STD, dtype=np.float32)
+        self.lock = threading.Lock()
+
+    def preprocess(self, frames):
+        """与ISC算子相同的预处理：RGB缩放到[0, 1]后按均值方差归一化，转为NCHW"""
+        x = np.asarray(frames, dtype=np.float32) / 255.0
+        x = (x - self.mean) / self.std
+        return np.ascontiguousarray(x.transpose(0, 3, 1, 2))
+
+    def embed(self, frames):
+        """计算一批帧（[n, H, W, 3] 的RGB数组）的向量，返回L2归一化的 [n, dim] float32"""
+        inputs = {self.input_name: self.preprocess(frames)}
+        with self.lock:
+            embeddings = self.session.run(None, inputs)[0]
+        embeddings = embeddings.astype(np.float32).reshape(len(frames), -1)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+
+# --- 导出与量化 ---
+
+def export_model(app_config, output):
+    """从Towhee的ISC算子导出float32 ONNX模型（批大小可变），并记录预处理参数"""
+    import onnx
+    import torch
+    from towhee import ops
+
+    size = app_config.get('VIDEO_INDEX_FRAME_SIZE')
+    op = ops.image_embedding.isc(img_size=size, device='cpu')
+    model = op.get_op().model if hasattr(op, 'get_op') else op.model
+    model.eval()
+    default_cfg = getattr(model, 'default_cfg', None) or getattr(getattr(model, 'backbone', None), 'default_cfg', {})
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    dummy = torch.zeros(1, 3, size, size)
+    torch.onnx.export(
+        model, dummy, output, input_names=['input'], output_names=['embedding'],
+        dynamic_axes={'input': {0: 'batch'}, 'embedding': {0: 'batch'}}, opset_version=17,
+    )
+    onnx_model = onnx.load(output)
+    for key, value in (('mean', default_cfg.get('mean', _DEFAULT_MEAN)), ('std', default_cfg.get('std', _DEFAULT_STD)),
+                       ('img_size', size)):
+        entry = onnx_model.metadata_props.add()
+        entry.key, entry.value = key, json.dumps(list(value) if isinstance(value, tuple) else value)
+    onnx.save(onnx_model, output)
+    logger.info(f"ONNX模型已导出至 {output}")
+
+
+class _CalibrationReader:
+    """从校准视频中按关键帧取样，供静态量化统计激活值范围"""
+
+    def __init__(self, embedder, clips, frame_size, max_frames, batch_size=8):
+        from services import video_fingerprint
+
+        self.embedder = embedder
+        frames = []
+        for clip in clips:
+            for _, frame in video_fingerprint.iter_sampled_frames(clip, 'keyframes', frame_size):
+                frames.append(frame)
+                if len(frames) >= max_frames:
+                    break
+            if len(frames) >= max_frames:
+                break
+        logger.info(f"校准帧数: {len(frames)}")
+        self.batches = iter([frames[i:i + batch_size] for i in range(0, len(frames), batch_size)])
+
+    def get_next(self):
+        batch = next(self.batches, None)
+        if batch is None:
+            return None
+        return {self.embedder.input_name: self.embedder.preprocess(batch)}
+
+
+def quantize_model(app_config, input_path, output, calibration_dir=None, max_frames=512):
+    """int8量化：提供校准视频时做静态量化（QDQ，按通道量化权重），否则做动态量化"""
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from services import video_indexer
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if calibration_dir:
+        clips = list(video_indexer.iter_video_files([calibration_dir], app_config.get('VIDEO_ALLOWED_EXTENSIONS')))
+        reader = _CalibrationReader(OnnxFrameEmbedder(input_path), clips,
+                                    app_config.get('VIDEO_INDEX_FRAME_SIZE'), max_frames)
+        quantize_static(input_path, output, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        quantize_dynamic(input_path, output, weight_type=QuantType.QInt8)
+
+    # 量化后保留预处理参数
+    source, quantized = onnx.load(input_path), onnx.load(output)
+    existing = {p.key for p in quantized.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            entry = quantized.metadata_props.add()
+            entry.key, entry.value = prop.key, prop.value
+    onnx.save(quantized, output)
+    logger.info(f"int8模型已保存至 {output}")
+
+
+# --- 精度检查 ---
+
+def _clip_frames(clips, frame_size, sample, max_frames_per_clip):
+    from services import video_fingerprint
+
+    frames = []
+    for clip in clips:
+        for i, (_, frame) in enumerate(video_fingerprint.iter_sampled_frames(clip, sample, frame_size)):
+            if i >= max_frames_per_clip:
+                break
+            frames.append(frame)
+    return np.stack(frames)
+
+
+def _embed_all(embedder, frames, batch_size):
+    start = time.perf_counter()
+    embeddings = np.concatenate([embedder.embed(frames[i:i + batch_size]) for i in range(0, len(frames), batch_size)])
+    return embeddings, time.perf_counter() - start
+
+
+def build_reference(app_config, clips_dir, output, sample=1.0, max_frames_per_clip=30):
+    """在固定视频集上用float32参考模型（Towhee）计算帧向量，连同帧一起保存"""
+    from services import video_fingerprint, video_indexer
+
+    clips = list(video_indexer.iter_video_files([clips_dir], app_config.get('VIDEO_ALLOWED_EXTENSIONS')))
+    frames = _clip_frames(clips, app_config.get('VIDEO_INDEX_FRAME_SIZE'), sample, max_frames_per_clip)
+    embedder = video_fingerprint.FrameEmbedder(app_config.get('VIDEO_INDEX_FRAME_SIZE'),
+                                               threads=app_config.get('VIDEO_EMBED_THREADS'))
+    embeddings, seconds = _embed_all(embedder, frames, app_config.get('VIDEO_CPU_EMBED_BATCH'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    np.savez_compressed(output, frames=frames, embeddings=embeddings, seconds=seconds,
+                        clips=np.array([os.path.basename(c) for c in clips]))
+    logger.info(f"参考向量已保存至 {output}，视频数: {len(clips)}，帧数: {len(frames)}，"
+                f"float32耗时: {seconds:.2f}s（{len(frames) / seconds:.1f} 帧/秒）")
+
+
+def check_accuracy(app_config, reference_path, model_path=None):
+    """对比int8模型与参考向量，返回精度与吞吐统计"""
+    data = np.load(reference_path)
+    frames, reference = data['frames'], data['embeddings']
+    embedder = OnnxFrameEmbedder(model_path or app_config.get('VIDEO_EMBED_ONNX_PATH'),
+                                 threads=app_config.get('VIDEO_EMBED_THREADS'))
+    embeddings, seconds = _embed_all(embedder, frames, app_config.get('VIDEO_CPU_EMBED_BATCH'))
+
+    cosine = (embeddings * reference).sum(axis=1)
+    # 最近邻一致率：每帧在参考集中（排除自身）的最近邻，用int8向量检索时是否不变
+    ref_sims = reference @ reference.T
+    np.fill_diagonal(ref_sims, -np.inf)
+    cross_sims = embeddings @ reference.T
+    np.fill_diagonal(cross_sims, -np.inf)
+    top1_agreement = float((ref_sims.argmax(axis=1) == cross_sims.argmax(axis=1)).mean()) if len(frames) > 1 else 1.0
+
+    reference_seconds = float(data['seconds'])
+    return {
+        "frames": int(len(frames)),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_p01": round(float(np.percentile(cosine, 1)), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        "top1_agreement": round(top1_agreement, 4),
+        "reference_frames_per_sec": round(len(frames) / reference_seconds, 1) if reference_seconds else None,
+        "onnx_frames_per_sec": round(len(frames) / seconds, 1) if seconds else None,
+        "speedup": round(reference_seconds / seconds, 2) if seconds else None,
+        "passed": bool(cosine.mean() >= app_config.get('VIDEO_EMBED_MIN_COSINE')),
+    }
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="导出、量化ISC帧向量模型并检查int8精度")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help="从Towhee ISC算子导出float32 ONNX")
+    export_parser.add_argument('--output', required=True)
+    quantize_parser = sub.add_parser('quantize', help="int8量化（提供校准视频时为静态量化）")
+    quantize_parser.add_argument('--input', required=True)
+    quantize_parser.add_argument('--output', help="默认 VIDEO_EMBED_ONNX_PATH")
+    quantize_parser.add_argument('--calibration-dir')
+    quantize_parser.add_argument('--max-frames', type=int, default=512)
+    reference_parser = sub.add_parser('reference', help="在固定视频集上计算float32参考向量")
+    reference_parser.add_argument('--clips', required=True)
+    reference_parser.add_argument('--output', required=True)
+    reference_parser.add_argument('--sample', default='1.0', help="'keyframes' 或抽帧间隔秒数")
+    reference_parser.add_argument('--max-frames-per-clip', type=int, default=30)
+    check_parser = sub.add_parser('check', help="对比int8模型与参考向量")
+    check_parser.add_argument('--reference', required=True)
+    check_parser.add_argument('--model', help="默认 VIDEO_EMBED_ONNX_PATH")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    app_config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+
+    if args.command == 'export':
+        export_model(app_config, args.output)
+    elif args.command == 'quantize':
+        quantize_model(app_config, args.input, args.output or app_config.get('VIDEO_EMBED_ONNX_PATH'),
+                       calibration_dir=args.calibration_dir, max_frames=args.max_frames)
+    elif args.command == 'reference':
+        from services import video_fingerprint
+        build_reference(app_config, args.clips, args.output, sample=video_fingerprint.parse_sample(args.sample),
+                        max_frames_per_clip=args.max_frames_per_clip)
+    else:
+        result = check_accuracy(app_config, args.reference, args.model)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        if not result["passed"]:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
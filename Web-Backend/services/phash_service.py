@@ -0,0 +1,80 @@
+# /unified_service/services/phash_service.py
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 批量计算pHash的进程池，首次使用时创建
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def convert_bool_list_to_bytes(bool_list):
+    """把位数组打包为bytes，第i位写入第i//8字节的第i%8位（与Milvus二值向量格式一致）"""
+    return np.packbits(np.asarray(bool_list, dtype=bool), bitorder='little').tobytes()
+
+
+def calculate_phash_signature(image_file, hash_size=16, draft_size=None):
+    """计算图片的pHash签名
+
+    draft_size 为正数时对JPEG按缩小比例解码（最短边不小于draft_size），
+    可显著降低大图的解码开销，但DCT域缩放与全尺寸解码结果略有差异，
+    大图的签名可能有少量位不同，因此默认关闭。
+    """
+    from PIL import Image
+    from imagehash import phash
+
+    with Image.open(image_file) as img:
+        if draft_size:
+            img.draft(img.mode, (draft_size, draft_size))
+        pil_image = img.convert("L").resize(
+            (hash_size + 1, hash_size), Image.Resampling.LANCZOS
+        )
+    phash_value = phash(pil_image, hash_size)
+    pil_image.close()
+    return convert_bool_list_to_bytes(phash_value.hash.flatten())
+
+
+def _try_calculate_phash_signature(image_file, hash_size=16, draft_size=None):
+    """计算pHash签名，图片缺失或无法解码时返回None（批量入库时跳过坏图）"""
+    try:
+        return calculate_phash_signature(image_file, hash_size, draft_size)
+    except (OSError, ValueError) as e:
+        logger.warning(f"无法计算图片pHash: {image_file}, {e}")
+        return None
+
+
+def _get_executor(workers):
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn 避免在多线程的Web进程中fork，子进程只需导入本模块
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def calculate_phash_signatures(image_files, workers=1, hash_size=16, draft_size=None, skip_errors=False):
+    """批量计算pHash签名，图片较多时分发到进程池并行计算，返回顺序与输入一致
+
+    skip_errors 为 True 时无法读取的图片对应位置返回None，而不是使整批失败
+    """
+    func = _try_calculate_phash_signature if skip_errors else calculate_phash_signature
+    if workers <= 1 or len(image_files) <= 1:
+        return [func(f, hash_size, draft_size) for f in image_files]
+    executor = _get_executor(workers)
+    chunksize = max(1, len(image_files) // (workers * 4))
+    return list(executor.map(
+        func,
+        image_files,
+        [hash_size] * len(image_files),
+        [draft_size] * len(image_files),
+        chunksize=chunksize,
+    ))
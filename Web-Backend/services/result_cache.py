@@ -0,0 +1,332 @@
+# /unified_service/services/result_cache.py
+
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 按名称注册的缓存实例，每个进程一份
+_caches = {}
+_registry_lock = threading.Lock()
+
+_MISSING = object()
+
+
+def _estimate_size(value):
+    """估算缓存值占用的字节数（按JSON序列化后的长度）"""
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+class JsonSerializer:
+    """共享存储的默认序列化方式，可读且跨语言"""
+
+    def dumps(self, value):
+        return json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+
+    def loads(self, blob):
+        return json.loads(blob)
+
+
+class PickleSerializer:
+    """更快、保留Python类型，仅用于本机可信的缓存文件"""
+
+    def dumps(self, value):
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, blob):
+        return pickle.loads(blob)
+
+
+# 可按名称选择的序列化方式，也可直接传入实现了 dumps/loads 的对象
+SERIALIZERS = {
+    'json': JsonSerializer(),
+    'pickle': PickleSerializer(),
+}
+
+
+class TTLCache:
+    """线程安全的进程内LRU缓存，支持过期时间以及条目数、字节数上限"""
+
+    def __init__(self, ttl, max_entries=None, max_bytes=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expire_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """读取缓存，未命中或已过期时返回default"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expire_at, size, value = item
+            if expire_at < time.time():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，超出上限时淘汰最久未使用的条目"""
+        size = _estimate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expire_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expire_at, size, value)
+            self._bytes += size
+            while self._data and (
+                (self.max_entries and len(self._data) > self.max_entries)
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """返回命中统计与当前占用"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+
+class SqliteStore:
+    """基于本地SQLite文件的共享缓存，同一台机器上的多个gunicorn worker可共用
+
+    建议把文件放在 /dev/shm 等内存文件系统上。条目带过期时间，
+    总大小超过上限时按最近访问时间淘汰。总大小由触发器维护在 cache_size 表中，
+    写入时不需要扫描全表，多个进程的写入同样计入。
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " expire_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache(last_access)")
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+        # 旧版本创建的缓存文件没有 cache_size，按现有条目初始化一次
+        conn.execute("INSERT OR IGNORE INTO cache_size (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM cache")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache BEGIN"
+            " UPDATE cache_size SET bytes = bytes + new.size WHERE id = 0; END")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache BEGIN"
+            " UPDATE cache_size SET bytes = bytes + new.size - old.size WHERE id = 0; END")
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache BEGIN"
+            " UPDATE cache_size SET bytes = bytes - old.size WHERE id = 0; END")
+        conn.execute("COMMIT")
+
+    def _conn(self):
+        # sqlite连接不能跨线程共享，每个线程一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """返回 (value, expire_at)，不存在或已过期时返回None"""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expire_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        # 使用 UPSERT 而不是 INSERT OR REPLACE：REPLACE 删除旧行时不会触发删除触发器
+        conn.execute(
+            "INSERT INTO cache (key, value, size, expire_at, last_access) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size,"
+            " expire_at = excluded.expire_at, last_access = excluded.last_access",
+            (key, value, len(value), now + ttl, now),
+        )
+        if self._total_bytes(conn) > self.max_bytes:
+            conn.execute("DELETE FROM cache WHERE expire_at < ?", (now,))
+            # 按最近访问时间淘汰到上限的90%
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS acc FROM cache)"
+                " WHERE acc > ?)",
+                (int(self.max_bytes * 0.9),),
+            )
+
+    @staticmethod
+    def _total_bytes(conn):
+        return conn.execute("SELECT bytes FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def stats(self):
+        conn = self._conn()
+        entries = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"entries": entries, "bytes": self._total_bytes(conn)}
+
+
+class ResultCache:
+    """两级结果缓存：进程内LRU + 可选的本机共享存储，记录各级命中次数
+
+    ttl 为条目的总有效期；进程内缓存的有效期取 memory.ttl 与 ttl 中较小者，
+    memory.ttl 较短时，某个worker中的删除/失效最多在 memory.ttl 后对其他worker生效。
+    """
+
+    def __init__(self, memory, shared=None, ttl=None, serializer=None):
+        self.memory = memory
+        self.shared = shared
+        self.ttl = memory.ttl if ttl is None else ttl
+        self.serializer = serializer or SERIALIZERS['json']
+        self.shared_hits = 0
+
+    @staticmethod
+    def _shared_key(key):
+        return json.dumps(key, ensure_ascii=False, default=str)
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.shared is not None:
+            try:
+                item = self.shared.get(self._shared_key(key))
+            except sqlite3.Error as e:
+                logger.warning(f"读取共享缓存出错: {e}")
+                item = None
+            if item is not None:
+                blob, expire_at = item
+                value = self.serializer.loads(blob)
+                # 回填进程内缓存，过期时间不晚于共享存储
+                self.memory.set(key, value, ttl=min(expire_at - time.time(), self.memory.ttl))
+                self.shared_hits += 1
+                return value
+        return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, min(ttl, self.memory.ttl))
+        if self.shared is not None:
+            try:
+                blob = self.serializer.dumps(value)
+                self.shared.set(self._shared_key(key), blob, ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"写入共享缓存出错: {e}")
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.shared is not None:
+            try:
+                self.shared.delete(self._shared_key(key))
+            except sqlite3.Error as e:
+                logger.warning(f"删除共享缓存出错: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.shared is not None:
+            try:
+                self.shared.clear()
+            except sqlite3.Error as e:
+                logger.warning(f"清空共享缓存出错: {e}")
+
+    def stats(self):
+        stats = self.memory.stats()
+        # 进程内未命中但共享存储命中的请求记为命中
+        hits = stats["hits"] + self.shared_hits
+        misses = stats["misses"] - self.shared_hits
+        stats.update({
+            "hits": hits,
+            "misses": misses,
+            "memory_hits": stats["hits"],
+            "shared_hits": self.shared_hits,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        })
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+def get_cache(name, ttl, max_entries=None, max_bytes=None, shared_path=None, shared_max_bytes=None,
+              memory_ttl=None, serializer='json'):
+    """获取指定名称的缓存，首次调用时按参数创建
+
+    shared_path 不为空时在进程内缓存之后增加一层本机共享的SQLite存储，
+    memory_ttl 限制进程内副本的有效期，serializer 为共享存储的序列化方式（名称或对象）
+    """
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            memory = TTLCache(min(ttl, memory_ttl or ttl), max_entries=max_entries, max_bytes=max_bytes)
+            shared = None
+            if shared_path:
+                try:
+                    shared = SqliteStore(shared_path, shared_max_bytes)
+                except (OSError, sqlite3.Error) as e:
+                    # 如容器中没有可写的 /dev/shm，只使用进程内缓存
+                    logger.warning(f"无法打开共享缓存 {shared_path}，缓存 {name} 只使用进程内缓存: {e}")
+            if isinstance(serializer, str):
+                serializer = SERIALIZERS[serializer]
+            cache = _caches[name] = ResultCache(memory, shared, ttl=ttl, serializer=serializer)
+        return cache
+
+
+def all_cache_stats():
+    """所有已创建缓存的统计信息"""
+    with _registry_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -2,16 +2,11 @@
 
 import logging
 import os
+import re
 import time
-from towhee import AutoPipes, AutoConfig
-from towhee.datacollection import DataCollection
-from pymilvus import MilvusClient
-from elasticsearch import Elasticsearch
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from PIL import Image
-from imagehash import phash
-import numpy as np
+import unicodedata
+# towhee / pymilvus / elasticsearch / sklearn 导入较慢，在首次使用时才导入，启动时不阻塞图谱等轻量接口
+from services import video_pipeline, video_fingerprint, hamming_index, phash_service, ngram_rerank, metrics
 
 logger = logging.getLogger(__name__)
 
@@ -19,37 +14,45 @@ logger = logging.getLogger(__name__)
 es_client = None
 milvus_client = None
 
+# ES中稿件返回的字段
+ARTICLE_SOURCE_FIELDS = ["id", "title", "content", "publishtime", "event", "uid", "uname",
+                         "isrumor", "datasource", "istweet", "isretweet", "retext", "pic_ids", "pic_urls"]
+
+def init_es_client(app_config):
+    """初始化Elasticsearch客户端，连接失败时抛出异常（由调用方重试）"""
+    global es_client
+    from elasticsearch import Elasticsearch
+
+    client = Elasticsearch(
+        hosts=app_config.get('ES_HOSTS'),
+        basic_auth=app_config.get('ES_AUTH')
+    )
+    if not client.ping():
+        raise ConnectionError("连接Elasticsearch失败")
+    logger.info('连接Elasticsearch成功!')
+    count = client.cat.count(index=app_config.get('ES_INDEX'), format="json")[0]['count']
+    logger.info(f"ES索引 '{app_config.get('ES_INDEX')}' 中当前文档总数: {count}")
+    es_client = client
+
+def init_milvus_client(app_config):
+    """初始化Milvus客户端，连接失败时抛出异常（由调用方重试）"""
+    global milvus_client
+    from pymilvus import MilvusClient
+
+    milvus_client = MilvusClient(uri=app_config.get('MILVUS_URI'), token=app_config.get('MILVUS_TOKEN'))
+    logger.info("连接Milvus成功!")
+
 def init_search_clients(app_config):
     """初始化Elasticsearch和Milvus客户端"""
-    global es_client, milvus_client
-    
-    # 初始化Elasticsearch
-    try:
-        es_client = Elasticsearch(
-            hosts=app_config.get('ES_HOSTS'),
-            basic_auth=app_config.get('ES_AUTH')
-        )
-        if es_client.ping():
-            logger.info('连接Elasticsearch成功!')
-            count = es_client.cat.count(index=app_config.get('ES_INDEX'), format="json")[0]['count']
-            logger.info(f"ES索引 '{app_config.get('ES_INDEX')}' 中当前文档总数: {count}")
-        else:
-            raise ConnectionError("连接Elasticsearch失败")
-    except Exception as e:
-        logger.error(f"初始化Elasticsearch客户端时出错: {e}")
-        exit(1)
-
-    # 初始化Milvus
-    try:
-        milvus_client = MilvusClient(uri=app_config.get('MILVUS_URI'), token=app_config.get('MILVUS_TOKEN'))
-        logger.info("连接Milvus成功!")
-    except Exception as e:
-        logger.error(f"初始化Milvus客户端时出错: {e}")
-        exit(1)
+    init_es_client(app_config)
+    init_milvus_client(app_config)
 
 # --- 文本搜索逻辑 ---
 
 def _compute_ngram_similarity(query_text, doc_texts, n=3):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     all_texts = [query_text] + doc_texts
     vectorizer = TfidfVectorizer(analyzer='char', ngram_range=(n, n), lowercase=False)
     try:
@@ -59,144 +62,196 @@ def _compute_ngram_similarity(query_text, doc_texts, n=3):
     except ValueError:
         return [0.0] * len(doc_texts)
 
-def search_text(query_content, score_threshold, app_config, top_k_first=100, ngram_n=3):
-    """两阶段文本搜索：ES召回 + n-gram重排序"""
+def _mark_sources(candidates, scope=None):
+    """标注源头稿件(isSource)并按平台分组排序返回
+
+    先在同一事件内按发布时间找出最早的原创稿件，再在同一平台内确定源头。
+    scope 用于把候选划分为互不影响的子集（如批量查询时每个mid各自独立），
+    默认所有候选属于同一子集。
+    """
+    scope = scope or (lambda c: None)
+
+    for c in candidates:
+        if c.get("datasource") == 'weibo':
+            if c["istweet"] and not c["isretweet"]:
+                c["isSource"] = 0
+        else:
+            c["isSource"] = 0
+
+    id_group = {}
+    for c in candidates:
+        id_group.setdefault((scope(c), c.get("event")), []).append(c)
+
+    for group in id_group.values():
+        sorted_group = sorted(group, key=lambda x: x["publishtime"], reverse=False)
+        found_source = False
+        for item in sorted_group:
+            if not found_source and item["isSource"] == 0:
+                item["isSource"] = 1
+                found_source = True
+
+    id_group = {}
+    for c in candidates:
+        id_group.setdefault((scope(c), c.get("datasource")), []).append(c)
+
+    final_candidates = []
+    for group in id_group.values():
+        sorted_group = sorted(group, key=lambda x: x["publishtime"], reverse=False)
+        found_source = False
+        for item in sorted_group:
+            if not found_source and (item["isSource"] == 0 or item["isSource"] == 1):
+                item["isSource"] = 1
+                found_source = True
+        for item in sorted_group:
+            if item["isSource"] == -1:
+                item["isSource"] = 0
+        final_candidates.extend(sorted_group)
+
+    for c in candidates:
+        c["imageUrl"] = c.pop("pic_urls", -1)  # 使用 pop 删除原键并获取其值 重命名
+
+    return final_candidates
+
+def normalize_query_text(text):
+    """归一化查询文本用于缓存：全角转半角、去掉话题标签的#号、合并空白"""
+    text = unicodedata.normalize('NFKC', text)
+    text = text.replace('#', '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _rerank_similarities(query_text, candidates, app_config, n=3):
+    """计算候选稿件与查询的n-gram相似度
+
+    已构建语料统计时使用预计算的重排序引擎（按文档id缓存向量），否则退回逐请求拟合TF-IDF
+    """
+    engine = ngram_rerank.get_rerank_engine(app_config)
+    if engine.ready and engine.n == n:
+        return engine.similarities(query_text, [(c.get("id"), c["content"]) for c in candidates])
+    return _compute_ngram_similarity(query_text, [c["content"] for c in candidates], n=n)
+
+def recall_text_candidates(query_content, app_config, top_k_first=None):
+    """文本搜索第一阶段：ES召回候选稿件（I/O）"""
     if not es_client:
         raise ConnectionError("Elasticsearch客户端未初始化")
+    if top_k_first is None:
+        top_k_first = app_config.get('TEXT_SEARCH_TOP_K')
 
     search_body = {
         "query": {"match": {"content": query_content}},
-        "_source": ["id", "title", "content", "publishtime", "event", "uid", "uname", 
-                    "isrumor", "datasource", "istweet", "isretweet", "retext", "pic_ids", "pic_urls"],
+        "_source": ARTICLE_SOURCE_FIELDS,
         "size": top_k_first
     }
-    
-    try:
+    with metrics.stage('es_recall'):
         response = es_client.search(index=app_config.get('ES_INDEX'), body=search_body)
-        hits = response['hits']['hits']
-        if not hits:
-            return []
+    return [hit["_source"] for hit in response['hits']['hits']]
 
-        candidates = [hit["_source"] for hit in hits]
-        candidate_contents = [c["content"] for c in candidates]
-        
-        similarities = _compute_ngram_similarity(query_content, candidate_contents, n=ngram_n)
-        
-        for c, sim in zip(candidates, similarities):
-            c["ngram_sim"] = sim
-            c["isSource"] = -1
+def rank_text_candidates(query_content, candidates, score_threshold, app_config, ngram_n=3):
+    """文本搜索第二阶段：n-gram重排序、按阈值过滤并标注源头（CPU）"""
+    if not candidates:
+        return []
 
-        candidates = [c for c in candidates if c["ngram_sim"] > score_threshold]
+    with metrics.stage('ngram_rerank'):
+        similarities = _rerank_similarities(query_content, candidates, app_config, n=ngram_n)
 
-        for c in candidates:
-            if c.get("datasource") == 'weibo':
-                if c["istweet"] and not c["isretweet"]:  
-                # if c.get("istweet") == "true" and c.get("isretweet") == "false":
-                    c["isSource"] = 0
-            else:
-                c["isSource"] = 0
+    for c, sim in zip(candidates, similarities):
+        c["ngram_sim"] = sim
+        c["isSource"] = -1
 
-        id_group = {}
-        for c in candidates:
-            id_val = c.get("event")
-            if id_val not in id_group:
-                id_group[id_val] = []
-            id_group[id_val].append(c)
-        
-        temp_candidates = []
-        for group in id_group.values():
-            # sorted_group = sorted(group, key=lambda x: x.get("publishtime", ""), reverse=False)
-            # sorted_group = sorted(group, key=lambda x: x["ngram_sim"], reverse=True)
-            sorted_group = sorted(group, key=lambda x: x["publishtime"], reverse=False)
-            found_source = False
-            for item in sorted_group:
-                if not found_source and item["isSource"] == 0:
-                    item["isSource"] = 1
-                    found_source = True
-            # for item in sorted_group:
-            #     if item["isSource"] == -1:
-            #         item["isSource"] = 0
-            temp_candidates.extend(sorted_group)
-
-        id_group = {}
-        for c in candidates:
-            id_val = c.get("datasource")
-            if id_val not in id_group:
-                id_group[id_val] = []
-            id_group[id_val].append(c)
-        
-        final_candidates = []
-        for group in id_group.values():
-            # sorted_group = sorted(group, key=lambda x: x.get("publishtime", ""), reverse=False)
-            # sorted_group = sorted(group, key=lambda x: x["ngram_sim"], reverse=True)
-            sorted_group = sorted(group, key=lambda x: x["publishtime"], reverse=False)
-            found_source = False
-            for item in sorted_group:
-                if not found_source and (item["isSource"] == 0 or item["isSource"] == 1):
-                    item["isSource"] = 1
-                    found_source = True
-            for item in sorted_group:
-                if item["isSource"] == -1:
-                    item["isSource"] = 0
-            final_candidates.extend(sorted_group)
-        
-        for c in candidates:
-            c["imageUrl"] = c.pop("pic_urls", -1)  # 使用 pop 删除原键并获取其值 重命名       
+    candidates = [c for c in candidates if c["ngram_sim"] > score_threshold]
 
-        return final_candidates
+    with metrics.stage('source_grouping'):
+        return _mark_sources(candidates)
 
+def search_text(query_content, score_threshold, app_config, top_k_first=None, ngram_n=3):
+    """两阶段文本搜索：ES召回 + n-gram重排序"""
+    try:
+        candidates = recall_text_candidates(query_content, app_config, top_k_first)
+        return rank_text_candidates(query_content, candidates, score_threshold, app_config, ngram_n)
     except Exception as e:
         logger.error(f"文本搜索出错: {e}")
         return {"error": str(e)}
 
 # --- 图像搜索逻辑 ---
 
-def _convert_bool_list_to_bytes(bool_list):
-    byte_array = bytearray(len(bool_list) // 8)
-    for i, bit in enumerate(bool_list):
-        if bit:
-            byte_array[i // 8] |= (1 << (i % 8))
-    return bytes(byte_array)
+# pHash计算实现在 phash_service 中（可被进程池单独导入），这里保留原有名称
+_convert_bool_list_to_bytes = phash_service.convert_bool_list_to_bytes
 
-def _calculate_phash_signature(image_file, hash_size=16):
-    pil_image = Image.open(image_file).convert("L").resize(
-        (hash_size + 1, hash_size), Image.Resampling.LANCZOS
-    )
-    phash_value = phash(pil_image, hash_size)
-    pil_image.close()
-    
-    bool_array = phash_value.hash.flatten()
-    bit_array = bool_array.astype(np.uint8)
-    return _convert_bool_list_to_bytes(bit_array)
+def _calculate_phash_signature(image_file, hash_size=16, draft_size=None):
+    return phash_service.calculate_phash_signature(image_file, hash_size, draft_size)
+
+def _search_image_hashes(hashes, app_config):
+    """按配置的后端检索pHash，返回每个查询距离小于阈值的命中列表
+
+    IMAGE_SEARCH_BACKEND:
+      'milvus'       仅查询Milvus
+      'local'        仅查询本地汉明索引，不依赖Milvus
+      'local+milvus' 先查本地索引（热点缓存），未命中的查询再交给Milvus
+    """
+    backend = app_config.get('IMAGE_SEARCH_BACKEND')
+    max_distance = app_config.get('IMAGE_SEARCH_MAX_DISTANCE')
+    output_fields = ["data_path", "mid"]
+
+    results = [[] for _ in hashes]
+    pending = list(range(len(hashes)))
+    if backend in ('local', 'local+milvus'):
+        local_index = hamming_index.get_local_index(app_config)
+        with metrics.stage('local_index_search'):
+            local_results = local_index.search(
+                data=hashes, output_fields=output_fields, max_distance=max_distance
+            )
+        for i, hits in enumerate(local_results):
+            results[i] = hits
+        pending = [i for i in pending if not results[i]]
+        if backend == 'local':
+            pending = []
+
+    if pending:
+        if not milvus_client:
+            raise ConnectionError("Milvus客户端未初始化")
+        with metrics.stage('milvus_search'):
+            milvus_results = milvus_client.search(
+                collection_name=app_config.get('MILVUS_IMAGE_COLLECTION'),
+                data=[hashes[i] for i in pending],
+                output_fields=output_fields
+            )
+        for i, hits in zip(pending, milvus_results):
+            results[i] = [hit for hit in hits if hit["distance"] < max_distance]
+    return results
+
+def picture_hashes(image_paths, app_config):
+    """图像搜索第一阶段：计算各图片的pHash（CPU）"""
+    draft_size = app_config.get('PHASH_JPEG_DRAFT_SIZE')
+    with metrics.stage('phash'):
+        if len(image_paths) == 1:
+            return [_calculate_phash_signature(image_paths[0], draft_size=draft_size)]
+        return phash_service.calculate_phash_signatures(
+            image_paths,
+            workers=app_config.get('PHASH_WORKERS'),
+            draft_size=draft_size,
+        )
+
+def search_picture_hashes(hashes, app_config):
+    """图像搜索第二阶段：检索pHash（Milvus为I/O，纯本地索引时为CPU），返回 (路径列表, mid列表)"""
+    results = _search_image_hashes(hashes, app_config)
+    pred_paths = [[item["entity"]["data_path"] for item in result_set] for result_set in results]
+    pred_mid = [[item["entity"]["mid"] for item in result_set] for result_set in results]
+    return pred_paths, pred_mid
 
 def search_picture(image_path, app_config):
-    """使用Milvus进行图像pHash搜索"""
-    if not milvus_client:
-        raise ConnectionError("Milvus客户端未初始化")
-    
+    """使用Milvus（或本地汉明索引）进行图像pHash搜索"""
     try:
-        img_hash = _calculate_phash_signature(image_path)
-        results = milvus_client.search(
-            collection_name=app_config.get('MILVUS_IMAGE_COLLECTION'),
-            data=[img_hash],
-            output_fields=["data_path","mid"]
-        )
-        results = [[hit for hit in result_list if hit["distance"] < 90] for result_list in results]
-        print(results)
-        
-        pred_paths = []
-        pred_mid = []
-        for result_set in results:
-            top_n_paths = [item["entity"]["data_path"] for item in result_set]
-            pred_paths.append(top_n_paths)
-            top_n_mid = [item["entity"]["mid"] for item in result_set]
-            pred_mid.append(top_n_mid)
-            
-        return pred_paths,pred_mid
-        
+        return search_picture_hashes(picture_hashes([image_path], app_config), app_config)
     except Exception as e:
         logger.error(f"图像搜索出错: {e}")
-        return {"error": str(e)}
+        return {"error": str(e)}, None
+
+
+def search_pictures(image_paths, app_config):
+    """批量图像搜索：并行计算pHash后，用一次多向量检索查询所有图片"""
+    try:
+        return search_picture_hashes(picture_hashes(image_paths, app_config), app_config)
+    except Exception as e:
+        logger.error(f"批量图像搜索出错: {e}")
+        return {"error": str(e)}, None
 
 
 def search_event_by_mid(query_content, app_config, top_k_first=1, ngram_n=3):
@@ -206,13 +261,13 @@ def search_event_by_mid(query_content, app_config, top_k_first=1, ngram_n=3):
 
     search_body = {
         "query": {"term": {"id": query_content}},
-        "_source": ["id", "title", "content", "publishtime", "event", "uid", "uname", 
-                    "isrumor", "datasource", "istweet", "isretweet", "retext", "pic_ids", "pic_urls"],
+        "_source": ARTICLE_SOURCE_FIELDS,
         "size": top_k_first
     }
     
     try:
-        response = es_client.search(index=app_config.get('ES_INDEX'), body=search_body)
+        with metrics.stage('es_mid_lookup'):
+            response = es_client.search(index=app_config.get('ES_INDEX'), body=search_body)
         hits = response['hits']['hits']
         if not hits:
             return []
@@ -220,92 +275,101 @@ def search_event_by_mid(query_content, app_config, top_k_first=1, ngram_n=3):
         candidates = [hit["_source"] for hit in hits]
         candidate_contents = [c["content"] for c in candidates]
         
-        similarities = _compute_ngram_similarity(query_content, candidate_contents, n=ngram_n)
+        with metrics.stage('ngram_rerank'):
+            similarities = _compute_ngram_similarity(query_content, candidate_contents, n=ngram_n)
         
         for c, sim in zip(candidates, similarities):
             c["ngram_sim"] = sim
             c["isSource"] = -1
 
-        for c in candidates:
-            if c.get("datasource") == 'weibo':
-                if c["istweet"] and not c["isretweet"]:  
-                # if c.get("istweet") == "true" and c.get("isretweet") == "false":
-                    c["isSource"] = 0
-            else:
-                c["isSource"] = 0
+        with metrics.stage('source_grouping'):
+            return _mark_sources(candidates)
 
-        id_group = {}
-        for c in candidates:
-            id_val = c.get("event")
-            if id_val not in id_group:
-                id_group[id_val] = []
-            id_group[id_val].append(c)
-        
-        temp_candidates = []
-        for group in id_group.values():
-            # sorted_group = sorted(group, key=lambda x: x.get("publishtime", ""), reverse=False)
-            # sorted_group = sorted(group, key=lambda x: x["ngram_sim"], reverse=True)
-            sorted_group = sorted(group, key=lambda x: x["publishtime"], reverse=False)
-            found_source = False
-            for item in sorted_group:
-                if not found_source and item["isSource"] == 0:
-                    item["isSource"] = 1
-                    found_source = True
-            # for item in sorted_group:
-            #     if item["isSource"] == -1:
-            #         item["isSource"] = 0
-            temp_candidates.extend(sorted_group)
-        id_group = {}
-        for c in candidates:
-            id_val = c.get("datasource")
-            if id_val not in id_group:
-                id_group[id_val] = []
-            id_group[id_val].append(c)
-        
-        final_candidates = []
-        for group in id_group.values():
-            # sorted_group = sorted(group, key=lambda x: x.get("publishtime", ""), reverse=False)
-            # sorted_group = sorted(group, key=lambda x: x["ngram_sim"], reverse=True)
-            sorted_group = sorted(group, key=lambda x: x["publishtime"], reverse=False)
-            found_source = False
-            for item in sorted_group:
-                if not found_source and (item["isSource"] == 0 or item["isSource"] == 1):
-                    item["isSource"] = 1
-                    found_source = True
-            for item in sorted_group:
-                if item["isSource"] == -1:
-                    item["isSource"] = 0
-            final_candidates.extend(sorted_group)
-        
-        for c in candidates:
-            c["imageUrl"] = c.pop("pic_urls", -1)  # 使用 pop 删除原键并获取其值 重命名       
+    except Exception as e:
+        logger.error(f"图片搜索出错: {e}")
+        return {"error": str(e)}
+
+
+def search_events_by_mids(mids, app_config, ngram_n=3):
+    """批量根据mid查询稿件，一次msearch请求代替逐个调用search_event_by_mid
+
+    返回结果与对每个mid调用search_event_by_mid后按顺序展平的结果一致。
+    """
+    results = search_events_by_mid_groups([mids], app_config, ngram_n)
+    if isinstance(results, dict):
+        return results
+    return results[0]
+
+
+def search_events_by_mid_groups(mid_groups, app_config, ngram_n=3):
+    """多组mid（如批量图片搜索的每张图片一组）共用一次msearch请求，按组返回稿件列表"""
+    if not es_client:
+        raise ConnectionError("Elasticsearch客户端未初始化")
+
+    unique_mids = list(dict.fromkeys(mid for mids in mid_groups for mid in mids))
+    if not unique_mids:
+        return [[] for _ in mid_groups]
+
+    searches = []
+    for mid in unique_mids:
+        searches.append({})
+        searches.append({
+            "query": {"term": {"id": mid}},
+            "_source": ARTICLE_SOURCE_FIELDS,
+            "size": 1
+        })
+
+    try:
+        with metrics.stage('es_mid_lookup'):
+            response = es_client.msearch(index=app_config.get('ES_INDEX'), body=searches)
+        hits_by_mid = {}
+        for mid, item in zip(unique_mids, response['responses']):
+            if 'error' in item:
+                raise RuntimeError(item['error'])
+            hits_by_mid[mid] = item['hits']['hits']
 
-        return final_candidates
+        # 每次出现的mid各自生成候选，重复的mid与逐个查询时一样返回多份
+        candidates = []
+        similarity_cache = {}
+        for group, mids in enumerate(mid_groups):
+            for position, mid in enumerate(mids):
+                for hit in hits_by_mid[mid]:
+                    c = dict(hit["_source"])
+                    if mid not in similarity_cache:
+                        with metrics.stage('ngram_rerank'):
+                            similarity_cache[mid] = _compute_ngram_similarity(mid, [c["content"]], n=ngram_n)[0]
+                    c["ngram_sim"] = similarity_cache[mid]
+                    c["isSource"] = -1
+                    c["_position"] = (group, position)
+                    candidates.append(c)
+
+        with metrics.stage('source_grouping'):
+            final_candidates = _mark_sources(candidates, scope=lambda c: c["_position"])
+        grouped = [[] for _ in mid_groups]
+        for c in final_candidates:
+            group, _ = c.pop("_position")
+            grouped[group].append(c)
+        return grouped
 
     except Exception as e:
-        logger.error(f"图片搜索出错: {e}")
+        logger.error(f"批量图片事件查询出错: {e}")
         return {"error": str(e)}
 
 # --- 视频搜索逻辑 ---
 
 def search_video(video_path, score, app_config):
     """使用Towhee和Milvus进行视频拷贝检测"""
+    from towhee.datacollection import DataCollection
+
     try:
-        search_conf = AutoConfig.load_config('video_copy_detection')
-        search_conf.collection = app_config.get('MILVUS_VIDEO_COLLECTION')
-        search_conf.milvus_host = app_config.get('MILVUS_URI').split('//')[1].split(':')[0]
-        search_conf.milvus_port = int(app_config.get('MILVUS_URI').split(':')[-1])
-        search_conf.device = app_config.get('TOWHEE_DEVICE')
-        search_conf.leveldb_path = app_config.get('TOWHEE_LEVELDB_PATH')
-        search_conf.threshold = score
-        
-        search_pipe = AutoPipes.pipeline('video_copy_detection', search_conf)
-        results = search_pipe(video_path)
-        res = DataCollection(results).to_list()
+        # 流水线按配置在进程内只构建一次，重复搜索只需抽帧和ANN检索
+        with metrics.stage('towhee_pipeline'):
+            results = video_pipeline.run_video_pipeline(video_path, app_config, score)
+            res = DataCollection(results).to_list()
         
         # 假设返回结果是每个检测段的候选视频列表，我们这里简化为只取第一个结果的候选列表
         res_value = [r['candidates'] for r in res] if res else []
-        print(res_value)
+        logger.debug(f"视频检索结果: {res_value}")
         return res_value
         # 将多个候选列表拍平并去重
         # flat_unique_list = []
@@ -319,4 +383,23 @@ def search_video(video_path, score, app_config):
 
     except Exception as e:
         logger.error(f"视频搜索出错: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+def search_video_cpu(video_path, score, app_config, sample=None, early_exit_score=None, progress=None):
+    """CPU模式的视频拷贝检测：抽帧后分批计算向量并检索，命中足够时提前结束
+
+    返回 (候选视频路径列表, 各阶段帧数与耗时)，progress 为每批帧处理后的进度回调
+    """
+    try:
+        if not milvus_client:
+            raise ConnectionError("Milvus客户端未初始化")
+        candidates, stages = video_fingerprint.search_video_frames(
+            video_path, milvus_client, app_config, score, sample=sample, early_exit_score=early_exit_score,
+            progress=progress,
+        )
+        logger.info(f"CPU视频检索: {video_path}, 候选数: {len(candidates)}, 阶段: {stages}")
+        return [c["path"] for c in candidates], stages
+
+    except Exception as e:
+        logger.error(f"视频搜索出错: {e}")
+        return {"error": str(e)}, None
\ No newline at end of file
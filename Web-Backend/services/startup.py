@@ -0,0 +1,137 @@
+# /unified_service/services/startup.py
+"""
+后端子系统的后台初始化与就绪状态
+
+应用启动时不再同步连接各后端：每个子系统在独立的后台线程中初始化，
+失败后按指数退避重试（STARTUP_RETRY_INTERVAL 起，最长 STARTUP_RETRY_MAX_INTERVAL 秒），
+某个后端缓慢或不可用不会阻塞其他子系统，图谱接口在视频模型加载期间即可服务。
+  - nebula:        NebulaGraph连接池
+  - elasticsearch: 文本检索与事件查询
+  - milvus:        图片/视频向量检索
+  - image_index:   本地汉明索引快照（仅 IMAGE_SEARCH_BACKEND 为 local / local+milvus 时加载，快照缺失视为未就绪）
+  - video:         Towhee视频流水线（TOWHEE_WARMUP 为 True 时同时构建流水线或加载帧向量模型）
+/api/ready 返回各子系统状态，依赖未就绪子系统的接口返回503。
+
+后台线程在 create_app 中启动，使用 gunicorn --preload 时需在 post_fork 钩子中调用 start_background_init。
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 子系统名称 -> Subsystem
+_subsystems = {}
+_lock = threading.Lock()
+
+
+class Subsystem:
+    """单个子系统的初始化状态：pending / retrying / ready"""
+
+    def __init__(self, name, init):
+        self.name = name
+        self.init = init
+        self.status = 'pending'
+        self.error = None
+        self.attempts = 0
+        self.started_at = time.time()
+        self.ready_at = None
+
+    def to_dict(self):
+        data = {"status": self.status, "attempts": self.attempts}
+        if self.ready_at is not None:
+            data["startup_seconds"] = round(self.ready_at - self.started_at, 2)
+        if self.error and self.status != 'ready':
+            data["error"] = self.error
+        return data
+
+
+def _init_nebula(app_config):
+    from services import nebula_service
+    nebula_service.init_nebula_pool(app_config)
+
+
+def _init_elasticsearch(app_config):
+    from services import search_service
+    search_service.init_es_client(app_config)
+
+
+def _init_milvus(app_config):
+    from services import search_service
+    search_service.init_milvus_client(app_config)
+
+
+def _init_image_index(app_config):
+    if app_config.get('IMAGE_SEARCH_BACKEND') in ('local', 'local+milvus'):
+        from services import hamming_index
+        hamming_index.get_local_index(app_config)
+
+
+def _init_video(app_config):
+    cpu_mode = app_config.get('VIDEO_SEARCH_MODE') == 'cpu'
+    if app_config.get('VIDEO_EMBED_BACKEND') == 'onnx' and not cpu_mode:
+        logger.warning("VIDEO_EMBED_BACKEND='onnx' 只作用于CPU检索模式，默认的 pipeline 模式仍使用Towhee流水线的float32模型"
+                       "（请求 mode=cpu 时才使用int8模型）")
+    if not (cpu_mode and app_config.get('VIDEO_EMBED_BACKEND') == 'onnx'):
+        # 导入towhee本身就需要数秒，在后台完成，首个视频请求不再承担
+        import towhee  # noqa: F401
+    if not app_config.get('TOWHEE_WARMUP'):
+        return
+    if cpu_mode:
+        from services import video_fingerprint
+        video_fingerprint.get_frame_embedder(app_config)
+    else:
+        from services import video_pipeline
+        video_pipeline.prepare_video_pipeline(app_config)
+
+
+SUBSYSTEMS = {
+    'nebula': _init_nebula,
+    'elasticsearch': _init_elasticsearch,
+    'milvus': _init_milvus,
+    'image_index': _init_image_index,
+    'video': _init_video,
+}
+
+
+def _run(subsystem, app_config):
+    delay = app_config.get('STARTUP_RETRY_INTERVAL')
+    while True:
+        subsystem.attempts += 1
+        try:
+            subsystem.init(app_config)
+        except Exception as e:
+            subsystem.status = 'retrying'
+            subsystem.error = str(e)
+            logger.warning(f"初始化 {subsystem.name} 失败（第{subsystem.attempts}次）: {e}，{delay}秒后重试")
+            time.sleep(delay)
+            delay = min(delay * 2, app_config.get('STARTUP_RETRY_MAX_INTERVAL'))
+            continue
+        subsystem.ready_at = time.time()
+        subsystem.status = 'ready'
+        logger.info(f"{subsystem.name} 初始化完成，耗时 {subsystem.ready_at - subsystem.started_at:.1f}s")
+        return
+
+
+def start_background_init(app_config, names=None):
+    """在后台线程中初始化各子系统（已启动的子系统不会重复初始化）"""
+    for name in names or SUBSYSTEMS:
+        with _lock:
+            if name in _subsystems:
+                continue
+            subsystem = _subsystems[name] = Subsystem(name, SUBSYSTEMS[name])
+        threading.Thread(target=_run, args=(subsystem, app_config), name=f'init-{name}', daemon=True).start()
+
+
+def not_ready(names):
+    """返回 names 中尚未就绪的子系统"""
+    with _lock:
+        return [name for name in names if name not in _subsystems or _subsystems[name].status != 'ready']
+
+
+def readiness():
+    """各子系统的就绪状态"""
+    with _lock:
+        subsystems = dict(_subsystems)
+    return {name: subsystem.to_dict() for name, subsystem in subsystems.items()}
@@ -0,0 +1,108 @@
+# /unified_service/services/thumbnail_service.py
+
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 缩略图缓存占用的字节数，首次使用时扫描目录得到
+_total_bytes = None
+_lock = threading.Lock()
+
+
+def _pick_width(width, allowed_widths):
+    """把请求的宽度对齐到配置的固定宽度之一，避免生成任意尺寸的衍生图"""
+    allowed = sorted(allowed_widths)
+    for w in allowed:
+        if width <= w:
+            return w
+    return allowed[-1]
+
+
+def _cache_path(cache_dir, src_path, mtime_ns, width):
+    """缓存文件路径：由源文件路径、修改时间和宽度决定，源文件变化后自动失效"""
+    key = hashlib.sha1(f"{os.path.abspath(src_path)}:{mtime_ns}:{width}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key[:2], f"{key}.webp")
+
+
+def _scan(cache_dir):
+    """列出缓存目录中的所有缩略图 (路径, 大小, 最近访问时间)"""
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith('.webp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+    return entries
+
+
+def _evict(cache_dir, max_bytes):
+    """总大小超过上限时按最近访问时间淘汰，直到降到上限的90%"""
+    global _total_bytes
+    entries = _scan(cache_dir)
+    total = sum(size for _, size, _ in entries)
+    if total > max_bytes:
+        entries.sort(key=lambda e: e[2])
+        target = int(max_bytes * 0.9)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        logger.info(f"缩略图缓存淘汰完成，当前占用 {total} 字节")
+    _total_bytes = total
+
+
+def _generate(src_path, dst_path, width, quality):
+    """生成最长边不超过width的WebP缩略图，先写临时文件再原子替换"""
+    from PIL import Image, ImageOps
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    with Image.open(src_path) as img:
+        # JPEG按缩小比例解码，减少解码开销
+        img.draft('RGB', (width, width))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        img.thumbnail((width, width), Image.Resampling.LANCZOS)
+        tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, 'WEBP', quality=quality)
+    os.replace(tmp_path, dst_path)
+    return os.path.getsize(dst_path)
+
+
+def get_thumbnail(src_path, width, app_config):
+    """返回源图片指定宽度缩略图的路径，首次访问时生成并缓存到磁盘"""
+    global _total_bytes
+    cache_dir = app_config.get('THUMBNAIL_FOLDER')
+    max_bytes = app_config.get('THUMBNAIL_CACHE_MAX_BYTES')
+    width = _pick_width(width, app_config.get('THUMBNAIL_WIDTHS'))
+
+    mtime_ns = os.stat(src_path).st_mtime_ns
+    thumb_path = _cache_path(cache_dir, src_path, mtime_ns, width)
+    if os.path.exists(thumb_path):
+        try:
+            os.utime(thumb_path)  # 刷新访问时间，用于LRU淘汰
+            return thumb_path
+        except FileNotFoundError:
+            pass  # 刚被其他进程淘汰，重新生成
+
+    size = _generate(src_path, thumb_path, width, app_config.get('THUMBNAIL_QUALITY'))
+    with _lock:
+        if _total_bytes is None:
+            _evict(cache_dir, max_bytes)
+        else:
+            _total_bytes += size
+            if _total_bytes > max_bytes:
+                _evict(cache_dir, max_bytes)
+    return thumb_path
@@ -0,0 +1,225 @@
+# /unified_service/services/video_fingerprint.py
+"""
+面向CPU节点的视频拷贝检测
+
+Towhee 的 video_copy_detection 流水线会先解码并计算整段视频所有帧的向量，再检索候选。
+这里改为边解码边检索：
+  - 抽帧：只解码关键帧（VIDEO_CPU_SAMPLE = 'keyframes'），或按固定间隔（秒）取帧
+  - 向量：每凑满 VIDEO_CPU_EMBED_BATCH 帧计算一次ISC向量，并在 MILVUS_VIDEO_COLLECTION 中检索
+  - 提前结束：某个候选的匹配片段得分达到 VIDEO_CPU_EARLY_EXIT_SCORE 后不再解码后续帧
+
+匹配片段得分：查询视频中连续（允许间隔一个抽样帧）命中同一候选视频的帧的相似度之和。
+每次检索返回各阶段的帧数与耗时，可按请求调整抽帧方式和提前结束阈值，在召回率与延迟之间取舍。
+"""
+
+import logging
+import threading
+import time
+import numpy as np
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# 按（后端, 输入尺寸, 设备）缓存的帧向量模型
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+class FrameEmbedder:
+    """与检索流水线相同的ISC帧向量模型，输出L2归一化向量"""
+
+    def __init__(self, img_size, device=None, threads=None):
+        from towhee import ops
+
+        if threads and device is None:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = ops.image_embedding.isc(img_size=img_size, device=device)
+        # 模型不保证可重入，同一实例的调用串行执行
+        self.lock = threading.Lock()
+
+    def embed(self, frames):
+        """计算一批帧（[n, H, W, 3] 的RGB数组）的向量，返回 [n, dim] float32"""
+        from towhee.types import Image
+
+        with self.lock:
+            embeddings = self.model([Image(frame, 'RGB') for frame in frames])
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(frames), -1)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+
+def get_frame_embedder(app_config, device=None, backend=None):
+    """获取帧向量模型，同一配置每个进程只加载一次
+
+    backend 缺省为 VIDEO_EMBED_BACKEND（CPU检索模式使用）；为 'onnx' 时使用 VIDEO_EMBED_ONNX_PATH 的int8模型
+    （见 onnx_embedding），忽略 device
+    """
+    backend = backend or app_config.get('VIDEO_EMBED_BACKEND')
+    threads = app_config.get('VIDEO_EMBED_THREADS')
+    if backend == 'onnx':
+        key = (backend, app_config.get('VIDEO_EMBED_ONNX_PATH'), None)
+    else:
+        key = (backend, app_config.get('VIDEO_INDEX_FRAME_SIZE'), device)
+    with _embedders_lock:
+        embedder = _embedders.get(key)
+        if embedder is None:
+            logger.info(f"加载帧向量模型: {key}")
+            if backend == 'onnx':
+                from services import onnx_embedding
+                embedder = onnx_embedding.OnnxFrameEmbedder(key[1], threads=threads)
+            else:
+                embedder = FrameEmbedder(key[1], device, threads=threads)
+            _embedders[key] = embedder
+        return embedder
+
+
+def parse_sample(value):
+    """解析抽帧方式：'keyframes' 或正数秒间隔，非法时抛出 ValueError"""
+    if value is None or value == '':
+        raise ValueError("缺少抽帧方式")
+    if str(value).lower() == 'keyframes':
+        return 'keyframes'
+    step = float(value)
+    if step <= 0:
+        raise ValueError("抽帧间隔必须为正数")
+    return step
+
+
+def iter_sampled_frames(video_path, sample, frame_size):
+    """按抽帧方式逐帧解码，yield (时间秒, [frame_size, frame_size, 3] RGB数组)
+
+    关键帧模式让解码器直接跳过非关键帧；间隔模式仍需解码，但只对保留的帧做缩放和格式转换。
+    """
+    import av
+
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        if sample == 'keyframes':
+            stream.codec_context.skip_frame = 'NONKEY'
+        next_time = 0.0
+        for frame in container.decode(stream):
+            t = float(frame.pts * stream.time_base) if frame.pts is not None else next_time
+            if sample != 'keyframes':
+                if t < next_time:
+                    continue
+                next_time = t + sample
+            yield t, frame.reformat(width=frame_size, height=frame_size, format='rgb24').to_ndarray()
+
+
+class _SegmentTracker:
+    """按候选视频累计连续命中的片段，记录得分最高的片段"""
+
+    def __init__(self, max_gap=1):
+        self.max_gap = max_gap
+        self.runs = {}  # path -> [start_time, end_time, last_index, score]
+        self.best = {}  # path -> (score, start_time, end_time)
+
+    def add(self, index, t, path, similarity):
+        run = self.runs.get(path)
+        if run is None or index - run[2] > self.max_gap + 1:
+            run = self.runs[path] = [t, t, index, 0.0]
+        run[1], run[2] = t, index
+        run[3] += similarity
+        if run[3] > self.best.get(path, (0.0,))[0]:
+            self.best[path] = (run[3], run[0], run[1])
+
+    def top_score(self):
+        return max((score for score, _, _ in self.best.values()), default=0.0)
+
+    def candidates(self, min_score):
+        ranked = sorted(self.best.items(), key=lambda item: -item[1][0])
+        return [
+            {"path": path, "score": round(score, 4), "segment": [round(start, 2), round(end, 2)]}
+            for path, (score, start, end) in ranked if score >= min_score
+        ]
+
+
+def search_video_frames(video_path, milvus_client, app_config, threshold, sample=None, early_exit_score=None,
+                        progress=None):
+    """边解码边检索的视频拷贝检测
+
+    返回 (candidates, stages)：candidates 为按得分排序的 [{"path", "score", "segment"}]，
+    stages 为各阶段的帧数与耗时。early_exit_score 为 None 时使用 VIDEO_CPU_EARLY_EXIT_SCORE，为0时不提前结束。
+    progress 不为空时每处理完一批帧调用一次，参数为 {"frames", "seconds", "top_score"}。
+    """
+    sample = parse_sample(sample if sample is not None else app_config.get('VIDEO_CPU_SAMPLE'))
+    if early_exit_score is None:
+        early_exit_score = app_config.get('VIDEO_CPU_EARLY_EXIT_SCORE')
+    batch_size = app_config.get('VIDEO_CPU_EMBED_BATCH')
+    max_frames = app_config.get('VIDEO_CPU_MAX_FRAMES')
+    frame_similarity = app_config.get('VIDEO_CPU_FRAME_SIMILARITY')
+    url_field = app_config.get('VIDEO_INDEX_URL_FIELD')
+    embedder = get_frame_embedder(app_config)
+
+    tracker = _SegmentTracker()
+    stages = {
+        "sample": sample,
+        "frames": {"decoded": 0, "embedded": 0},
+        "seconds": {"decode": 0.0, "embed": 0.0, "search": 0.0},
+        "early_exit": False,
+    }
+    index = 0
+
+    def process(batch):
+        nonlocal index
+        start = time.perf_counter()
+        with metrics.stage('frame_embed'):
+            embeddings = embedder.embed(np.stack([frame for _, frame in batch]))
+        stages["seconds"]["embed"] += time.perf_counter() - start
+        stages["frames"]["embedded"] += len(batch)
+
+        start = time.perf_counter()
+        with metrics.stage('milvus_search'):
+            results = milvus_client.search(
+                collection_name=app_config.get('MILVUS_VIDEO_COLLECTION'),
+                data=embeddings.tolist(),
+                limit=app_config.get('VIDEO_CPU_TOP_K'),
+                output_fields=[url_field],
+            )
+        stages["seconds"]["search"] += time.perf_counter() - start
+
+        for (t, _), hits in zip(batch, results):
+            # 同一帧对同一候选视频只计最相似的一帧
+            best = {}
+            for hit in hits:
+                path = hit["entity"][url_field]
+                if hit["distance"] >= frame_similarity and hit["distance"] > best.get(path, 0.0):
+                    best[path] = hit["distance"]
+            for path, similarity in best.items():
+                tracker.add(index, t, path, similarity)
+            index += 1
+        if progress is not None:
+            progress({
+                "frames": dict(stages["frames"]),
+                "seconds": {stage: round(s, 3) for stage, s in stages["seconds"].items()},
+                "top_score": round(tracker.top_score(), 4),
+            })
+
+    batch = []
+    frames = iter_sampled_frames(video_path, sample, app_config.get('VIDEO_INDEX_FRAME_SIZE'))
+    start = time.perf_counter()
+    for t, frame in frames:
+        stages["seconds"]["decode"] += time.perf_counter() - start
+        stages["frames"]["decoded"] += 1
+        batch.append((t, frame))
+        if len(batch) >= batch_size or stages["frames"]["decoded"] >= max_frames:
+            process(batch)
+            batch = []
+            if early_exit_score and tracker.top_score() >= early_exit_score:
+                stages["early_exit"] = True
+                break
+            if stages["frames"]["decoded"] >= max_frames:
+                break
+        start = time.perf_counter()
+    else:
+        stages["seconds"]["decode"] += time.perf_counter() - start
+    frames.close()
+    if batch:
+        process(batch)
+    metrics.observe_stage('video_decode', stages["seconds"]["decode"])
+
+    stages["seconds"] = {stage: round(s, 3) for stage, s in stages["seconds"].items()}
+    return tracker.candidates(threshold), stages
@@ -0,0 +1,384 @@
+# /unified_service/services/video_indexer.py
+"""
+视频拷贝检测库的离线批量建库
+
+把目录下的视频写入 MILVUS_VIDEO_COLLECTION（逐帧向量）和 TOWHEE_LEVELDB_PATH（整段视频的帧向量），
+写入格式与 video_copy_detection 流水线检索时读取的格式一致，候选结果为视频的绝对路径。
+
+  - 解码：VIDEO_INDEX_DECODE_WORKERS 个进程并行计算内容哈希、按 VIDEO_INDEX_TIME_STEP 抽帧并缩放到模型输入尺寸，
+          逐帧写入 VIDEO_INDEX_SPOOL_DIR 下的临时文件，不经过进程池管道传输
+  - 向量：主进程以内存映射读取临时文件，把多个视频的帧拼成 VIDEO_INDEX_EMBED_BATCH 大小的批次送入ISC模型（TOWHEE_DEVICE）；
+          待计算的帧数达到一个批次即开始计算，内存中最多只有一个批次的帧，与视频长度无关
+  - 写入：每批视频的帧向量一次插入Milvus，再逐个写入LevelDB
+
+已入库的视频按sha256内容哈希记录在 VIDEO_INDEX_MANIFEST_PATH，重复运行或换了路径的相同视频会被跳过。
+写入Milvus前先把视频标记为 inserting，LevelDB写入完成后标记为 done；崩溃后重新运行时，
+处于 inserting 状态的视频会先按路径删除Milvus中已写入的帧，再重新建库。
+
+LevelDB同一时间只能被一个进程打开，建库时需先停止使用同一 TOWHEE_LEVELDB_PATH 的检索服务。
+
+用法（在 Web-Backend 目录下）:
+    python -m services.video_indexer index /data/videos [/data/more_videos ...]
+    python -m services.video_indexer status
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from services import video_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# 解码进程内的抽帧算子，进程启动时创建
+_decoder = None
+
+
+class VideoManifest:
+    """已入库视频的清单，按内容哈希记录状态（inserting / done / failed）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, status TEXT NOT NULL,"
+            " frames INTEGER, error TEXT, updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        # sqlite连接不能跨线程共享，每个线程一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sha256):
+        """返回 {"path", "status", "frames"}，未记录时返回None"""
+        row = self._conn().execute(
+            "SELECT path, status, frames FROM videos WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"path": row[0], "status": row[1], "frames": row[2]}
+
+    def mark(self, items, status, error=None):
+        """批量更新状态，items 为 [(sha256, path, frames)]"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR REPLACE INTO videos (sha256, path, status, frames, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(sha256, path, status, frames, error, now) for sha256, path, frames in items],
+        )
+        conn.execute("COMMIT")
+
+    def with_status(self, status):
+        return self._conn().execute("SELECT sha256, path FROM videos WHERE status = ?", (status,)).fetchall()
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*), COALESCE(SUM(frames), 0) FROM videos GROUP BY status")
+        return {status: {"videos": n, "frames": frames} for status, n, frames in rows}
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """计算文件内容的sha256（与上传文件的命名方式一致）"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def iter_video_files(roots, extensions):
+    """递归列出目录下的视频文件（绝对路径，按路径排序以便多次运行顺序一致）"""
+    for root in roots:
+        if os.path.isfile(root):
+            yield os.path.abspath(root)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.rsplit('.', 1)[-1].lower() in extensions:
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+# --- 解码进程 ---
+
+def _init_decoder(time_step):
+    global _decoder
+    from towhee import ops
+    _decoder = ops.video_decode.ffmpeg(sample_type='time_step_sample', args={'time_step': time_step})
+
+
+def _decode_video(path, manifest_path, frame_size, spool_dir):
+    """在解码进程中执行：计算哈希，已入库时直接返回，否则抽帧并缩放
+
+    返回 {"path", "sha256", "status": "skipped" | "decoded" | "failed", "frames", "frames_path",
+    "hash_seconds", "decode_seconds"}。帧缩放为模型输入的正方形尺寸（与ISC算子预处理相同的双线性插值），
+    逐帧追加写入 spool_dir 下的临时文件（[frames, frame_size, frame_size, 3] 的uint8），进程内只保留当前帧。
+    """
+    from PIL import Image
+
+    start = time.perf_counter()
+    result = {"path": path, "sha256": None, "status": "failed", "frames": None, "frames_path": None}
+    try:
+        sha256 = result["sha256"] = hash_file(path)
+        result["hash_seconds"] = time.perf_counter() - start
+        indexed = VideoManifest(manifest_path).get(sha256)
+        if indexed and indexed["status"] == 'done':
+            result["status"] = 'skipped'
+            return result
+
+        start = time.perf_counter()
+        fd, frames_path = tempfile.mkstemp(dir=spool_dir, suffix='.rgb')
+        result["frames_path"] = frames_path
+        frames = 0
+        with os.fdopen(fd, 'wb') as f:
+            for frame in _decoder(path):
+                f.write(np.ascontiguousarray(Image.fromarray(np.asarray(frame)).convert('RGB').resize(
+                    (frame_size, frame_size), Image.BILINEAR), dtype=np.uint8).tobytes())
+                frames += 1
+        result["decode_seconds"] = time.perf_counter() - start
+        if not frames:
+            result["error"] = "未解码出任何帧"
+            return result
+        result["frames"] = frames
+        result["status"] = 'decoded'
+    except Exception as e:
+        result["error"] = str(e)
+    if result["status"] != 'decoded' and result["frames_path"]:
+        os.remove(result["frames_path"])
+        result["frames_path"] = None
+    return result
+
+
+def _open_frames(result, frame_size):
+    """以内存映射打开解码进程写入的帧文件"""
+    return np.memmap(result["frames_path"], dtype=np.uint8, mode='r',
+                     shape=(result["frames"], frame_size, frame_size, 3))
+
+
+# --- 建库 ---
+
+class VideoIndexer:
+    """主进程中的向量计算与写入"""
+
+    def __init__(self, app_config):
+        from pymilvus import MilvusClient
+        from towhee import ops
+
+        self.app_config = app_config
+        self.collection = app_config.get('MILVUS_VIDEO_COLLECTION')
+        self.url_field = app_config.get('VIDEO_INDEX_URL_FIELD')
+        self.vector_field = app_config.get('VIDEO_INDEX_VECTOR_FIELD')
+        self.milvus_client = MilvusClient(uri=app_config.get('MILVUS_URI'), token=app_config.get('MILVUS_TOKEN'))
+        # 与检索流水线相同的模型与LevelDB写入算子；建库的推理后端单独配置，不随检索后端改变
+        backend = app_config.get('VIDEO_INDEX_EMBED_BACKEND')
+        logger.info(f"建库帧向量后端: {backend}，集合: {self.collection}")
+        self.embedder = video_fingerprint.get_frame_embedder(
+            app_config, device=app_config.get('TOWHEE_DEVICE'), backend=backend)
+        self.leveldb = ops.kv_storage.insert_leveldb(app_config.get('TOWHEE_LEVELDB_PATH'))
+
+    def embed(self, frames):
+        """计算一批帧的L2归一化向量"""
+        return self.embedder.embed(frames)
+
+    def delete(self, paths):
+        """删除视频在Milvus中的全部帧（中断后重建前清理）"""
+        for path in paths:
+            escaped = path.replace('\\', '\\\\').replace('"', '\\"')
+            self.milvus_client.delete(collection_name=self.collection, filter=f'{self.url_field} == "{escaped}"')
+
+    def insert(self, videos):
+        """写入一批视频，videos 为 [(path, embeddings)]"""
+        rows = [
+            {self.url_field: path, self.vector_field: embedding.tolist()}
+            for path, embeddings in videos for embedding in embeddings
+        ]
+        self.milvus_client.insert(collection_name=self.collection, data=rows)
+        for path, embeddings in videos:
+            self.leveldb(path, embeddings)
+
+
+def index_videos(roots, app_config):
+    """为目录下的视频建库，返回统计信息"""
+    manifest_path = app_config.get('VIDEO_INDEX_MANIFEST_PATH')
+    manifest = VideoManifest(manifest_path)
+    indexer = VideoIndexer(app_config)
+    workers = app_config.get('VIDEO_INDEX_DECODE_WORKERS')
+    max_in_flight = max(app_config.get('VIDEO_INDEX_MAX_IN_FLIGHT'), workers)
+    embed_batch = app_config.get('VIDEO_INDEX_EMBED_BATCH')
+    frame_size = app_config.get('VIDEO_INDEX_FRAME_SIZE')
+    report_interval = app_config.get('VIDEO_INDEX_REPORT_INTERVAL')
+    spool_root = app_config.get('VIDEO_INDEX_SPOOL_DIR')
+    if spool_root:
+        os.makedirs(spool_root, exist_ok=True)
+    spool_dir = tempfile.mkdtemp(prefix='video_index_', dir=spool_root)
+
+    # 上次中断时写了一半的视频，先清理Milvus中的残留帧
+    interrupted = manifest.with_status('inserting')
+    if interrupted:
+        logger.info(f"清理上次中断时未完成的视频: {len(interrupted)}")
+        indexer.delete([path for _, path in interrupted])
+        manifest.mark([(sha256, path, None) for sha256, path in interrupted], 'failed', error="建库中断")
+
+    stats = {"indexed": 0, "skipped": 0, "duplicate": 0, "failed": 0, "frames": 0}
+    seconds = {"hash": 0.0, "decode": 0.0, "embed": 0.0, "insert": 0.0}
+    start_time = time.time()
+    last_report = start_time
+    seen = set()
+    queue = []  # 已解码、等待计算向量的视频
+    queued_frames = 0
+
+    def report():
+        elapsed = time.time() - start_time
+        return dict(
+            stats, elapsed=round(elapsed, 1),
+            videos_per_sec=round(stats["indexed"] / elapsed, 2) if elapsed else 0.0,
+            frames_per_sec=round(stats["frames"] / elapsed, 1) if elapsed else 0.0,
+            stage_seconds={stage: round(s, 1) for stage, s in seconds.items()},
+        )
+
+    def embed_queue():
+        """按 embed_batch 帧一批计算队列中所有视频的向量，每次只从帧文件读入一个批次"""
+        embeddings = []
+        batch, batched = [], 0
+        for r in queue:
+            frames = _open_frames(r, frame_size)
+            start = 0
+            while start < len(frames):
+                take = min(embed_batch - batched, len(frames) - start)
+                batch.append(frames[start:start + take])
+                batched += take
+                start += take
+                if batched == embed_batch:
+                    embeddings.append(indexer.embed(np.concatenate(batch)))
+                    batch, batched = [], 0
+            del frames
+        if batch:
+            embeddings.append(indexer.embed(np.concatenate(batch)))
+        return np.concatenate(embeddings)
+
+    def flush():
+        nonlocal queued_frames
+        if not queue:
+            return
+        items = [(r["sha256"], r["path"], r["frames"]) for r in queue]
+        try:
+            start = time.perf_counter()
+            embeddings = embed_queue()
+            seconds["embed"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            manifest.mark(items, 'inserting')
+            offsets = np.cumsum([0] + [n for _, _, n in items])
+            indexer.insert([(path, embeddings[offsets[i]:offsets[i + 1]]) for i, (_, path, _) in enumerate(items)])
+            manifest.mark(items, 'done')
+            seconds["insert"] += time.perf_counter() - start
+            stats["indexed"] += len(items)
+            stats["frames"] += queued_frames
+        except Exception as e:
+            logger.error(f"写入 {len(items)} 个视频失败: {e}")
+            indexer.delete([path for _, path, _ in items])
+            manifest.mark(items, 'failed', error=str(e))
+            stats["failed"] += len(items)
+        for r in queue:
+            os.remove(r["frames_path"])
+        queue.clear()
+        queued_frames = 0
+
+    def collect(result):
+        nonlocal queued_frames
+        seconds["hash"] += result.get("hash_seconds", 0.0)
+        seconds["decode"] += result.get("decode_seconds", 0.0)
+        status = result["status"]
+        if status == 'decoded':
+            # 同一次运行中内容相同的视频只入库一次
+            if result["sha256"] in seen:
+                status = 'duplicate'
+            else:
+                indexed = manifest.get(result["sha256"])
+                if indexed and indexed["status"] == 'done':
+                    status = 'duplicate'
+        if status == 'decoded':
+            seen.add(result["sha256"])
+            queue.append(result)
+            # 按帧数（而不是视频数）决定何时计算，长视频不会在队列中堆积
+            queued_frames += result["frames"]
+            if queued_frames >= embed_batch:
+                flush()
+            return
+        if result.get("frames_path"):
+            os.remove(result["frames_path"])
+        if status == 'failed':
+            logger.warning(f"视频解码失败: {result['path']}, {result.get('error')}")
+            if result["sha256"]:
+                manifest.mark([(result["sha256"], result["path"], None)], 'failed', error=result.get('error'))
+            stats["failed"] += 1
+        else:
+            stats[status] += 1
+
+    # spawn 避免fork已加载模型的主进程，子进程只需导入本模块和解码算子
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_decoder, initargs=(app_config.get('VIDEO_INDEX_TIME_STEP'),),
+    )
+    in_flight = set()
+    try:
+        with executor:
+            for path in iter_video_files(roots, app_config.get('VIDEO_ALLOWED_EXTENSIONS')):
+                # 队列中的帧不足一个批次，在途视频数限制的是临时文件的磁盘占用
+                while len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+                in_flight.add(executor.submit(_decode_video, path, manifest_path, frame_size, spool_dir))
+                if time.time() - last_report >= report_interval:
+                    logger.info(f"建库进度: {json.dumps(report(), ensure_ascii=False)}")
+                    last_report = time.time()
+            for future in in_flight:
+                collect(future.result())
+            flush()
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    result = report()
+    logger.info(f"建库完成: {json.dumps(result, ensure_ascii=False)}")
+    return result
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="批量构建视频拷贝检测库（Milvus + LevelDB）")
+    parser.add_argument('command', choices=['index', 'status'], help="index: 为目录下的视频建库; status: 查看清单统计")
+    parser.add_argument('paths', nargs='*', help="视频目录或文件")
+    args = parser.parse_args()
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    app_config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+
+    if args.command == 'status':
+        counts = VideoManifest(app_config.get('VIDEO_INDEX_MANIFEST_PATH')).counts()
+        print(json.dumps(counts, ensure_ascii=False, indent=2))
+        return
+    if not args.paths:
+        parser.error("index 需要至少一个视频目录或文件")
+    index_videos(args.paths, app_config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# /unified_service/services/video_jobs.py
+"""
+视频检索任务队列
+
+提交后立即返回任务id，检索在进程内有界的线程池中执行，客户端轮询或通过SSE订阅进度与结果，
+HTTP请求不再等待整个抽帧+检索过程。已结束的任务保留 VIDEO_JOB_TTL 秒后清除。
+
+任务只保存在当前进程中，多worker部署时轮询请求需路由到提交任务的同一worker（或使用单进程的 asgi.py）。
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 进程内共享的任务队列
+_queue = None
+_queue_lock = threading.Lock()
+
+FINISHED = ('done', 'failed')
+
+
+class QueueFullError(Exception):
+    """排队中和执行中的任务数已达上限"""
+
+
+class VideoJob:
+    """单个检索任务的状态，每次更新 version 加一，供SSE判断是否有新进度"""
+
+    def __init__(self, job_id, params=None):
+        self.id = job_id
+        self.params = params or {}
+        self.status = 'queued'
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == 'done':
+            data["result"] = self.result
+        elif self.status == 'failed':
+            data["error"] = self.error
+        return data
+
+
+class VideoJobQueue:
+    """有界的进程内任务队列"""
+
+    def __init__(self, workers, max_pending, ttl):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='video-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def submit(self, func, params=None):
+        """提交任务，func(progress) 返回 (result, error)；progress(dict) 用于上报进度
+
+        任务在提交时的上下文中执行（与 async_service.submit 相同），可使用 current_app 和 url_for。
+        """
+        with self._lock:
+            self._purge()
+            active = sum(1 for job in self._jobs.values() if job.status not in FINISHED)
+            if active >= self.max_pending:
+                raise QueueFullError(f"视频检索任务已达上限: {self.max_pending}")
+            job = VideoJob(uuid.uuid4().hex, params)
+            self._jobs[job.id] = job
+        ctx = contextvars.copy_context()
+        self._executor.submit(ctx.run, self._run, job, func)
+        return job.to_dict()
+
+    def _run(self, job, func):
+        self._update(job, status='running', started_at=time.time())
+        try:
+            result, error = func(lambda progress: self._update(job, progress=progress))
+        except Exception as e:
+            logger.error(f"视频检索任务 {job.id} 出错: {e}")
+            result, error = None, str(e)
+        if error:
+            self._update(job, status='failed', error=error, finished_at=time.time())
+        else:
+            self._update(job, status='done', result=result, finished_at=time.time())
+
+    def _update(self, job, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._changed.notify_all()
+
+    def _purge(self):
+        """清除超过TTL的已结束任务（调用方持有锁）"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in FINISHED and job.finished_at + self.ttl < now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """返回任务状态，不存在或已过期时返回None"""
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def wait(self, job_id, version, timeout):
+        """等待任务版本超过 version 或超时，返回 (version, 任务状态)；任务不存在时返回 (version, None)"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None and job.version <= version:
+                self._changed.wait_for(lambda: job.version > version, timeout=timeout)
+            if job is None:
+                return version, None
+            return job.version, job.to_dict()
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+
+def get_job_queue(app_config):
+    """获取任务队列，首次调用时按 VIDEO_JOB_* 配置创建"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = VideoJobQueue(
+                    app_config.get('VIDEO_JOB_WORKERS'),
+                    app_config.get('VIDEO_JOB_MAX_PENDING'),
+                    app_config.get('VIDEO_JOB_TTL'),
+                )
+    return _queue
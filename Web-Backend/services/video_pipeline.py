@@ -0,0 +1,116 @@
+# /unified_service/services/video_pipeline.py
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 已构建的视频拷贝检测流水线，按配置缓存，每个配置对应一组流水线实例
+_pipelines = {}
+_registry_lock = threading.Lock()
+
+
+class _PipelinePool:
+    """同一配置的流水线实例池
+
+    模型与LevelDB句柄不保证可重入，每个实例同一时间只处理一个视频；
+    并发请求按需构建新实例（最多 size 个），额外实例构建失败（如LevelDB已被占用）时
+    不再扩容，请求等待已有实例空闲。
+    """
+
+    def __init__(self, size):
+        self.size = max(1, size)
+        self.idle = []
+        self.built = 0
+        self.building = 0
+        self.capped = False
+        self.cond = threading.Condition()
+
+    def acquire(self, build):
+        """取出一个空闲实例，没有空闲实例且未达上限时构建新实例"""
+        while True:
+            with self.cond:
+                while not self.idle and (self.capped or self.built + self.building >= self.size):
+                    self.cond.wait()
+                if self.idle:
+                    return self.idle.pop()
+                self.building += 1
+            try:
+                pipeline = build()
+            except Exception as e:
+                with self.cond:
+                    self.building -= 1
+                    self.cond.notify_all()
+                    if not self.built:
+                        raise
+                    self.capped = True
+                logger.warning(f"构建第{self.built + 1}个视频拷贝检测流水线实例失败，保持{self.built}个实例: {e}")
+                continue
+            with self.cond:
+                self.building -= 1
+                self.built += 1
+            return pipeline
+
+    def release(self, pipeline):
+        with self.cond:
+            self.idle.append(pipeline)
+            self.cond.notify()
+
+
+def _pipeline_key(app_config, threshold):
+    """流水线的缓存键：集合、Milvus地址、LevelDB路径、设备和阈值"""
+    return (
+        app_config.get('MILVUS_VIDEO_COLLECTION'),
+        app_config.get('MILVUS_URI'),
+        app_config.get('TOWHEE_LEVELDB_PATH'),
+        app_config.get('TOWHEE_DEVICE'),
+        threshold,
+    )
+
+
+def _build_pipeline(app_config, threshold):
+    """加载模型、连接Milvus并打开LevelDB，构建video_copy_detection流水线"""
+    from towhee import AutoPipes, AutoConfig
+
+    search_conf = AutoConfig.load_config('video_copy_detection')
+    search_conf.collection = app_config.get('MILVUS_VIDEO_COLLECTION')
+    search_conf.milvus_host = app_config.get('MILVUS_URI').split('//')[1].split(':')[0]
+    search_conf.milvus_port = int(app_config.get('MILVUS_URI').split(':')[-1])
+    search_conf.device = app_config.get('TOWHEE_DEVICE')
+    search_conf.leveldb_path = app_config.get('TOWHEE_LEVELDB_PATH')
+    search_conf.threshold = threshold
+    return AutoPipes.pipeline('video_copy_detection', search_conf)
+
+
+def _get_pool(app_config, threshold):
+    key = _pipeline_key(app_config, threshold)
+    with _registry_lock:
+        pool = _pipelines.get(key)
+        if pool is None:
+            size = app_config.get('VIDEO_PIPELINE_POOL_SIZE') or app_config.get('VIDEO_SEARCH_WORKERS') or 1
+            pool = _pipelines[key] = _PipelinePool(size)
+    return pool
+
+
+def _build(app_config, threshold):
+    logger.info(f"构建视频拷贝检测流水线: {_pipeline_key(app_config, threshold)}")
+    return _build_pipeline(app_config, threshold)
+
+
+def run_video_pipeline(video_path, app_config, threshold):
+    """使用缓存的流水线对视频进行拷贝检测，返回原始结果"""
+    pool = _get_pool(app_config, threshold)
+    pipeline = pool.acquire(lambda: _build(app_config, threshold))
+    try:
+        return pipeline(video_path)
+    finally:
+        pool.release(pipeline)
+
+
+def prepare_video_pipeline(app_config, threshold=None):
+    """提前构建第一个流水线实例，失败时抛出异常（后台初始化时由调用方重试）"""
+    if threshold is None:
+        threshold = app_config.get('VIDEO_SEARCH_THRESHOLD')
+    pool = _get_pool(app_config, threshold)
+    pool.release(pool.acquire(lambda: _build(app_config, threshold)))
+    logger.info("视频拷贝检测流水线预热完成")
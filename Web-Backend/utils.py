@@ -1,16 +1,33 @@
 # /unified_service/utils.py
 
-import base64
-from flask import current_app
+import os
+import secrets
+from flask import current_app, url_for
+from itsdangerous import URLSafeSerializer, BadSignature
 
-def to_base64(file_path):
-    """将文件转换为Base64编码的字符串"""
+def load_or_create_secret_key(path):
+    """读取本机持久化的随机密钥（未设置 SECRET_KEY 时由 create_app 调用）
+
+    密钥文件在首次启动时生成（先写临时文件再硬链接，多个worker同时启动也只会生成一份），
+    同一台机器上的各worker共用。无法创建密钥文件时拒绝启动，不退回固定的默认值。
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
     try:
-        with open(file_path, "rb") as file:
-            return base64.b64encode(file.read()).decode("utf-8")
-    except FileNotFoundError:
-        current_app.logger.warning(f"文件未找到: {file_path}")
-        return None
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+        with open(path) as f:
+            key = f.read().strip()
+    except OSError as e:
+        raise RuntimeError(f"未设置 SECRET_KEY，且无法创建密钥文件 {path}: {e}") from e
+    if not key:
+        raise RuntimeError(f"密钥文件为空: {path}")
+    return key
 
 def is_video_file_allowed(filename):
     """检查视频文件扩展名是否合法"""
@@ -21,4 +38,39 @@ def is_video_file_allowed(filename):
 def is_picture_file_allowed(filename):
     """检查图片文件扩展名是否合法"""
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in current_app.config['PICTURE_ALLOWED_EXTENSIONS']
\ No newline at end of file
+           filename.rsplit('.', 1)[1].lower() in current_app.config['PICTURE_ALLOWED_EXTENSIONS']
+
+def _media_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='media')
+
+def media_url(file_path, width=None):
+    """为服务器上的媒体文件生成稳定的访问URL，路径经过签名防止任意文件读取
+
+    指定width时返回该宽度缩略图的URL
+    """
+    token = _media_serializer().dumps(os.path.abspath(file_path))
+    if width:
+        return url_for('api.serve_media', token=token, w=width)
+    return url_for('api.serve_media', token=token)
+
+def _media_roots():
+    config = current_app.config
+    roots = (config['UPLOAD_FOLDER'], config['THUMBNAIL_FOLDER'],
+             config['IMAGE_DATASET_ROOT'], config['VIDEO_DATASET_ROOT'])
+    return [os.path.realpath(root) for root in roots if root]
+
+def is_media_path_allowed(file_path):
+    """文件（解析符号链接后）是否位于允许访问的媒体目录下"""
+    real_path = os.path.realpath(file_path)
+    return any(os.path.commonpath([real_path, root]) == root for root in _media_roots())
+
+def resolve_media_token(token):
+    """校验媒体URL中的签名，返回对应的文件路径；签名无效或文件不在允许的媒体目录下时返回None"""
+    try:
+        file_path = _media_serializer().loads(token)
+    except BadSignature:
+        return None
+    if not isinstance(file_path, str) or not is_media_path_allowed(file_path):
+        current_app.logger.warning(f"拒绝访问媒体目录之外的文件: {file_path}")
+        return None
+    return os.path.realpath(file_path)
@@ -43,11 +43,18 @@ apiClient.interceptors.response.use(
 
 // API 请求函数
 // 文本溯源查询
-export const searchTraceByText = (queryContent, threshold) => {
-  return apiClient.post('/search/text', new URLSearchParams({
+// paging: { pageSize, cursor, datasource }，不传时返回全部结果
+export const searchTraceByText = (queryContent, threshold, paging = {}) => {
+  const params = new URLSearchParams({
     queryContent,
     threshold
-  }), {
+  });
+  Object.entries(paging).forEach(([key, value]) => {
+    if (value !== null && value !== undefined && value !== '') {
+      params.append(key, value);
+    }
+  });
+  return apiClient.post('/search/text', params, {
     headers: { 'Content-Type': 'application/x-www-form-urlencoded' }
   });
 };
@@ -62,6 +69,15 @@ export const searchTraceByImage = (file, topk) => {
   });
 };
 
+// 批量图片溯源查询（一次上传多张图片）
+export const searchTraceByImages = (files) => {
+  const formData = new FormData();
+  files.forEach(file => formData.append('files', file));
+  return apiClient.post('/search/pictures', formData, {
+    headers: { 'Content-Type': 'multipart/form-data' }
+  });
+};
+
 // 视频溯源查询
 export const searchTraceByVideo = (file, topk, config = {}) => {
   const formData = new FormData();
@@ -73,6 +89,83 @@ export const searchTraceByVideo = (file, topk, config = {}) => {
   });
 };
 
+// 提交视频溯源任务，立即返回 job_id，结果通过 waitForVideoSearchJob 获取
+export const submitVideoSearchJob = (file, topk, options = {}) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  formData.append('topk', topk);
+  Object.entries(options).forEach(([key, value]) => {
+    if (value !== undefined && value !== null) formData.append(key, value);
+  });
+  return apiClient.post('/search/video/jobs', formData, {
+    headers: { 'Content-Type': 'multipart/form-data' }
+  });
+};
+
+// 查询视频溯源任务状态
+export const getVideoSearchJob = (jobId) => {
+  return apiClient.get(`/search/video/jobs/${jobId}`);
+};
+
+// 等待视频溯源任务完成，返回与 /search/video 相同的结果；
+// 优先通过SSE订阅进度，浏览器不支持或连接中断时改为轮询
+export const waitForVideoSearchJob = (jobId, { onProgress, signal, pollInterval = 2000 } = {}) => {
+  return new Promise((resolve, reject) => {
+    let source = null;
+    let timer = null;
+    const cleanup = () => {
+      if (source) source.close();
+      if (timer) clearTimeout(timer);
+      if (signal) signal.removeEventListener('abort', onAbort);
+    };
+    const finish = (job) => {
+      cleanup();
+      if (job.status === 'done') {
+        resolve(job.result);
+      } else {
+        reject(new Error(job.error || '视频溯源任务失败'));
+      }
+    };
+    const onAbort = () => {
+      cleanup();
+      reject(new DOMException('Aborted', 'AbortError'));
+    };
+    const poll = async () => {
+      try {
+        const { data: job } = await getVideoSearchJob(jobId);
+        if (job.status === 'done' || job.status === 'failed') {
+          finish(job);
+          return;
+        }
+        if (onProgress) onProgress(job);
+        timer = setTimeout(poll, pollInterval);
+      } catch (error) {
+        cleanup();
+        reject(error);
+      }
+    };
+
+    if (signal) {
+      if (signal.aborted) return onAbort();
+      signal.addEventListener('abort', onAbort);
+    }
+    if (typeof EventSource === 'undefined') {
+      poll();
+      return;
+    }
+    source = new EventSource(`${apiClient.defaults.baseURL}/search/video/jobs/${jobId}/events`);
+    source.addEventListener('progress', (e) => onProgress && onProgress(JSON.parse(e.data)));
+    source.addEventListener('done', (e) => finish(JSON.parse(e.data)));
+    source.addEventListener('failed', (e) => finish(JSON.parse(e.data)));
+    source.onerror = () => {
+      // 连接中断（如代理超时）时改为轮询
+      source.close();
+      source = null;
+      poll();
+    };
+  });
+};
+
 // 上传文件
 export const uploadFile = (file) => {
   const formData = new FormData();
@@ -91,17 +184,68 @@ export const getOriginalTweetById = (id, space_name = 'Social_Network_1') => {
   });
 };
 
-// 通过 ID 获取关联图谱数据
+// 通过 ID 获取离线预计算的传播统计（规模、深度、各层广度等）
+export const getCascadeStatsById = (id) => {
+  return apiClient.get('/getCascadeStatsById', {
+    params: { id }
+  });
+};
+
+// 通过 ID 获取关联图谱数据（紧凑格式，用 utils/graph.js 的 expandCompactGraph 展开）
 export const getGraphDataById = (id, space_name = 'Social_Network_1') => {
   return apiClient.get('/getRelatedById', {
-    params: { id, space_name }
+    params: { id, space_name, format: 'compact' }
   });
 };
 
-// 通过事件名称获取关联图谱数据
+// 通过 ID 同时获取推文数据和关联图谱数据（后端并发查询，图谱为紧凑格式）
+export const getTweetGraphById = (id, space_name = 'Social_Network_1') => {
+  return apiClient.get('/getTweetGraphById', {
+    params: { id, space_name, format: 'compact' }
+  });
+};
+
+// 逐跳流式获取扩散图谱（NDJSON），每到达一跳调用一次 onHop(hop)，返回结束时的统计信息
+// signal 为 AbortController.signal，取消后后端停止展开后续各跳
+export const streamGraphDataById = async (id, { onHop, signal, space_name = 'Social_Network_1', fanout, budget } = {}) => {
+  const params = new URLSearchParams({ id, space_name, stream: 'ndjson' });
+  if (fanout) params.append('fanout', fanout);
+  if (budget) params.append('budget', budget);
+  const response = await fetch(`${apiClient.defaults.baseURL}/getRelatedById?${params}`, { signal });
+  if (!response.ok) {
+    throw new Error(`API Error: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const event = JSON.parse(line);
+      if (event.error) {
+        throw new Error(event.error);
+      }
+      if (event.done) {
+        summary = event;
+      } else if (onHop) {
+        onHop(event);
+      }
+    }
+  }
+  return summary;
+};
+
+// 通过事件名称获取关联图谱数据（紧凑格式）
 export const getGraphDataByEvent = (event, space_name = 'Social_Network_1') => {
   return apiClient.get('/getRelatedByEvent', {
-    params: { event, space_name }
+    params: { event, space_name, format: 'compact' }
   });
 };
 
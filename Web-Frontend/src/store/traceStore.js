@@ -1,4 +1,17 @@
 import { defineStore } from 'pinia'
+import { searchTraceByText } from '../service/apiManager'
+
+// 平台名称：后端数据源 <-> 页面显示
+const PLATFORM_LABELS = { weibo: '微博' }
+const toPlatformLabel = (datasource) => PLATFORM_LABELS[datasource] || datasource
+const toDatasource = (label) =>
+  Object.keys(PLATFORM_LABELS).find(key => PLATFORM_LABELS[key] === label) || label
+
+// 统一处理查询结果中的平台名称替换
+export const formatResults = (data) => data.map(item => ({
+  ...item,
+  datasource: toPlatformLabel(item.datasource)
+}))
 
 // 创建溯源查询结果的store
 export const useTraceStore = defineStore('trace', {
@@ -8,13 +21,17 @@ export const useTraceStore = defineStore('trace', {
     itemsPerPage: 10,    // 每页显示数量
     selectedPlatform: '', // 选中的平台筛选条件
     loading: false,      // 加载状态
-    errorMessage: ''     // 错误信息
+    errorMessage: '',    // 错误信息
+    textQuery: null,     // 文本查询条件，不为空时由后端分页
+    totalCount: 0,       // 文本查询筛选后的结果总数
+    pageCursors: [null]  // 各页的游标，pageCursors[i] 对应第 i+1 页
   }),
 
   getters: {
     // 计算筛选后的结果
     filteredResults(state) {
-      if (!state.selectedPlatform) {
+      // 后端分页时结果已按平台筛选
+      if (state.textQuery || !state.selectedPlatform) {
         return state.results
       }
       return state.results.filter(item => item.datasource === state.selectedPlatform)
@@ -22,11 +39,17 @@ export const useTraceStore = defineStore('trace', {
 
     // 计算总页数
     totalPages(state) {
+      if (state.textQuery) {
+        return Math.ceil(state.totalCount / state.itemsPerPage)
+      }
       return Math.ceil(this.filteredResults.length / state.itemsPerPage)
     },
 
     // 计算当前页显示的结果
     paginatedResults(state) {
+      if (state.textQuery) {
+        return state.results
+      }
       const startIndex = (state.currentPage - 1) * state.itemsPerPage
       return this.filteredResults.slice(startIndex, startIndex + state.itemsPerPage)
     }
@@ -35,10 +58,49 @@ export const useTraceStore = defineStore('trace', {
   actions: {
     // 设置查询结果
     setResults(data) {
+      this.textQuery = null
       this.results = data
       this.currentPage = 1  // 重置到第一页
     },
 
+    // 文本查询：只向后端请求当前页
+    async searchText(queryContent, threshold) {
+      this.textQuery = { queryContent, threshold }
+      this.pageCursors = [null]
+      await this.loadTextPage(1)
+    },
+
+    // 按游标加载文本查询的第 page 页
+    async loadTextPage(page) {
+      const response = await searchTraceByText(this.textQuery.queryContent, this.textQuery.threshold, {
+        pageSize: this.itemsPerPage,
+        cursor: this.pageCursors[page - 1],
+        datasource: this.selectedPlatform ? toDatasource(this.selectedPlatform) : null
+      })
+      const data = response.data
+      this.results = formatResults(data.search_results)
+      this.totalCount = data.total
+      this.pageCursors[page] = data.next_cursor
+      this.currentPage = page
+    },
+
+    // 切换页码（文本查询时从后端加载）
+    async goToPage(page) {
+      if (!this.textQuery) {
+        this.currentPage = page
+        return
+      }
+      this.setLoading(true)
+      try {
+        await this.loadTextPage(page)
+      } catch (error) {
+        console.error('加载分页失败:', error)
+        this.setErrorMessage(error.response?.data?.error || '加载分页失败，请重试')
+      } finally {
+        this.setLoading(false)
+      }
+    },
+
     // 设置当前页码
     setCurrentPage(page) {
       this.currentPage = page
@@ -47,14 +109,14 @@ export const useTraceStore = defineStore('trace', {
     // 上一页
     prevPage() {
       if (this.currentPage > 1) {
-        this.currentPage--
+        this.goToPage(this.currentPage - 1)
       }
     },
 
     // 下一页
     nextPage() {
       if (this.currentPage < this.totalPages) {
-        this.currentPage++
+        this.goToPage(this.currentPage + 1)
       }
     },
 
@@ -0,0 +1,25 @@
+/**
+ * 把紧凑格式的图谱数据（?format=compact）展开为逐边的记录
+ * 节点属性对象在各条边之间共享，不做拷贝
+ * @param {Object} graph - { nodes: {id, type, props}, node_types, edges: {src, dst, rank, type}, edge_types }
+ * @returns {Array} 与逐行格式字段相同的记录：e_src, e_dst, e_type, e_rank, src_type, src_props
+ */
+export function expandCompactGraph(graph) {
+  if (!graph || !graph.edges) return [];
+
+  const { nodes, node_types: nodeTypes, edges, edge_types: edgeTypes } = graph;
+  const rows = new Array(edges.src.length);
+  for (let i = 0; i < edges.src.length; i++) {
+    const src = edges.src[i];
+    const dst = edges.dst[i];
+    rows[i] = {
+      e_src: nodes.id[src],
+      e_dst: dst >= 0 ? nodes.id[dst] : null,
+      e_type: edgeTypes[edges.type[i]],
+      e_rank: edges.rank[i],
+      src_type: nodes.type[src] >= 0 ? nodeTypes[nodes.type[src]] : null,
+      src_props: nodes.props[src] || {}
+    };
+  }
+  return rows;
+}